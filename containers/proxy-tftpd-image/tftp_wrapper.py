@@ -5,9 +5,14 @@
 """Wrapper script for Uyuni proxy tftp container."""
 
 import argparse
+import fcntl
+import hashlib
+import json
 import logging
 import os
 import re
+import tempfile
+import time
 import requests
 import yaml
 
@@ -16,6 +21,13 @@ from fbtftp.base_handler import ResponseData
 from fbtftp.base_server import BaseServer
 
 
+# Size of the chunks read from the HTTP responses
+HTTP_CHUNK_SIZE = 64 * 1024
+# Connect and read timeouts of the cache transfers in seconds: the other
+# requests for the same file wait for them
+HTTP_TIMEOUT = (10, 60)
+
+
 def stats(s):
     del s
 
@@ -46,27 +58,20 @@ class HttpResponseData(ResponseData):
         if self._request.status_code == 404:
             raise FileNotFoundError()
         self._request.raise_for_status()
-        self._stream = self._request.iter_content(chunk_size=1024)
-        self._content = b""
+        self._stream = self._request.iter_content(chunk_size=HTTP_CHUNK_SIZE)
+        self._content = bytearray()
         self._size = int(self._request.headers["content-length"])
 
     def read(self, requested):
-        data = self._content
-        read = len(self._content)
-        while read < requested:
-            if self._stream is None:
-                break
+        # Buffer what was received but not requested yet, without copying
+        # the whole buffer for every chunk
+        while len(self._content) < requested and self._stream is not None:
             try:
-                d = next(self._stream)
-                data += d
-                read += len(d)
+                self._content += next(self._stream)
             except StopIteration:
-                break
-        if read > requested:
-            self._content = data[requested:]
-            data = data[:requested]
-        else:
-            self._content = b""
+                self._stream = None
+        data = bytes(memoryview(self._content)[:requested])
+        del self._content[:requested]
         return data
 
     def size(self):
@@ -97,6 +102,7 @@ class HttpResponseDataFiltered(HttpResponseData):
         self._stream = None
         self._content = self._request.content
         self.contentFilter()
+        self._content = bytearray(self._content)
         self._size = len(self._content)
 
     # pylint: disable-next=invalid-name
@@ -217,6 +223,137 @@ class HttpResponseDataFilteredGrub(HttpResponseDataFiltered):
             self._content = cobbler_content.encode("utf-8")
 
 
+class ContentCache:
+    """
+    On-disk cache of the files fetched over HTTP, shared by all the handler
+    processes.
+
+    Every entry is the file content plus a JSON file with its ETag and
+    Last-Modified headers. Entries younger than ttl seconds are served as
+    they are, older ones are revalidated with a conditional request. A lock
+    file per entry makes concurrent requests for the same file wait for a
+    single transfer instead of fetching it each.
+    """
+
+    def __init__(self, directory, ttl, max_size):
+        self._directory = directory
+        self._ttl = ttl
+        self._max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, url, capath):
+        """Returns a FileResponseData reading the up-to-date copy of url."""
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        path = os.path.join(self._directory, key)
+        with open(path + ".lock", "wb") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                meta = self._read_meta(path)
+                if meta is None or time.time() - meta["checked"] > self._ttl:
+                    fetched = self._fetch(url, capath, path, meta)
+                else:
+                    fetched = False
+                    logging.debug("Serving %s from cache", url)
+                # Used as access time by the eviction
+                os.utime(path)
+                # Opened before anybody else can replace or evict it
+                data = FileResponseData(path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        if fetched:
+            self._evict()
+        return data
+
+    @staticmethod
+    def _read_meta(path):
+        try:
+            with open(path + ".json", encoding="utf-8") as source:
+                meta = json.load(source)
+        except (IOError, ValueError):
+            return None
+        if not os.path.exists(path):
+            return None
+        return meta
+
+    def _fetch(self, url, capath, path, meta):
+        """Fetches or revalidates url, returns True if it was downloaded."""
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        with requests.get(
+            url, stream=True, verify=capath, headers=headers, timeout=HTTP_TIMEOUT
+        ) as r:
+            if r.status_code == 404:
+                self._remove(path)
+                raise FileNotFoundError()
+            r.raise_for_status()
+            if r.status_code == 304:
+                logging.debug("Cached copy of %s is still valid", url)
+                meta["checked"] = time.time()
+                self._write_meta(path, meta)
+                return False
+
+            logging.debug("Downloading %s to the cache", url)
+            fd, tmp = tempfile.mkstemp(dir=self._directory, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as target:
+                    for chunk in r.iter_content(chunk_size=HTTP_CHUNK_SIZE):
+                        target.write(chunk)
+                # Handlers still reading the previous copy keep their inode
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+            self._write_meta(
+                path,
+                {
+                    "url": url,
+                    "etag": r.headers.get("etag"),
+                    "last_modified": r.headers.get("last-modified"),
+                    "checked": time.time(),
+                },
+            )
+        return True
+
+    @staticmethod
+    def _write_meta(path, meta):
+        tmp = f"{path}.json.tmp-{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as target:
+            json.dump(meta, target)
+        os.replace(tmp, path + ".json")
+
+    @staticmethod
+    def _remove(path):
+        for name in (path, path + ".json"):
+            try:
+                os.unlink(name)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        """Removes the least recently used entries above max_size bytes."""
+        entries = []
+        total = 0
+        with os.scandir(self._directory) as it:
+            for entry in it:
+                if "." in entry.name or not entry.is_file():
+                    continue
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self._max_size:
+                break
+            logging.debug("Evicting %s from the cache", path)
+            self._remove(path)
+            total -= size
+
+
 class TFTPHandler(BaseHandler):
     """Individual TFTP connection handler."""
 
@@ -232,6 +369,7 @@ class TFTPHandler(BaseHandler):
         server_fqdn,
         capath,
         replace_fqdns,
+        cache=None,
     ):
         self._root = root
         self._http_host = http_host
@@ -239,6 +377,7 @@ class TFTPHandler(BaseHandler):
         self._server_fqdn = server_fqdn
         self._capath = capath
         self._replace_fqdns = replace_fqdns
+        self._cache = cache
         super().__init__(server_addr, peer, path, options, stats)
 
     def get_response_data(self):
@@ -292,6 +431,9 @@ class TFTPHandler(BaseHandler):
                 self._replace_fqdns,
             )
         # The rest get from http
+        if self._cache is not None:
+            logging.debug("Got request for %s, serving from cache", path)
+            return self._cache.get(f"{target}/tftp/{path}", capath)
         logging.debug("Got request for %s, forwarding to HTTP", path)
         return HttpResponseData(f"{target}/tftp/{path}", capath)
 
@@ -311,8 +453,10 @@ class TFTPServer(BaseServer):
         server_fqdn,
         capath,
         replace_fqdns,
+        cache=None,
     ):
         self._root = root
+        self._cache = cache
         if capath is None or http_host == "localhost":
             self._http_host = f"http://{http_host}"
             logging.info("SSL not used for inproxy communication")
@@ -338,6 +482,7 @@ class TFTPServer(BaseServer):
             self._server_fqdn,
             self._capath,
             self._replace_fqdns,
+            self._cache,
         )
 
 
@@ -408,6 +553,27 @@ def get_arguments():
         dest="replace_fqdns",
         help="Replace additional FQDNs with proxy hostname in cobbler menu files",
     )
+    parser.add_argument(
+        "--cacheDir",
+        type=str,
+        default="/var/cache/tftp",
+        help="Directory caching the files fetched over HTTP, empty to disable",
+        dest="cache_dir",
+    )
+    parser.add_argument(
+        "--cacheTtl",
+        type=int,
+        default=60,
+        help="Seconds a cached file is served before being revalidated",
+        dest="cache_ttl",
+    )
+    parser.add_argument(
+        "--cacheMaxSize",
+        type=int,
+        default=2048,
+        help="Maximum size of the cache in MiB",
+        dest="cache_max_size",
+    )
     return parser.parse_args()
 
 
@@ -443,6 +609,16 @@ def main():
     logging.info("CA path: %s", args.caPath)
     logging.info("Replace FQDNs: %s", args.replace_fqdns)
 
+    cache = None
+    if args.cache_dir:
+        try:
+            cache = ContentCache(
+                args.cache_dir, args.cache_ttl, args.cache_max_size * 1024 * 1024
+            )
+            logging.info("Cache directory: %s", args.cache_dir)
+        except OSError as err:
+            logging.warning("Cannot use the cache directory: %s", str(err))
+
     server = TFTPServer(
         args.ip,
         args.port,
@@ -454,6 +630,7 @@ def main():
         args.server_fqdn,
         args.caPath,
         args.replace_fqdns,
+        cache,
     )
 
     try:
@@ -21,6 +21,8 @@
 import os
 import time
 import glob
+import threading
+from collections import OrderedDict
 try:
     # python 3
     import pickle as cPickle
@@ -52,6 +54,11 @@ from uyuni.common.usix import raise_with_tb
 PKG_LIST_DIR = os.path.join(CFG.PKG_DIR, 'list')
 PREFIX = "rhn"
 
+# Package mappings kept in memory by every process, see _getPackageMapping
+MAPPING_CACHE_SIZE = 32
+_mappingCache = OrderedDict()
+_mappingCacheLock = threading.Lock()
+
 
 class NotLocalError(Exception):
     pass
@@ -86,9 +93,7 @@ class Repository(rhnRepository.Repository):
         """
 
         log_debug(3, pkgFilename)
-        mappingName = "package_mapping:%s:" % self.channelName
-        mapping = self._cacheObj(mappingName, self.channelVersion,
-                                 self.__channelPackageMapping, ())
+        mapping = self._getPackageMapping()
 
         # If the file name has parameters, it's a different kind of package.
         # Determine the architecture requested so we can construct an
@@ -120,6 +125,40 @@ class Repository(rhnRepository.Repository):
         log_debug(4, "Package not found locally: %s" % pkgFilename)
         raise NotLocalError(filePaths[0], pkgFilename)
 
+    def _getPackageMapping(self):
+        """ Returns the package mapping of the channel version.
+
+            Unpickling the mapping of a big channel for every package request
+            is expensive, so the mappings are kept in memory, keyed on the
+            channel and its version. The cache file is stat()ed on every call:
+            if it was removed or rewritten the mapping is loaded again.
+        """
+        mappingName = "package_mapping:%s:" % self.channelName
+        filePath = "%s/%s-%s" % (PKG_LIST_DIR, mappingName, self.channelVersion)
+        key = (self.channelName, self.channelVersion)
+
+        signature = _fileSignature(filePath)
+        with _mappingCacheLock:
+            entry = _mappingCache.get(key)
+            if entry is not None and signature is not None and entry[0] == signature:
+                _mappingCache.move_to_end(key)
+                return entry[1]
+
+        mapping = self._cacheObj(mappingName, self.channelVersion,
+                                 self.__channelPackageMapping, ())
+        signature = _fileSignature(filePath)
+
+        cacheSize = int(CFG.get('package_mapping_cache_size', MAPPING_CACHE_SIZE))
+        with _mappingCacheLock:
+            # Older versions of the channel will not be requested anymore
+            for k in [k for k in _mappingCache if k[0] == self.channelName]:
+                del _mappingCache[k]
+            if cacheSize > 0:
+                _mappingCache[key] = (signature, mapping)
+            while len(_mappingCache) > cacheSize:
+                _mappingCache.popitem(last=False)
+        return mapping
+
     def getSourcePackagePath(self, pkgFilename):
         """ OVERLOADS getSourcePackagePath in common/rhnRepository.
             snag src.rpm and nosrc.rpm from local repo, after ensuring
@@ -407,6 +446,17 @@ class TinyUrlRepository(KickstartRepository):
         return server.proxy.getTinyUrlChannel(self.tinyurl, self.systemId)
 
 
+def _fileSignature(filePath):
+    """ Returns what changes when a cache file gets replaced, None if the
+        file does not exist.
+    """
+    try:
+        st = os.stat(filePath)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime)
+
+
 def isSolarisArch(arch):
     """
     Returns true if the given arch string represents a solaris architecture.
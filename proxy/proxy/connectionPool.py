@@ -0,0 +1,162 @@
+# Keep-alive connections from the proxy to its parent.
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Every apache worker keeps the connections to its parent (server, next
+# proxy or the local squid) open after a request completed, so that the
+# next request does not have to go through the TCP and TLS handshakes
+# again. Connections are keyed on everything that was used to create them.
+
+import select
+import socket
+import threading
+import time
+
+from spacewalk.common.rhnConfig import CFG
+from spacewalk.common.rhnLog import log_debug
+
+# Idle connections kept per key
+DEFAULT_MAX_IDLE = 4
+# Seconds after which an idle connection is not used anymore
+DEFAULT_IDLE_TIMEOUT = 60
+
+
+class ConnectionPool:
+
+    """ Pool of idle parent connections, shared by the threads of a worker. """
+
+    def __init__(self, max_idle=DEFAULT_MAX_IDLE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'released': 0,
+            'discarded': 0,
+            'expired': 0,
+            'stale': 0,
+        }
+
+    def get(self, key, factory):
+        """ Returns a (connection, reused) tuple. An idle connection for key
+            is handed out if a healthy one is available, otherwise factory()
+            is called to create a new (not yet connected) one.
+        """
+        while 1:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    self._stats['created'] += 1
+                    break
+                connection, released = idle.pop()
+            if time.time() - released > self.idle_timeout:
+                self._count('expired')
+                connection.close()
+                continue
+            if not is_alive(connection):
+                self._count('stale')
+                connection.close()
+                continue
+            self._count('reused')
+            return connection, True
+        return factory(), False
+
+    def release(self, key, connection):
+        """ Gives back a connection whose response was completely read. """
+        if connection.sock is None or self.max_idle <= 0:
+            self.discard(connection)
+            return
+        now = time.time()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            # Drop the connections that idled for too long, the oldest first
+            while idle and now - idle[0][1] > self.idle_timeout:
+                idle.pop(0)[0].close()
+                self._stats['expired'] += 1
+            if len(idle) >= self.max_idle:
+                idle.pop(0)[0].close()
+                self._stats['discarded'] += 1
+            idle.append((connection, now))
+            self._stats['released'] += 1
+        log_debug(4, 'Parent connection pool:', self.stats())
+
+    def discard(self, connection):
+        """ Closes a connection that cannot be used anymore. """
+        self._count('discarded')
+        connection.close()
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in list(idle.values()):
+            for connection, _released in connections:
+                connection.close()
+
+    def stats(self):
+        """ Returns the pool counters plus the reuse rate in percent. """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = sum(len(c) for c in list(self._idle.values()))
+        total = stats['created'] + stats['reused']
+        stats['reuse_rate'] = 0.0
+        if total:
+            stats['reuse_rate'] = 100.0 * stats['reused'] / total
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+def is_alive(connection):
+    """ An idle keep-alive connection must not have anything to read: the
+        socket becomes readable only when the parent closed it (or sent
+        garbage we cannot match with a request anyway).
+    """
+    sock = connection.sock
+    if sock is None:
+        return False
+    # rhn.SSL.SSLSocket wraps the real socket
+    sock = getattr(sock, '_sock', sock)
+    try:
+        readable, _w, _x = select.select([sock], [], [], 0)
+    except (socket.error, ValueError):
+        return False
+    return not readable
+
+
+def is_reusable(connection, response):
+    """ A connection can be sent another request once the response has been
+        read to its end and neither side asked to close it.
+    """
+    if connection is None or connection.sock is None:
+        return False
+    if response is None or not hasattr(response, 'isclosed'):
+        return False
+    return response.isclosed() and not response.will_close
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """ Returns the pool of this worker, None if pooling is disabled. """
+    global _pool  # pylint: disable=global-statement
+    max_idle = int(CFG.get('parent_pool_max_idle', DEFAULT_MAX_IDLE))
+    if max_idle <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            idle_timeout = int(CFG.get('parent_pool_idle_timeout', DEFAULT_IDLE_TIMEOUT))
+            _pool = ConnectionPool(max_idle, idle_timeout)
+    return _pool
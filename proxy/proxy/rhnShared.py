@@ -21,6 +21,12 @@ try:
 except ImportError:
     # python 2
     import urllib
+try:
+    # python 3
+    import http.client as httplib
+except ImportError:
+    # python 2
+    import httplib
 import socket
 import sys
 
@@ -41,11 +47,47 @@ from uyuni.common import rhnLib
 from uyuni.common.usix import raise_with_tb, ListType, TupleType
 
 # local imports
+from . import connectionPool
 from . import rhnConstants
 from .responseContext import ResponseContext
 
 PRODUCT_NAME = "SUSE Multi-Linux Manager"
 
+
+class StreamedBody:
+
+    """ WSGI iterable passing the body of a parent response through to the
+        client. mod_wsgi writes every chunk out before it asks for the next
+        one, so the parent is read at the pace of the client and nothing is
+        spooled on the proxy.
+    """
+
+    def __init__(self, response, size, onClose=None):
+        self.response = response
+        self.size = size
+        self.onClose = onClose
+
+    def __iter__(self):
+        left = self.size
+        while left > 0:
+            try:
+                buf = self.response.read(min(CFG.BUFFER_SIZE, left))
+            except IOError:
+                log_error("Error reading the response body from the parent")
+                break
+            if not buf:
+                break
+            left = left - len(buf)
+            yield buf
+
+    def close(self):
+        """ Called by the WSGI server once the body was sent, or the client
+            went away.
+        """
+        if self.onClose is not None:
+            onClose, self.onClose = self.onClose, None
+            onClose(self.response)
+
 class SharedHandler:
 
     """ Shared handler class (between rhnBroker and rhnRedirect.
@@ -71,6 +113,12 @@ class SharedHandler:
         self.responseContext = ResponseContext()
         self.uri = None   # ''
 
+        # (pool key, connection) of the pooled parent connection in use
+        self._pooled = None
+        self._connectionReused = False
+        # Parent connection of a response body still streamed to the client
+        self._streamConnection = None
+
         # Common settings for both the proxy and the redirect
         # broker and redirect immediately alter these for their own purposes
         self.caChain = CFG.CA_CHAIN
@@ -119,7 +167,10 @@ class SharedHandler:
         """
 
         scheme, host, port, self.uri, query = self._parse_url(self.rhnParent)
-        self.responseContext.setConnection(self._create_connection())
+        # A previous attempt (e.g. with an expired proxy token) is done
+        self._releaseConnection()
+        connection, self._connectionReused = self._get_connection()
+        self.responseContext.setConnection(connection)
 
         if not self.uri:
             self.uri = '/'
@@ -147,7 +198,10 @@ class SharedHandler:
         log_debug(3, 'CA cert:', self.caChain)
 
         try:
-            self.responseContext.getConnection().connect()
+            if self._connectionReused:
+                log_debug(3, 'Reusing keep-alive connection to parent')
+            else:
+                self.responseContext.getConnection().connect()
         except socket.error as e:
             log_error("Error opening connection", self.rhnParent, e)
             Traceback(mail=0)
@@ -169,6 +223,73 @@ class SharedHandler:
         log_debug(4, "Other connection info: %s:%s%s" %
                   (peer[0], peer[1], self.uri))
 
+    def _get_connection(self):
+        """ Returns a (connection, reused) tuple. The connection comes from
+            the pool of this worker if pooling is enabled.
+        """
+        pool = connectionPool.get_pool()
+        if pool is None:
+            return self._create_connection(), False
+        key = self._connection_key()
+        connection, reused = pool.get(key, self._create_connection)
+        self._pooled = (key, connection)
+        return connection, reused
+
+    def _connection_key(self):
+        """ Everything _create_connection uses to build a connection. """
+        scheme, host, port, _uri, _query = self._parse_url(self.rhnParent)
+        if self.httpProxy in ['127.0.0.1:8080', 'localhost:8080']:
+            host = 'localhost'
+        return (scheme, host, port, self.httpProxy, self.httpProxyUsername,
+                self.caChain)
+
+    def _releaseConnection(self):
+        """ Hands the parent connection of the current context back to the
+            pool if another request can be sent over it, closes it otherwise.
+        """
+        if self._releaseParent(self.responseContext.getConnection(),
+                               self.responseContext.getBodyFd()):
+            self.responseContext.setConnection(None)
+
+    def _releaseParent(self, connection, response):
+        """ Returns False if connection does not come from the pool. """
+        pool = connectionPool.get_pool()
+        # Connections opened to redirect locations are not pooled
+        if pool is None or self._pooled is None or connection is not self._pooled[1]:
+            return False
+        if connectionPool.is_reusable(connection, response):
+            pool.release(self._pooled[0], connection)
+        else:
+            pool.discard(connection)
+        self._pooled = None
+        return True
+
+    def _streamClosed(self, response):
+        """ The client got the streamed body (or went away): release the
+            parent connection the way _clientCommo does for spooled bodies.
+        """
+        connection, self._streamConnection = self._streamConnection, None
+        pooled = self._releaseParent(connection, response)
+        response.close()
+        if not pooled and connection is not None:
+            connection.close()
+
+    def _reconnect(self):
+        """ Replaces a reused connection the parent closed in the meantime. """
+        log_debug(2, 'Reused connection to parent failed, reconnecting')
+        connection = self.responseContext.getConnection()
+        pool = connectionPool.get_pool()
+        if pool is not None:
+            pool.discard(connection)
+        else:
+            connection.close()
+        connection = self._create_connection()
+        if self._pooled is not None:
+            self._pooled = (self._pooled[0], connection)
+        self._connectionReused = False
+        self.responseContext.setConnection(connection)
+        connection.connect()
+
     def _create_connection(self):
         """ Returns a Connection object """
         scheme, host, port, _uri, _query = self._parse_url(self.rhnParent)
@@ -228,12 +349,18 @@ class SharedHandler:
         # handler for this server
         # We add path_info to the put (GET, CONNECT, HEAD, PUT, POST) request.
         log_debug(2, self.req.method, self.uri)
-        self.responseContext.getConnection().putrequest(self.req.method,
-                                                        self.uri)
 
         # Send the headers, the body and expect a response
         try:
-            status, headers, bodyFd = self._proxy2server()
+            try:
+                status, headers, bodyFd = self._sendRequest()
+            except (IOError, httplib.HTTPException):
+                if not self._connectionReused:
+                    raise
+                # The parent may close an idle keep-alive connection at any
+                # time; the request body is kept in a SmartIO, just resend it
+                self._reconnect()
+                status, headers, bodyFd = self._sendRequest()
             self.responseContext.setHeaders(headers)
             self.responseContext.setBodyFd(bodyFd)
         except IOError:
@@ -257,6 +384,11 @@ class SharedHandler:
 
         return self._handleServerResponse(status)
 
+    def _sendRequest(self):
+        self.responseContext.getConnection().putrequest(self.req.method,
+                                                        self.uri)
+        return self._proxy2server()
+
     def _handleServerResponse(self, status):
         """ This method can be overridden by subclasses who want to handle server
             responses in their own way.  By default, we will wrap all the headers up
@@ -306,7 +438,15 @@ class SharedHandler:
             Traceback("SharedHandler._clientCommo", self.req, mail=0)
             return apache.HTTP_SERVICE_UNAVAILABLE
 
-        # Close all open response contexts.
+        if self._streamConnection is not None:
+            # The body is still to be read from the parent; StreamedBody
+            # releases the response and its connection when done
+            self.responseContext.setBodyFd(None)
+            self.responseContext.setConnection(None)
+
+        # Keep the parent connection for the next request, then close all
+        # open response contexts.
+        self._releaseConnection()
         self.responseContext.clear()
 
         return status
@@ -475,8 +615,18 @@ class SharedHandler:
 
         # Now fill in the bytes if need be.
 
-        # read content if there is some or the size is unknown
-        if (size > 0 or size == -1) and (toRequest.method != 'HEAD'):
+        if toRequest.method == 'HEAD':
+            return
+
+        # Pass bodies of a known size straight through to the client
+        if size > 0 and CFG.get('stream_response_body', 1):
+            log_debug(4, "Streaming the response body")
+            self._streamConnection = self.responseContext.getConnection()
+            toRequest.output = StreamedBody(fromResponse, size, self._streamClosed)
+            return
+
+        # read content if the size is unknown (or streaming is disabled)
+        if size > 0 or size == -1:
             tfile = SmartIO(max_mem_size=CFG.MAX_MEM_FILE_SIZE)
             buf = fromResponse.read(CFG.BUFFER_SIZE)
             while buf:
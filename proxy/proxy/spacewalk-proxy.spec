@@ -405,6 +405,7 @@ fi
 %{destdir}/rhnShared.py*
 %{destdir}/rhnConstants.py*
 %{destdir}/responseContext.py*
+%{destdir}/connectionPool.py*
 %{destdir}/rhnAuthCacheClient.py*
 %{destdir}/rhnProxyAuth.py*
 %{destdir}/rhnAuthProtocol.py*
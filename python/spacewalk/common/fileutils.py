@@ -7,9 +7,12 @@ Part of spacewalk.common and available on Uyuni servers only.
 
 """
 
+import errno
+import fcntl
 import os
+import shutil
 
-from spacewalk.common.rhnConfig import cfg_component
+from spacewalk.common.rhnConfig import config_snapshot
 
 # Re-export to allow users to only import spacewalk.common.fileutils
 # pylint: disable-next=wildcard-import,unused-wildcard-import
@@ -20,8 +23,7 @@ def chown_chmod_path(path, user=None, group="root", chmod=0o0750):
     """Set permissions and owner for path."""
 
     if user is None:
-        with cfg_component(component=None) as cfg:
-            user = cfg.get("httpd_user", "wwwrun")
+        user = config_snapshot().get("httpd_user", "wwwrun")
 
     if not os.path.exists(path):
         raise FileNotFoundError(
@@ -60,11 +62,11 @@ def create_path(path, user=None, group=None, chmod=0o0755):
     if not path:
         raise ValueError(f"ERROR: create_path(): Invalid path '{path}'.")
 
-    with cfg_component(component=None) as cfg:
-        if user is None:
-            user = cfg.get("httpd_user", "wwwrun")
-        if group is None:
-            group = cfg.get("httpd_group", "www")
+    cfg = config_snapshot()
+    if user is None:
+        user = cfg.get("httpd_user", "wwwrun")
+    if group is None:
+        group = cfg.get("httpd_group", "www")
 
     path = cleanupAbsPath(path)
     if not os.path.exists(path):
@@ -93,3 +95,44 @@ def setPathPerms(path, user=None, group="root", chmod=0o0750):
 def createPath(path, user=None, group=None, chmod=int("0755", 8)):
     """Deprecated, please use create_path"""
     return create_path(path, user=user, group=group, chmod=chmod)
+
+
+# ioctl_ficlone(2), share the data blocks of a file with another one
+FICLONE = 0x40049409
+
+
+def copy_file(source, target):
+    """Copy the content of source to target.
+
+    The data blocks are shared with source if the filesystem supports
+    reflinks, otherwise copy_file_range(2) copies them inside the kernel
+    (or on the server for network filesystems). Other systems fall back
+    to a plain copy.
+    """
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+        if hasattr(os, "copy_file_range"):
+            try:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if not copied:
+                        break
+                    remaining -= copied
+                return
+            except OSError as e:
+                if e.errno not in (
+                    errno.EXDEV,
+                    errno.ENOSYS,
+                    errno.EINVAL,
+                    errno.EOPNOTSUPP,
+                ):
+                    raise
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+        shutil.copyfileobj(src, dst)
@@ -592,17 +592,30 @@ class DpkgRepo:
         ):
             return True
 
+        checksum = self.get_pkg_index_checksum()
+        if checksum is None:
+            return False
+
+        algorithm, entry_checksum = checksum
+        return getattr(hashlib, algorithm)(data).hexdigest() == entry_checksum
+
+    def get_pkg_index_checksum(self) -> typing.Optional[typing.Tuple[str, str]]:
+        """
+        Get the strongest checksum of the Packages index listed in the Release file.
+
+        :return: (algorithm, checksum) tuple or None if there is none
+        """
+        name, _ = self.get_pkg_index_raw()
+        if not name:
+            return None
+
         entry = self.get_release_index().get(name)
         if entry is None:
-            return False
+            return None
 
-        result = False
         for algorithm in ("sha512", "sha384", "sha256", "sha1", "md5"):
             entry_checksum = getattr(entry.checksum, algorithm, None)
             if entry_checksum:
-                result = getattr(hashlib, algorithm)(data).hexdigest() == entry_checksum
-                break
-            else:
-                continue
+                return algorithm, entry_checksum
 
-        return result
+        return None
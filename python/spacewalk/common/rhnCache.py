@@ -16,6 +16,11 @@
 # This module implements a simple object caching system using shelves
 # stored in files on the file system
 #
+# The module level functions (get, set, has_key, delete) keep the most
+# recently used values of the process in memory as well, in front of the
+# files. An entry in memory is only used while the file it was read from
+# is unchanged, so entries written by other processes are picked up.
+#
 
 import os
 import gzip
@@ -28,10 +33,15 @@ except ImportError:
     import pickle as cPickle
 import fcntl
 import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
 from stat import ST_MTIME
-from errno import EEXIST
+from errno import EEXIST, ENOENT
 
 from spacewalk.common.fileutils import chown_chmod_path
+from spacewalk.common.rhnConfig import CFG
 
 from uyuni.common.rhnLib import timestamp
 from uyuni.common.usix import raise_with_tb
@@ -41,6 +51,36 @@ from uyuni.common.fileutils import makedirs
 # to reserve our own shared memory space.
 CACHEDIR = "/var/cache/rhn"
 
+# Defaults of the cache_memory_size (MB per process), cache_max_size (MB per
+# directory below CACHEDIR) and cache_max_age (days) options
+MEMORY_SIZE = 16
+MAX_SIZE = 1024
+MAX_AGE = 30
+# Seconds between two evictions of the same directory by a process
+EVICT_INTERVAL = 300
+# The directories below CACHEDIR whose entries are only written through
+# this module, and so are trimmed by it. Everything else in CACHEDIR (the
+# reposync caches, ...) belongs to somebody else.
+EVICTED_DIRECTORIES = (
+    "dump",
+    "headers",
+    "satsync",
+    "xml-channel-packages",
+    "xml-channels",
+    "xml-kickstartable-tree",
+    "xml-packages",
+    "xml-short-packages",
+)
+
+_stats = {
+    "memory_hits": 0,
+    "memory_misses": 0,
+    "memory_evictions": 0,
+    "disk_hits": 0,
+    "disk_misses": 0,
+    "disk_evictions": 0,
+}
+
 
 def cleanupPath(path):
     """take ~taw/../some/path/$MOUNT_POINT/blah and make it sensible."""
@@ -72,7 +112,7 @@ def _unlock(fd):
 
 
 def get(name, modified=None, raw=None, compressed=None, missing_is_null=1):
-    cache = __get_cache(raw, compressed)
+    cache = TieredCache(__get_cache(raw, compressed), _get_memory(), (raw, compressed))
 
     if missing_is_null:
         cache = NullCache(cache)
@@ -91,23 +131,62 @@ def set(
     mode=int("0755", 8),
 ):
     # pylint: disable=W0622
-    cache = __get_cache(raw, compressed)
+    cache = TieredCache(__get_cache(raw, compressed), _get_memory(), (raw, compressed))
 
     cache.set(name, value, modified, user, group, mode)
 
 
 def has_key(name, modified=None):
-    cache = Cache()
+    cache = AtomicCache()
     return cache.has_key(name, modified)
 
 
 def delete(name):
-    cache = Cache()
+    cache = TieredCache(AtomicCache(), _get_memory(), None)
     cache.delete(name)
 
 
+def stats():
+    """Counters of the cache use by this process."""
+    result = dict(_stats)
+    memory = _get_memory()
+    result["memory_entries"] = len(memory)
+    result["memory_size"] = memory.size
+    return result
+
+
+def reset():
+    """Forget the entries kept in memory and the counters."""
+    # pylint: disable-next=global-statement
+    global _memory
+    _memory = None
+    for key in _stats:
+        _stats[key] = 0
+
+
+def _option(name, default):
+    if CFG.is_initialized():
+        return int(CFG.get(name, default))
+    return default
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def _get_memory():
+    # pylint: disable-next=global-statement
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = MemoryCache(
+                _option("cache_memory_size", MEMORY_SIZE) * 1024 * 1024
+            )
+        return _memory
+
+
 def __get_cache(raw, compressed):
-    cache = Cache()
+    cache = AtomicCache()
     if compressed:
         cache = CompressedCache(cache)
     if not raw:
@@ -265,6 +344,153 @@ class WriteLockedFile(LockedFile):
             os.utime(self.fname, (self.modified, self.modified))
 
 
+class AtomicWriteFile(object):
+    """
+    A cache file written to a temporary file and renamed over the entry on
+    close, so readers never see a partially written entry and need no lock.
+    """
+
+    def __init__(
+        self, name, modified=None, user="root", group="root", mode=int("0755", 8)
+    ):
+        if modified:
+            self.modified = timestamp(modified)
+        else:
+            self.modified = None
+
+        self.fname = _fname(name)
+        dirname = os.path.dirname(self.fname)
+        if not os.path.isdir(dirname):
+            try:
+                makedirs(dirname, mode, user, group)
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+        fd, self.tmpname = tempfile.mkstemp(
+            # pylint: disable-next=consider-using-f-string
+            prefix=".%s." % os.path.basename(self.fname),
+            dir=dirname,
+        )
+        os.fchmod(fd, int("0644", 8))
+        self.fd = os.fdopen(fd, "wb")
+        self.user = user
+        self.group = group
+        self.closed = False
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf8")
+        self.fd.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.fd.close()
+        if self.modified:
+            os.utime(self.tmpname, (self.modified, self.modified))
+        chown_chmod_path(self.tmpname, self.user, self.group, int("0644", 8))
+        os.rename(self.tmpname, self.fname)
+
+    def abort(self):
+        """Throw away what was written so far."""
+        if not self.closed:
+            self.closed = True
+            self.fd.close()
+            os.unlink(self.tmpname)
+
+    def __getattr__(self, x):
+        return getattr(self.fd, x)
+
+
+class CacheLock(object):
+    """
+    Exclusive lock on a cache entry, shared between processes.
+
+    Used to let a single process (re)generate an entry while the others wait
+    for it. The lock is reentrant within a thread.
+    """
+
+    _held = threading.local()
+
+    def __init__(self, name):
+        self.fname = _fname(name) + ".lock"
+
+    def __enter__(self):
+        held = self._held.__dict__.setdefault("locks", {})
+        if self.fname in held:
+            held[self.fname][1] += 1
+            return self
+
+        dirname = os.path.dirname(self.fname)
+        if not os.path.isdir(dirname):
+            try:
+                makedirs(dirname, int("0755", 8))
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+        fd = os.open(self.fname, os.O_RDWR | os.O_CREAT, int("0644", 8))
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        held[self.fname] = [fd, 1]
+        return self
+
+    def __exit__(self, *args):
+        held = self._held.__dict__["locks"]
+        held[self.fname][1] -= 1
+        if held[self.fname][1] == 0:
+            fd = held.pop(self.fname)[0]
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+def evict(name, max_size, max_age=None):
+    """
+    Remove the least recently used entries below the cache directory name
+    until their total size is at most max_size bytes, and the entries not
+    read for more than max_age seconds.
+
+    Leftovers of interrupted atomic writes older than an hour are removed too.
+    """
+    dirname = _fname(name)
+    entries = []
+    total = 0
+    now = time.time()
+    for root, _dirs, files in os.walk(dirname):
+        for f in files:
+            path = os.path.join(root, f)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if f.endswith(".lock"):
+                continue
+            if f.startswith("."):
+                if st.st_mtime < now - 3600:
+                    _unlink(path)
+                continue
+            entries.append((st.st_atime, st.st_size, path))
+            total += st.st_size
+
+    evicted = 0
+    entries.sort()
+    for atime, size, path in entries:
+        if total <= max_size and (max_age is None or atime >= now - max_age):
+            break
+        _unlink(path)
+        total -= size
+        evicted += 1
+    return evicted
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        e = sys.exc_info()[1]
+        if e.errno != ENOENT:
+            raise
+
+
 # pylint: disable-next=missing-class-docstring
 class Cache:
     def __init__(self):
@@ -332,6 +558,190 @@ class Cache:
         return fd
 
 
+class AtomicCache(Cache):
+    """
+    A Cache whose entries are replaced atomically, so reads take no lock.
+
+    Reading an entry marks it as recently used for evict().
+    """
+
+    @staticmethod
+    def get_file(name, modified=None):
+        fname = _fname(name)
+        try:
+            fd = open(fname, "rb")
+        except IOError:
+            raise_with_tb(KeyError(name), sys.exc_info()[2])
+
+        st = os.fstat(fd.fileno())
+        if modified and st[ST_MTIME] != timestamp(modified):
+            fd.close()
+            raise KeyError(name)
+
+        _touch(fname, st.st_mtime_ns)
+        return fd
+
+    @staticmethod
+    def set_file(name, modified=None, user="root", group="root", mode=int("0755", 8)):
+        return AtomicWriteFile(name, modified, user, group, mode)
+
+    @staticmethod
+    def lock(name):
+        return CacheLock(name)
+
+
+class MemoryCache:
+    """
+    Values kept in memory, up to max_size bytes, least recently used first
+    out. Every value is stored along with the signature of the file it was
+    read from and only returned for the same signature.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, signature):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                _stats["memory_misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            _stats["memory_hits"] += 1
+            return entry
+
+    def set(self, key, signature, value, size):
+        with self._lock:
+            self._pop(key)
+            # a single value must not push out everything else
+            if size > self.max_size / 4:
+                return
+            self._entries[key] = (signature, value, size)
+            self.size += size
+            while self.size > self.max_size:
+                self._pop(next(iter(self._entries)))
+                _stats["memory_evictions"] += 1
+
+    def pop(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+
+class TieredCache:
+    """
+    Keeps the values of cache (an ObjectCache, CompressedCache or Cache on
+    top of an AtomicCache) in memory.
+
+    Strings are kept as they are, other objects pickled, so every caller
+    still gets its own copy. Setting an entry trims the directory of
+    EVICTED_DIRECTORIES it is in to cache_max_size and cache_max_age once
+    in a while.
+    """
+
+    _evicted = {}
+
+    def __init__(self, cache, memory, kind):
+        self.cache = cache
+        self.memory = memory
+        # raw and compressed flags of the values
+        self.kind = kind and (bool(kind[0]), bool(kind[1]))
+
+    def get(self, name, modified=None):
+        try:
+            st = os.stat(_fname(name))
+        except OSError:
+            _stats["disk_misses"] += 1
+            raise_with_tb(KeyError(name), sys.exc_info()[2])
+        signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if not modified or st[ST_MTIME] == timestamp(modified):
+            entry = self.memory.get((self.kind, name), signature)
+            if entry is not None:
+                if st.st_atime < time.time() - EVICT_INTERVAL:
+                    # keep the file from being evicted from disk
+                    _touch(_fname(name), st.st_mtime_ns)
+                return self._load(entry[1])
+
+        try:
+            value = self.cache.get(name, modified)
+        except KeyError:
+            _stats["disk_misses"] += 1
+            raise
+        _stats["disk_hits"] += 1
+        self._remember(name, signature, value)
+        return value
+
+    def set(
+        self, name, value, modified=None, user="root", group="root", mode=int("0755", 8)
+    ):
+        self.memory.pop((self.kind, name))
+        self.cache.set(name, value, modified, user, group, mode)
+        self._evict(name)
+
+    def has_key(self, name, modified=None):
+        return self.cache.has_key(name, modified)
+
+    def delete(self, name):
+        for raw in (False, True):
+            for compressed in (False, True):
+                self.memory.pop(((raw, compressed), name))
+        self.cache.delete(name)
+
+    def _remember(self, name, signature, value):
+        if isinstance(value, (str, bytes)):
+            stored = value
+        else:
+            stored = _Pickled(cPickle.dumps(value, -1))
+        self.memory.set((self.kind, name), signature, stored, len(stored))
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, _Pickled):
+            return cPickle.loads(value)
+        return value
+
+    def _evict(self, name):
+        # absolute names (files written by the ISS dumper) and names outside
+        # of the directories this module owns are never trimmed
+        directory = os.path.normpath(name).split(os.sep)[0]
+        if directory not in EVICTED_DIRECTORIES:
+            return
+        if not _fname(name).startswith(_fname(directory) + os.sep):
+            return
+        now = time.time()
+        if self._evicted.get(directory, 0) > now - EVICT_INTERVAL:
+            return
+        self._evicted[directory] = now
+        max_age = _option("cache_max_age", MAX_AGE) * 24 * 3600
+        evicted = evict(
+            directory,
+            _option("cache_max_size", MAX_SIZE) * 1024 * 1024,
+            max_age or None,
+        )
+        _stats["disk_evictions"] += evicted
+
+
+class _Pickled(bytes):
+    """A value kept in memory in its pickled form."""
+
+
+def _touch(fname, mtime_ns):
+    try:
+        os.utime(fname, ns=(int(time.time() * 1e9), mtime_ns))
+    except OSError:
+        pass
+
+
 class ClosingZipFile(object):
     """Like a GzipFile, but close closes both files."""
 
@@ -458,3 +868,6 @@ class NullCache:
         self, name, modified=None, user="root", group="root", mode=int("0755", 8)
     ):
         return self.cache.set_file(name, modified, user, group, mode)
+
+    def lock(self, name):
+        return self.cache.lock(name)
@@ -19,8 +19,11 @@ import sys
 import glob
 import stat
 import re
+import threading
+import time
 
 from contextlib import contextmanager
+from types import MappingProxyType
 
 from rhn.UserDictCase import UserDictCase
 from uyuni.common.usix import raise_with_tb
@@ -34,6 +37,9 @@ _CONFIG_FILE = "%s/rhn.conf" % _CONFIG_ROOT
 _CONFIG_DEFAULTS_ROOT = os.environ.get(
     "RHN_CONFIG_DEFAULTS_PATH", "/usr/share/rhn/config-defaults"
 )
+# Seconds a configuration snapshot is used before the config file is checked
+# for changes again
+SNAPSHOT_STAT_INTERVAL = float(os.environ.get("RHN_CONFIG_STAT_INTERVAL", 5))
 
 
 def warn(*args):
@@ -213,6 +219,8 @@ class RHNOptions:
     def set(self, key, value):
         self.__check()
         self.__configs[self.__component][key] = value
+        # the value overrides the config files for the snapshots as well
+        _set_override(self.__component, key, value)
 
     __setitem__ = set
 
@@ -616,6 +624,127 @@ def runTest():
     print("===================================================================")
 
 
+class ConfigSnapshot:
+    """Read only copy of the options of a component.
+
+    Options are looked up like in RHNOptions: as case insensitive attributes,
+    items or with get().
+    """
+
+    __slots__ = ("_component", "_options")
+
+    def __init__(self, component, options):
+        object.__setattr__(self, "_component", component)
+        object.__setattr__(
+            self,
+            "_options",
+            MappingProxyType({k.lower(): v for k, v in options.items()}),
+        )
+
+    def __getattr__(self, key):
+        if key.startswith("_"):
+            raise AttributeError(key)
+        try:
+            return self._options[key.lower()]
+        except KeyError:
+            raise AttributeError(key)  # pylint: disable=raise-missing-from
+
+    __getitem__ = __getattr__
+
+    def __setattr__(self, key, value):
+        raise AttributeError("configuration snapshots are read only")
+
+    __setitem__ = __setattr__
+
+    def get(self, key, default=None):
+        return self._options.get(key.lower(), default)
+
+    def has_key(self, key):
+        return key.lower() in self._options
+
+    __contains__ = has_key
+
+    def keys(self):
+        return list(self._options.keys())
+
+    def items(self):
+        return list(self._options.items())
+
+    def getComponent(self):
+        return self._component
+
+    def __repr__(self):
+        # pylint: disable-next=consider-using-f-string
+        return "<ConfigSnapshot %s: %s>" % (self._component, dict(self._options))
+
+
+# (component, root, filename) -> [RHNOptions, ConfigSnapshot, time of the check]
+_snapshots = {}
+# component -> {key: value} set at runtime with RHNOptions.set
+_overrides = {}
+_snapshots_lock = threading.Lock()
+
+
+def _set_override(component, key, value):
+    with _snapshots_lock:
+        _overrides.setdefault(component or (), {})[key.lower()] = value
+        for entry in _snapshots.values():
+            if entry[0].getComponent() == (component or ()):
+                entry[1] = None
+
+
+def config_snapshot(component=None, root=None, filename=None, reload=False):
+    """Return a read only snapshot of the options of component.
+
+    Unlike cfg_component this neither switches the global CFG nor checks
+    the config file on every call: the snapshot is parsed once and the
+    config file is looked at again only every SNAPSHOT_STAT_INTERVAL
+    seconds, or right away with reload=True. Use it for options read in
+    loops.
+
+    with cfg_component('server.satellite') as CFG:
+        mount_point = CFG.MOUNT_POINT
+
+    becomes
+
+    mount_point = config_snapshot('server.satellite').MOUNT_POINT
+    """
+    key = (component or (), root, filename)
+    now = time.time()
+    with _snapshots_lock:
+        entry = _snapshots.get(key)
+        if (
+            entry is not None
+            and entry[1] is not None
+            and not reload
+            and now - entry[2] < SNAPSHOT_STAT_INTERVAL
+        ):
+            return entry[1]
+
+        if entry is None or reload:
+            options = RHNOptions(component, root, filename)
+            options.parse()
+            options.updateLastModified()
+            entry = [options, None, now]
+            _snapshots[key] = entry
+        elif entry[0].modifiedYN():
+            entry[0].parse()
+            entry[1] = None
+        entry[2] = now
+
+        if entry[1] is None:
+            values = dict(entry[0].items())
+            values.update(_overrides.get(entry[0].getComponent(), {}))
+            entry[1] = ConfigSnapshot(component, values)
+        return entry[1]
+
+
+def reload_config_snapshots():
+    """Make the next config_snapshot calls read the config files again."""
+    with _snapshots_lock:
+        _snapshots.clear()
+
+
 @contextmanager
 def cfg_component(component, root=None, filename=None):
     """Context manager for rhnConfig.
@@ -14,6 +14,10 @@
 # 4 - excessive stuff
 # 5 - really excessive stuff
 #
+# The log_async option makes a background thread write the log file, the
+# log_format option (text or json) selects between the classic log lines
+# and JSON lines carrying the request and session ids as well.
+#
 # ------------------------------------------------------------------------------
 #
 # Copyright (c) 2008--2017 Red Hat, Inc.
@@ -33,12 +37,15 @@
 # system module imports
 import os
 import sys
-import traceback
 import time
 import fcntl
 import atexit
+import json
+import queue
+import threading
+import uuid
 
-from spacewalk.common.rhnConfig import cfg_component
+from spacewalk.common.rhnConfig import ConfigParserError, cfg_component, config_snapshot
 import logging
 from uyuni.common.fileutils import getUidGid
 
@@ -83,7 +90,7 @@ def set_close_on_exec(fd):
 # Init the log
 
 
-def initLOG(log_file="stderr", level=0, component=""):
+def initLOG(log_file="stderr", level=0, component="", log_async=None, log_format=None):
     global LOG
 
     # check if it already setup
@@ -133,9 +140,19 @@ def initLOG(log_file="stderr", level=0, component=""):
             )
             return
 
+    if log_async is None or log_format is None:
+        try:
+            cfg = config_snapshot()
+            if log_async is None:
+                log_async = cfg.get("log_async", 0)
+            if log_format is None:
+                log_format = cfg.get("log_format", "text")
+        except ConfigParserError:
+            pass
+
     # At this point, LOG is None and log_file is not None
     # Get a new LOG
-    LOG = rhnLog(log_file, level, component)
+    LOG = rhnLog(log_file, level, component, log_async, log_format)
     align_root_logger()
     return 0
 
@@ -146,7 +163,7 @@ def initLOG(log_file="stderr", level=0, component=""):
 def log_debug(level, *args):
     # Please excuse the style inconsistencies.
     if LOG and LOG.level >= level:
-        LOG.logMessage(*args)
+        LOG.logMessage(*args, level=level)
 
 
 # Dump some information to stderr.
@@ -170,7 +187,7 @@ def log_error(*args):
     if not args:
         return
     if LOG:
-        LOG.logMessage("ERROR", *args)
+        LOG.logMessage("ERROR", *args, level=0)
     # log to stderr too
     log_stderr(str(args))
 
@@ -183,6 +200,15 @@ def log_clean(level, msg):
         LOG.writeToLog(msg)
 
 
+# Write out the queued lines. Processes leaving through os._exit() (like
+# multiprocessing pool workers) have to call it, atexit does not run there.
+
+
+def log_flush():
+    if LOG:
+        LOG.flush()
+
+
 # set the request object for the LOG so we don't have to expose the
 # LOG object externally
 
@@ -192,16 +218,110 @@ def log_setreq(req):
         LOG.set_req(req)
 
 
+# set the session (e.g. the authenticated system) the current request
+# belongs to, logged in the json format
+
+
+def log_setsession(session_id):
+    if LOG:
+        LOG.session_id = session_id
+
+
+# "dir/module" names of the source files, as logged with the messages
+_module_names = {}
+
+
+def _module_name(path):
+    name = _module_names.get(path)
+    if name is None:
+        arr = path.split("/")
+        try:  # So one can debug from the commandline.
+            filename = arr[-1]
+            name = filename[: filename.rindex(".")]
+            if len(arr) > 1:
+                name = arr[-2] + "/" + name
+        except ValueError:
+            name = ""
+        _module_names[path] = name
+    return name
+
+
+class LogWriter:
+    """Writes the log lines to a file from a background thread.
+
+    The queue is bounded so that a slow disk slows down the logging
+    threads instead of filling the memory. A process forked after the
+    thread was started gets its own thread on the first write; the lines
+    it queued are only written out at exit if it runs the atexit handlers,
+    see log_flush().
+    """
+
+    def __init__(self, fd, max_lines=10000):
+        self.fd = fd
+        self.max_lines = max_lines
+        self.queue = None
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def write(self, line):
+        if self.pid != os.getpid():
+            self._start()
+        self.queue.put(line)
+
+    def _start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.max_lines)
+            self.thread = threading.Thread(
+                target=self._run, name="rhnLog writer", daemon=True
+            )
+            self.pid = os.getpid()
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            line = self.queue.get()
+            if line is None:
+                break
+            try:
+                self.fd.write(line)
+                if self.queue.empty():
+                    self.fd.flush()
+            except (IOError, ValueError):
+                pass
+            finally:
+                self.queue.task_done()
+        self.queue.task_done()
+
+    def flush(self):
+        if self.pid == os.getpid():
+            self.queue.join()
+
+    def close(self):
+        """Write the queued lines and stop the thread."""
+        if self.pid == os.getpid() and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.pid = None
+
+
 # The base log class
 
 
 # pylint: disable-next=missing-class-docstring
 class rhnLog:
-    def __init__(self, log_file, level, component):
+    def __init__(self, log_file, level, component, log_async=0, log_format="text"):
         self.level = level
         self.component = component
         self.log_info = "0.0.0.0: "
+        self.remote_addr = None
+        self.request_id = None
+        self.session_id = None
         self.file = log_file
+        self.json = log_format == "json"
+        self.writer = None
         self.pid = os.getpid()
         self.real = 0
         if self.file in ["stderr", "stdout"]:
@@ -236,28 +356,28 @@ class rhnLog:
             self.fd = sys.stderr
         else:
             self.real = 1
+            if log_async and int(log_async):
+                self.writer = LogWriter(self.fd)
 
     # Main logging method.
-    def logMessage(self, *args):
-        tbStack = traceback.extract_stack()
-        callid = len(tbStack) - 3
-        module = ""
-        try:  # So one can debug from the commandline.
-            module = tbStack[callid][0]
-            arr = module.split("/")
-            if len(arr) > 1:
-                lastDir = arr[-2] + "/"
-            else:
-                lastDir = ""
-            filename = arr[-1]
-            filename = filename[: filename.rindex(".")]
-            module = lastDir + filename
-            del lastDir
-        except:
-            module = ""
+    def logMessage(self, *args, level=None):
+        # the caller of log_debug / log_error
+        try:
+            code = sys._getframe(2).f_code  # pylint: disable=protected-access
+            module = _module_name(code.co_filename)
+            function = code.co_name
+        except ValueError:
+            module = function = ""
+
+        if self.json:
+            self.writeRecord(
+                {"level": level, "module": module, "function": function},
+                args,
+            )
+            return
 
         # pylint: disable-next=consider-using-f-string
-        msg = "%s%s.%s" % (self.log_info, module, tbStack[callid][2])
+        msg = "%s%s.%s" % (self.log_info, module, function)
         if args:
             # pylint: disable-next=consider-using-f-string
             msg = "%s%s" % (msg, repr(args))
@@ -268,6 +388,9 @@ class rhnLog:
 
     # send a message to the log file w/some extra data (time stamp, etc).
     def writeMessage(self, msg):
+        if self.json:
+            self.writeRecord({"message": msg})
+            return
         if self.real:
             # pylint: disable-next=consider-using-f-string
             msg = "%s %d %s" % (log_time(), self.pid, msg)
@@ -276,12 +399,49 @@ class rhnLog:
             msg = "%s %s" % (log_time(), msg)
         self.writeToLog(msg)
 
+    # send a JSON line with the request data and the fields of record
+    def writeRecord(self, record, args=None):
+        record["time"] = log_time()
+        record["pid"] = self.pid
+        if self.component:
+            record["component"] = self.component
+        if self.remote_addr:
+            record["remote_addr"] = self.remote_addr
+        if self.request_id:
+            record["request_id"] = self.request_id
+        if self.session_id is not None:
+            record["session_id"] = self.session_id
+        if args:
+            record["args"] = args
+        try:
+            line = json.dumps(record, default=repr)
+        except (TypeError, ValueError):
+            # e.g. dictionaries with tuple keys
+            record["args"] = repr(args)
+            line = json.dumps(record, default=repr)
+        self._write(line)
+
     # send a message to the log file.
     def writeToLog(self, msg):
+        if self.json:
+            self.writeRecord({"message": msg})
+        else:
+            self._write(msg)
+
+    def _write(self, line):
         # this is for debugging in case of errors
         # fd = self.fd # no-op, but useful for dumping the current data
         # pylint: disable-next=consider-using-f-string
-        self.fd.write("%s\n" % msg)
+        line = "%s\n" % line
+        if self.writer:
+            self.writer.write(line)
+        else:
+            self.fd.write(line)
+
+    def flush(self):
+        if self.writer:
+            self.writer.flush()
+        self.fd.flush()
 
     # Reinitialize req info if req has changed.
     def set_req(self, req=None):
@@ -293,13 +453,26 @@ class rhnLog:
                 remoteAddr = req.connection.remote_ip
         # pylint: disable-next=consider-using-f-string
         self.log_info = "%s: " % (remoteAddr,)
+        self.remote_addr = remoteAddr if req else None
+        self.session_id = None
+        self.request_id = None
+        if req:
+            # headers_in is the WSGI environment: a request id set by a
+            # proxy in front or by mod_unique_id, else a new one
+            self.request_id = (
+                req.headers_in.get("HTTP_X_REQUEST_ID")
+                or req.headers_in.get("UNIQUE_ID")
+                or uuid.uuid4().hex
+            )
 
     # shutdown the log
     def __del__(self):
+        if self.writer:
+            self.writer.close()
         if self.real:
             self.fd.close()
         self.level = self.log_info = None
-        self.pid = self.file = self.real = self.fd = None
+        self.pid = self.file = self.real = self.fd = self.writer = None
 
 
 def _exit():
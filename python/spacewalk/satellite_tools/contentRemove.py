@@ -291,6 +291,8 @@ def delete_channels(
     if not channelLabels:
         return
 
+    # The id lists are kept: the paths are looked up before the rows are
+    # deleted, and a cursor cannot stream rows the transaction deletes
     rpms_ids = list_packages(channelLabels, force=force, sources=0)
     rpms_paths = _get_package_paths(rpms_ids, sources=0)
     srpms_ids = list_packages(channelLabels, force=force, sources=1)
@@ -456,10 +458,10 @@ def list_packages_without_channels(org_id, sources=0):
                 and ps.org_id is null
             """
 
-    h = rhnSQL.prepare(query)
+    h = rhnSQL.prepare_stream(query)
     h.execute(org_id=org_id)
 
-    return [x["id"] for x in h.fetchall_dict() or []]
+    return [x["id"] for x in h.fetchiter_dict()]
 
 
 def list_packages(channelLabels, sources=0, force=0):
@@ -495,9 +497,9 @@ def list_packages(channelLabels, sources=0, force=0):
             minus_op,
             templ % ("not", bind_params),
         )
-    h = rhnSQL.prepare(query)
+    h = rhnSQL.prepare_stream(query)
     h.execute(**params)
-    return [x["id"] for x in h.fetchall_dict() or []]
+    return [x["id"] for x in h.fetchiter_dict()]
 
 
 def _templ_rpms():
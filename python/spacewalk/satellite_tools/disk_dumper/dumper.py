@@ -29,7 +29,7 @@ except ImportError:
 from .string_buffer import StringBuffer
 from spacewalk.common import rhnCache, rhnFlags
 from spacewalk.common.rhnLog import log_debug, log_error
-from spacewalk.common.rhnConfig import CFG, cfg_component
+from spacewalk.common.rhnConfig import CFG, config_snapshot
 from spacewalk.common.rhnException import rhnFault
 from spacewalk.server import rhnSQL
 from spacewalk.satellite_tools import constants
@@ -854,10 +854,9 @@ class CachedDumper(exportLib.BaseDumper):
         log_debug(4, params)
         last_modified = self._get_last_modified(params)
         key = self._get_key(params)
-        # pylint: disable-next=redefined-outer-name,invalid-name
-        with cfg_component(component=None) as CFG:
-            user = CFG.httpd_user
-            group = CFG.httpd_group
+        cfg = config_snapshot()
+        user = cfg.httpd_user
+        group = cfg.httpd_group
         return rhnCache.set(
             key,
             value,
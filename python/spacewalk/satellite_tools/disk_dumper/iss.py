@@ -19,8 +19,8 @@ import os.path
 import sys
 import time
 import gzip
-import shutil
 import gettext
+import multiprocessing
 
 try:
     #  python 2
@@ -32,6 +32,7 @@ from . import dumper
 from uyuni.common.usix import raise_with_tb
 from uyuni.common.checksum import getFileChecksum
 from spacewalk.common import rhnMail
+from spacewalk.common.fileutils import copy_file
 from spacewalk.common.rhnConfig import CFG, initCFG
 from spacewalk.common.rhnTB import Traceback, exitWithTraceback
 from spacewalk.server import rhnSQL
@@ -48,6 +49,7 @@ from spacewalk.satellite_tools.syncLib import (
 from .iss_ui import UI
 from .iss_actions import ActionDeps
 from . import iss_isos
+from .iss_manifest import ExportManifest
 
 t = gettext.translation("spacewalk-backend-server", fallback=True)
 try:
@@ -61,11 +63,29 @@ except AttributeError:
 
 class ISSError(Exception):
     def __init__(self, msg, tb):
-        Exception.__init__(self)
+        # pass the arguments on, so the error survives the trip back from
+        # an export worker process
+        Exception.__init__(self, msg, tb)
         self.msg = msg
         self.tb = tb
 
 
+# The function and the items an export worker pool works on. They are set
+# before the pool is forked, so the workers only get the item indexes.
+_export_function = None
+_export_items = None
+
+
+def _init_export_worker():
+    # every worker needs its own connection, do not use the parent's one
+    rhnSQL.closeDB(committing=False, closing=False)
+    rhnSQL.initDB()
+
+
+def _export_index(index):
+    return index, _export_function(_export_items[index])
+
+
 # xmlDiskSource doesn't have a class for short channel packages, so I added one here.
 # I named _getFile that way so it's similar to the stuff in xmlDiskSource.
 # I grabbed the value of pathkey from dump_channel_packages_short in dumper.py.
@@ -135,9 +155,9 @@ class FileMapper:
         # Split the path. The filename is [1], and the directories are in [0].
         dirs_to_make = os.path.split(ofile)[0]
 
-        # Make the directories if they don't already exist.
-        if not os.path.exists(dirs_to_make):
-            os.makedirs(dirs_to_make)
+        # Make the directories if they don't already exist. Export workers
+        # may race for them.
+        os.makedirs(dirs_to_make, exist_ok=True)
 
         return ofile
 
@@ -275,6 +295,8 @@ class Dumper(dumper.XML_Dumper):
         end_date,
         use_rhn_date,
         whole_errata,
+        workers=1,
+        incremental=False,
     ):
         dumper.XML_Dumper.__init__(self)
         self.fm = FileMapper(outputdir)
@@ -286,6 +308,10 @@ class Dumper(dumper.XML_Dumper):
         )
         self.pb_char = "#"  # the string used as each unit in the progress bar.
         self.hardlinks = hardlinks
+        # number of processes exporting packages, errata and rpms
+        self.workers = max(1, int(workers or 1))
+        # incremental exports skip the objects the manifest has up to date
+        self.manifest = ExportManifest(outputdir) if incremental else None
         self.filename = None
         self.outstream = None
 
@@ -451,7 +477,7 @@ class Dumper(dumper.XML_Dumper):
                         and rcp.modified <= TO_TIMESTAMP(:end_date, 'YYYYMMDDHH24MISS')
                         """
             self.brpm_query = rhnSQL.Statement(query)
-            brpm_data = rhnSQL.prepare(self.brpm_query)
+            brpm_data = rhnSQL.prepare_stream(self.brpm_query)
 
             # self.brpms is a list of binary rpm info. It is a list of dictionaries, where each dictionary
             # has 'id' and 'path' as the keys.
@@ -459,7 +485,7 @@ class Dumper(dumper.XML_Dumper):
             log2stdout(1, "Gathering binary RPM info...")
             for ch in self.channel_ids:
                 brpm_data.execute(channel_id=ch["channel_id"], **dates)
-                self.brpms = self.brpms + (brpm_data.fetchall_dict() or [])
+                self.brpms.extend(brpm_data.fetchiter_dict())
         except Exception:
             e = sys.exc_info()[1]
             tbout = cStringIO.StringIO()
@@ -525,10 +551,11 @@ class Dumper(dumper.XML_Dumper):
                     and rcp.modified <= TO_TIMESTAMP(:end_date, 'YYYYMMDDHH24MISS'))
                     """
             self.package_query = rhnSQL.Statement(query)
-            package_data = rhnSQL.prepare(self.package_query)
+            package_data = rhnSQL.prepare_stream(self.package_query)
 
             # self.pkg_info will be a list of dictionaries containing channel package information.
-            # The keys are 'package_id' and 'last_modified'.
+            # The keys are 'package_id' and 'last_modified'. The rows are fetched in batches, but
+            # kept as a list: both package dumps and the progress bars go through them.
             self.pkg_info = []
 
             # This fills in the pkg_info list with channel package information from the channels in
@@ -536,11 +563,7 @@ class Dumper(dumper.XML_Dumper):
             log2stdout(1, "Gathering package info...")
             for channel_id in self.channel_ids:
                 package_data.execute(channel_id=channel_id["channel_id"], **dates)
-                a_package = package_data.fetchall_dict() or []
-
-                # Don't bother placing None into self.pkg_info.
-                if a_package:
-                    self.pkg_info = self.pkg_info + a_package
+                self.pkg_info.extend(package_data.fetchiter_dict())
 
         except Exception:
             e = sys.exc_info()[1]
@@ -599,16 +622,12 @@ class Dumper(dumper.XML_Dumper):
                      and ps.modified <= TO_TIMESTAMP(:end_date, 'YYYYMMDDHH24MISS')
                     """
             self.source_package_query = rhnSQL.Statement(query)
-            source_package_data = rhnSQL.prepare(self.source_package_query)
+            source_package_data = rhnSQL.prepare_stream(self.source_package_query)
             source_package_data.execute(**dates)
 
             # self.src_pkg_info is a list of dictionaries containing the source package information.
             # The keys for each dictionary are 'package_id', 'last_modified', and 'source_rpm_id'.
-            self.src_pkg_info = source_package_data.fetchall_dict() or []
-
-            # Again, don't bother placing None into the list.
-            if not self.src_pkg_info:
-                self.src_pkg_info = []
+            self.src_pkg_info = list(source_package_data.fetchiter_dict())
 
         except Exception:
             e = sys.exc_info()[1]
@@ -646,7 +665,7 @@ class Dumper(dumper.XML_Dumper):
                       and ce.modified <= TO_TIMESTAMP(:end_date, 'YYYYMMDDHH24MISS')
                       """
             self.errata_query = rhnSQL.Statement(query)
-            errata_data = rhnSQL.prepare(self.errata_query)
+            errata_data = rhnSQL.prepare_stream(self.errata_query)
 
             # self.errata_info will be a list of dictionaries containing errata info for the channels
             # that the user listed. The keys are 'errata_id' and 'last_modified'.
@@ -654,9 +673,7 @@ class Dumper(dumper.XML_Dumper):
             log2stdout(1, "Gathering errata info...")
             for channel_id in self.channel_ids:
                 errata_data.execute(channel_id=channel_id["channel_id"], **dates)
-                an_errata = errata_data.fetchall_dict() or []
-                if an_errata:
-                    self.errata_info = self.errata_info + an_errata
+                self.errata_info.extend(errata_data.fetchiter_dict())
 
         except Exception:
             e = sys.exc_info()[1]
@@ -786,6 +803,83 @@ class Dumper(dumper.XML_Dumper):
         self.outstream = open(self.filename, "w")
         return xmlWriter.XMLWriter(stream=self.outstream)
 
+    def _export(self, items, export_item):
+        """Calls export_item(item) for every item, in a pool of self.workers
+        processes if there is more than one. Yields (item, result) pairs as
+        the items are done, not necessarily in their order.
+        """
+        if self.workers <= 1 or len(items) <= 1:
+            for item in items:
+                yield item, export_item(item)
+            return
+
+        # pylint: disable-next=global-statement
+        global _export_function, _export_items
+        _export_function = export_item
+        _export_items = items
+        chunksize = max(1, min(64, len(items) // (self.workers * 4)))
+        try:
+            with multiprocessing.get_context("fork").Pool(
+                self.workers, initializer=_init_export_worker
+            ) as pool:
+                for index, result in pool.imap_unordered(
+                    _export_index, range(len(items)), chunksize
+                ):
+                    yield items[index], result
+        finally:
+            _export_function = None
+            _export_items = None
+
+    def _changed(self, kind, items, id_key, modified_key, get_file):
+        """Returns the items an incremental export has to write."""
+        if self.manifest is None:
+            return items
+        changed = [
+            item
+            for item in items
+            if not self.manifest.unchanged(
+                kind, item[id_key], item[modified_key], get_file(item)
+            )
+        ]
+        if len(changed) < len(items):
+            log2stdout(
+                1,
+                # pylint: disable-next=consider-using-f-string
+                "Skipping %d unchanged %s." % (len(items) - len(changed), kind),
+            )
+        return changed
+
+    def _record(self, kind, item, id_key, modified_key, get_file):
+        if self.manifest is not None:
+            self.manifest.record(kind, item[id_key], item[modified_key], get_file(item))
+
+    def _package_file(self, pkg_info):
+        return self.fm.getPackagesFile("rhn-package-" + str(pkg_info["package_id"]))
+
+    def _short_package_file(self, pkg_info):
+        return self.fm.getShortPackagesFile(
+            "rhn-package-" + str(pkg_info["package_id"])
+        )
+
+    def _erratum_file(self, errata_info):
+        return self.fm.getErrataFile("rhn-erratum-" + str(errata_info["errata_id"]))
+
+    def _rpm_file(self, rpm):
+        # pylint: disable-next=consider-using-f-string
+        return diskImportLib.rpmsPath("rhn-package-%s" % str(rpm["id"]), self.mp)
+
+    def save_manifest(self):
+        """Writes the manifests of an incremental export."""
+        if self.manifest is None:
+            return
+        delta = self.manifest.save()
+        log2stdout(
+            1,
+            # pylint: disable-next=consider-using-f-string
+            "Export manifest written, %d objects changed."
+            % sum(len(objects) for objects in delta.values()),
+        )
+
     # The dump_* methods aren't really overrides because they don't preserve the method
     # signature, but they are meant as replacements for the methods defined in the base
     # class that have the same name. They will set up the file for the dump, collect info
@@ -883,7 +977,7 @@ class Dumper(dumper.XML_Dumper):
             if self.hardlinks:
                 os.link(full_filename, target_filename)
             else:
-                shutil.copyfile(full_filename, target_filename)
+                copy_file(full_filename, target_filename)
 
     def dump_channels(
         self,
@@ -988,19 +1082,30 @@ class Dumper(dumper.XML_Dumper):
         try:
             print("\n")
             log2stdout(1, "Exporting packages...")
+            pkg_infos = self._changed(
+                "packages",
+                self.pkg_info,
+                "package_id",
+                "last_modified",
+                self._package_file,
+            )
             pb = progress_bar.ProgressBar(
                 self.pb_label,
                 self.pb_complete,
-                len(self.pkg_info),
+                len(pkg_infos),
                 self.pb_length,
                 self.pb_char,
             )
             pb.printAll(1)
-            for pkg_info in self.pkg_info:
+            for pkg_info, _ in self._export(pkg_infos, self._export_package):
                 package_name = "rhn-package-" + str(pkg_info["package_id"])
-                self.set_filename(self.fm.getPackagesFile(package_name))
-                dumper.XML_Dumper.dump_packages(self, [pkg_info])
-
+                self._record(
+                    "packages",
+                    pkg_info,
+                    "package_id",
+                    "last_modified",
+                    self._package_file,
+                )
                 # pylint: disable-next=consider-using-f-string
                 log2email(4, "Package: %s" % package_name)
                 log2email(
@@ -1013,7 +1118,7 @@ class Dumper(dumper.XML_Dumper):
                 pb.printIncrement()
             pb.printComplete()
             # pylint: disable-next=consider-using-f-string
-            log2stdout(3, "Number of packages exported: %s" % str(len(self.pkg_info)))
+            log2stdout(3, "Number of packages exported: %s" % str(len(pkg_infos)))
 
         except Exception:
             e = sys.exc_info()[1]
@@ -1028,22 +1133,38 @@ class Dumper(dumper.XML_Dumper):
                 sys.exc_info()[2],
             )
 
+    def _export_package(self, pkg_info):
+        self.set_filename(self._package_file(pkg_info))
+        dumper.XML_Dumper.dump_packages(self, [pkg_info])
+
     def dump_packages_short(self, packages=None):
         try:
             print("\n")
             log2stdout(1, "Exporting short packages...")
+            pkg_infos = self._changed(
+                "packages_short",
+                self.pkg_info,
+                "package_id",
+                "last_modified",
+                self._short_package_file,
+            )
             pb = progress_bar.ProgressBar(
                 self.pb_label,
                 self.pb_complete,
-                len(self.pkg_info),
+                len(pkg_infos),
                 self.pb_length,
                 self.pb_char,
             )
             pb.printAll(1)
-            for pkg_info in self.pkg_info:
+            for pkg_info, _ in self._export(pkg_infos, self._export_package_short):
                 package_name = "rhn-package-" + str(pkg_info["package_id"])
-                self.set_filename(self.fm.getShortPackagesFile(package_name))
-                dumper.XML_Dumper.dump_packages_short(self, [pkg_info])
+                self._record(
+                    "packages_short",
+                    pkg_info,
+                    "package_id",
+                    "last_modified",
+                    self._short_package_file,
+                )
 
                 # pylint: disable-next=consider-using-f-string
                 log2email(4, "Short Package: %s" % package_name)
@@ -1055,7 +1176,7 @@ class Dumper(dumper.XML_Dumper):
             log2stdout(
                 3,
                 # pylint: disable-next=consider-using-f-string
-                "Number of short packages exported: %s" % str(len(self.pkg_info)),
+                "Number of short packages exported: %s" % str(len(pkg_infos)),
             )
 
         except Exception:
@@ -1071,6 +1192,10 @@ class Dumper(dumper.XML_Dumper):
                 sys.exc_info()[2],
             )
 
+    def _export_package_short(self, pkg_info):
+        self.set_filename(self._short_package_file(pkg_info))
+        dumper.XML_Dumper.dump_packages_short(self, [pkg_info])
+
     def dump_source_packages(self, packages=None):
         try:
             print("\n")
@@ -1099,18 +1224,30 @@ class Dumper(dumper.XML_Dumper):
         try:
             print("\n")
             log2stdout(1, "Exporting errata...")
+            errata_infos = self._changed(
+                "errata",
+                self.errata_info,
+                "errata_id",
+                "last_modified",
+                self._erratum_file,
+            )
             pb = progress_bar.ProgressBar(
                 self.pb_label,
                 self.pb_complete,
-                len(self.errata_info),
+                len(errata_infos),
                 self.pb_length,
                 self.pb_char,
             )
             pb.printAll(1)
-            for errata_info in self.errata_info:
+            for errata_info, _ in self._export(errata_infos, self._export_erratum):
                 erratum_name = "rhn-erratum-" + str(errata_info["errata_id"])
-                self.set_filename(self.fm.getErrataFile(erratum_name))
-                dumper.XML_Dumper.dump_errata(self, [errata_info])
+                self._record(
+                    "errata",
+                    errata_info,
+                    "errata_id",
+                    "last_modified",
+                    self._erratum_file,
+                )
 
                 # pylint: disable-next=consider-using-f-string
                 log2email(4, "Erratum: %s" % str(errata_info["advisory-name"]))
@@ -1124,7 +1261,7 @@ class Dumper(dumper.XML_Dumper):
                 pb.printIncrement()
             pb.printComplete()
             # pylint: disable-next=consider-using-f-string
-            log2stdout(3, "Number of errata exported: %s" % str(len(self.errata_info)))
+            log2stdout(3, "Number of errata exported: %s" % str(len(errata_infos)))
 
         except Exception:
             e = sys.exc_info()[1]
@@ -1139,6 +1276,10 @@ class Dumper(dumper.XML_Dumper):
                 sys.exc_info()[2],
             )
 
+    def _export_erratum(self, errata_info):
+        self.set_filename(self._erratum_file(errata_info))
+        dumper.XML_Dumper.dump_errata(self, [errata_info])
+
     def dump_kickstart_data(self):
         try:
             print("\n")
@@ -1235,7 +1376,7 @@ class Dumper(dumper.XML_Dumper):
                             pass
                     else:
                         # Copy file from satellite to export dir.
-                        shutil.copyfile(path_to_files, path_to_export_file)
+                        copy_file(path_to_files, path_to_export_file)
                 except IOError:
                     e = sys.exc_info()[1]
                     tbout = cStringIO.StringIO()
@@ -1289,90 +1430,21 @@ class Dumper(dumper.XML_Dumper):
         try:
             print("\n")
             log2stdout(1, "Exporting binary RPMs...")
+            # the path in the satellite mount point changes with the rpm
+            rpms = self._changed("rpms", self.brpms, "id", "path", self._rpm_file)
             pb = progress_bar.ProgressBar(
                 self.pb_label,
                 self.pb_complete,
-                len(self.brpms),
+                len(rpms),
                 self.pb_length,
                 self.pb_char,
             )
             pb.printAll(1)
-            for rpm in self.brpms:
-                # generate path to the rpms under the mount point
-                path_to_rpm = diskImportLib.rpmsPath(
-                    # pylint: disable-next=consider-using-f-string
-                    "rhn-package-%s" % str(rpm["id"]),
-                    self.mp,
-                )
-
-                # get the dirs to the rpm
-                dirs_to_rpm = os.path.split(path_to_rpm)[0]
-
-                if not rpm["path"]:
-                    raise ISSError(
-                        # pylint: disable-next=consider-using-f-string
-                        "Error: Missing RPM under the satellite mount point. (Package id: %s)"
-                        % rpm["id"],
-                        "",
-                    )
-                # get the path to the rpm from under the satellite's mountpoint
-                satellite_path = os.path.join(CFG.MOUNT_POINT, rpm["path"])
-
-                if not os.path.exists(satellite_path):
-                    raise ISSError(
-                        # pylint: disable-next=consider-using-f-string
-                        "Error: Missing RPM under mount point: %s" % (satellite_path,),
-                        "",
-                    )
-
-                # create the directory for the rpm, if necessary.
-                if not os.path.exists(dirs_to_rpm):
-                    os.makedirs(dirs_to_rpm)
-
-                # check if the path to rpm hardlink already exists
-                if os.path.exists(path_to_rpm):
+            for rpm, exported in self._export(rpms, self._export_rpm):
+                self._record("rpms", rpm, "id", "path", self._rpm_file)
+                if not exported:
                     continue
 
-                try:
-                    # copy the file to the path under the mountpoint.
-                    if self.hardlinks:
-                        os.link(satellite_path, path_to_rpm)
-                    else:
-                        shutil.copyfile(satellite_path, path_to_rpm)
-                except IOError:
-                    e = sys.exc_info()[1]
-                    tbout = cStringIO.StringIO()
-                    Traceback(mail=0, ostream=tbout, with_locals=1)
-                    raise_with_tb(
-                        ISSError(
-                            # pylint: disable-next=consider-using-f-string
-                            "Error: Error copying file %s: %s"
-                            % (
-                                os.path.join(CFG.MOUNT_POINT, rpm["path"]),
-                                e.__class__.__name__,
-                            ),
-                            tbout.getvalue(),
-                        ),
-                        sys.exc_info()[2],
-                    )
-                # pylint: disable-next=duplicate-except
-                except OSError:
-                    e = sys.exc_info()[1]
-                    tbout = cStringIO.StringIO()
-                    Traceback(mail=0, ostream=tbout, with_locals=1)
-                    raise_with_tb(
-                        ISSError(
-                            # pylint: disable-next=consider-using-f-string
-                            "Error: Could not make hard link %s: %s (different filesystems?)"
-                            % (
-                                os.path.join(CFG.MOUNT_POINT, rpm["path"]),
-                                e.__class__.__name__,
-                            ),
-                            tbout.getvalue(),
-                        ),
-                        sys.exc_info()[2],
-                    )
-
                 # pylint: disable-next=consider-using-f-string
                 log2email(5, "RPM: %s" % rpm["path"])
 
@@ -1380,7 +1452,7 @@ class Dumper(dumper.XML_Dumper):
                 pb.printIncrement()
             pb.printComplete()
             # pylint: disable-next=consider-using-f-string
-            log2stdout(3, "Number of RPMs exported: %s" % str(len(self.brpms)))
+            log2stdout(3, "Number of RPMs exported: %s" % str(len(rpms)))
         except ISSError:
             raise
 
@@ -1397,6 +1469,80 @@ class Dumper(dumper.XML_Dumper):
                 sys.exc_info()[2],
             )
 
+    def _export_rpm(self, rpm):
+        """Links or copies the rpm to the export directory, returns False
+        if it is there already."""
+        # generate path to the rpms under the mount point
+        path_to_rpm = self._rpm_file(rpm)
+
+        # get the dirs to the rpm
+        dirs_to_rpm = os.path.split(path_to_rpm)[0]
+
+        if not rpm["path"]:
+            raise ISSError(
+                # pylint: disable-next=consider-using-f-string
+                "Error: Missing RPM under the satellite mount point. (Package id: %s)"
+                % rpm["id"],
+                "",
+            )
+        # get the path to the rpm from under the satellite's mountpoint
+        satellite_path = os.path.join(CFG.MOUNT_POINT, rpm["path"])
+
+        if not os.path.exists(satellite_path):
+            raise ISSError(
+                # pylint: disable-next=consider-using-f-string
+                "Error: Missing RPM under mount point: %s" % (satellite_path,),
+                "",
+            )
+
+        # create the directory for the rpm, if necessary.
+        os.makedirs(dirs_to_rpm, exist_ok=True)
+
+        # check if the path to rpm hardlink already exists
+        if os.path.exists(path_to_rpm):
+            return False
+
+        try:
+            # copy the file to the path under the mountpoint.
+            if self.hardlinks:
+                os.link(satellite_path, path_to_rpm)
+            else:
+                copy_file(satellite_path, path_to_rpm)
+        except IOError:
+            e = sys.exc_info()[1]
+            tbout = cStringIO.StringIO()
+            Traceback(mail=0, ostream=tbout, with_locals=1)
+            raise_with_tb(
+                ISSError(
+                    # pylint: disable-next=consider-using-f-string
+                    "Error: Error copying file %s: %s"
+                    % (
+                        os.path.join(CFG.MOUNT_POINT, rpm["path"]),
+                        e.__class__.__name__,
+                    ),
+                    tbout.getvalue(),
+                ),
+                sys.exc_info()[2],
+            )
+        # pylint: disable-next=duplicate-except
+        except OSError:
+            e = sys.exc_info()[1]
+            tbout = cStringIO.StringIO()
+            Traceback(mail=0, ostream=tbout, with_locals=1)
+            raise_with_tb(
+                ISSError(
+                    # pylint: disable-next=consider-using-f-string
+                    "Error: Could not make hard link %s: %s (different filesystems?)"
+                    % (
+                        os.path.join(CFG.MOUNT_POINT, rpm["path"]),
+                        e.__class__.__name__,
+                    ),
+                    tbout.getvalue(),
+                ),
+                sys.exc_info()[2],
+            )
+        return True
+
     def dump_support_information(self):
         self._dump_simple(
             self.fm.getSupportInformationFile(),
@@ -1671,6 +1817,8 @@ class ExporterMain:
                     end_date=self.end_date,
                     use_rhn_date=self.options.use_rhn_date,
                     whole_errata=self.options.whole_errata,
+                    workers=self.options.workers,
+                    incremental=self.options.incremental,
                 )
                 self.actionmap = {
                     "arches": {"dump": self.dumper.dump_arches},
@@ -1870,6 +2018,8 @@ class ExporterMain:
                             filepath = os.path.join(fpath, f)
                             compress_file(filepath)
 
+            self.dumper.save_manifest()
+
             if self.options.make_isos:
                 # iso_output = os.path.join(self.isos_dir, self.dump_dir)
                 iso_output = self.isos_dir
@@ -0,0 +1,120 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Manifest of an export directory, used by incremental exports.
+#
+# manifest.json maps every exported object to the last_modified value it was
+# exported with and the checksum of its file:
+#
+#   {"generated": "20260101120000",
+#    "objects": {"packages": {"1234": ["20251231100000", "sha256", "..."]}}}
+#
+# manifest-delta.json has the same format, but lists only the objects which
+# were written by the last export, plus the "since" time of the export it is
+# based on. An importer that processed that export can skip all other files.
+#
+
+import json
+import os
+import time
+
+from spacewalk.satellite_tools.xmlDiskSource import DeltaManifestDiskSource
+from uyuni.common.checksum import getFileChecksum
+
+MANIFEST_FILE = "manifest.json"
+DELTA_MANIFEST_FILE = DeltaManifestDiskSource.filename
+CHECKSUM_TYPE = "sha256"
+
+
+def _exported_file(filename):
+    # the xml files are compressed after each export step
+    for name in (filename + ".gz", filename):
+        if os.path.isfile(name):
+            return name
+    return None
+
+
+def load_manifest(path):
+    """Returns the content of a (delta) manifest, None if there is none."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class ExportManifest:
+    """Objects written to an export directory and the versions written.
+
+    unchanged() tells which objects are still up to date on disk, record()
+    notes the ones written by this export and save() writes the merged
+    manifest and the delta manifest of this export.
+    """
+
+    def __init__(self, mountpoint):
+        self.mountpoint = mountpoint
+        self.generated = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+        previous = load_manifest(os.path.join(mountpoint, MANIFEST_FILE)) or {}
+        self.since = previous.get("generated")
+        self.previous = previous.get("objects", {})
+        # kind -> object id -> (last_modified, file name)
+        self.written = {}
+
+    def unchanged(self, kind, object_id, last_modified, filename):
+        """The object was exported with the same last_modified before and
+        its file is still there."""
+        entry = self.previous.get(kind, {}).get(str(object_id))
+        return (
+            entry is not None
+            and entry[0] == str(last_modified)
+            and _exported_file(filename) is not None
+        )
+
+    def record(self, kind, object_id, last_modified, filename):
+        self.written.setdefault(kind, {})[str(object_id)] = (
+            str(last_modified),
+            filename,
+        )
+
+    def save(self):
+        """Writes the manifest and the delta manifest, call it once the
+        export (including the compression of the files) is done."""
+        delta = {}
+        for kind, objects in self.written.items():
+            for object_id, (last_modified, filename) in objects.items():
+                exported = _exported_file(filename)
+                if exported is None:
+                    continue
+                delta.setdefault(kind, {})[object_id] = [
+                    last_modified,
+                    CHECKSUM_TYPE,
+                    getFileChecksum(CHECKSUM_TYPE, filename=exported),
+                ]
+
+        objects = {kind: dict(entries) for kind, entries in self.previous.items()}
+        for kind, entries in delta.items():
+            objects.setdefault(kind, {}).update(entries)
+
+        _write_json(
+            os.path.join(self.mountpoint, DELTA_MANIFEST_FILE),
+            {"generated": self.generated, "since": self.since, "objects": delta},
+        )
+        _write_json(
+            os.path.join(self.mountpoint, MANIFEST_FILE),
+            {"generated": self.generated, "objects": objects},
+        )
+        return delta
@@ -43,6 +43,20 @@ class UI:
                 default=0,
                 help="Exported RPM and kickstart are hard linked to original files.",
             ),
+            option(
+                "--workers",
+                action="store",
+                type="int",
+                default=1,
+                help="Number of processes exporting packages, errata and RPMs in parallel.",
+            ),
+            option(
+                "--incremental",
+                action="store_true",
+                default=0,
+                help="Only export the packages, errata and RPMs which changed since the last"
+                + " export to the directory and write a delta manifest of them.",
+            ),
             option(
                 "--list-channels",
                 action="store_true",
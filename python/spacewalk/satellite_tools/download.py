@@ -18,7 +18,8 @@ import os
 import sys
 import re
 import time
-from threading import Thread, Lock
+from collections import deque
+from threading import Thread, Lock, Semaphore
 
 try:
     #  python 2
@@ -38,6 +39,10 @@ from uyuni.common.checksum import getFileChecksum
 from spacewalk.common.rhnConfig import cfg_component
 from spacewalk.satellite_tools.syncLib import log, log2
 
+MIB = 1024 * 1024
+# seconds between two throughput reports of the multi downloader
+PROGRESS_INTERVAL = 30
+
 
 # pylint: disable-next=missing-class-docstring
 class ProgressBarLogger:
@@ -344,8 +349,16 @@ class DownloadThread(Thread):
                 params = self.queue.get(block=False)
             except Empty:
                 break
+            if not self.parent.acquire_staging_slot():
+                self.queue.task_done()
+                break
             self.mirror = 0
-            success = self.__fetch_url(params)
+            try:
+                success = self.__fetch_url(params)
+            except Exception:
+                # nobody is going to process this file, give its slot back
+                self.parent.release_staging_slots()
+                raise
             if self.parent.log_obj:
                 # log_obj must be thread-safe
                 self.parent.log_obj.log(
@@ -355,15 +368,351 @@ class DownloadThread(Thread):
             if not success:
                 package = os.path.basename(params["target_file"])
                 self.failed_pkgs.add(package)
+            if self.parent.done_callback:
+                # done_callback must be thread-safe
+                try:
+                    self.parent.done_callback(params, success)
+                # pylint: disable-next=broad-exception-caught
+                except Exception as e:
+                    self.parent.fail_download(e)
         self.curl.close()
 
 
+class DownloadStats:
+    """Throughput and latency of the downloads, per mirror and in total"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.files = 0
+        self.bytes = 0
+        self.mirrors = {}
+
+    def add(self, mirror, size, latency):
+        self.files += 1
+        self.bytes += size
+        files, total_size, total_latency = self.mirrors.get(mirror, (0, 0, 0.0))
+        self.mirrors[mirror] = (files + 1, total_size + size, total_latency + latency)
+
+    def throughput(self):
+        elapsed = time.time() - self.started
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def log_progress(self):
+        log(
+            1,
+            # pylint: disable-next=consider-using-f-string
+            "Downloaded %d files, %.1f MiB, %.2f MiB/s"
+            % (self.files, self.bytes / MIB, self.throughput() / MIB),
+        )
+
+    def log_summary(self):
+        if not self.files:
+            return
+        log(
+            0,
+            # pylint: disable-next=consider-using-f-string
+            "    Downloaded %d files (%.1f MiB) in %d seconds, %.2f MiB/s"
+            % (
+                self.files,
+                self.bytes / MIB,
+                time.time() - self.started,
+                self.throughput() / MIB,
+            ),
+        )
+        for mirror, (files, size, latency) in sorted(self.mirrors.items()):
+            log(
+                1,
+                # pylint: disable-next=consider-using-f-string
+                "    %s: %d files, %.1f MiB, %.0f ms average latency"
+                % (mirror, files, size / MIB, 1000 * latency / files),
+            )
+
+
+class _Transfer:
+    def __init__(self, params):
+        self.params = params
+        self.attempt = 0
+        self.mirror = 0
+        self.fileobj = None
+
+    def url(self):
+        params = self.params
+        url = urlparse.urljoin(params["urls"][self.mirror], params["relative_path"])
+        # same SUSE SCC authtoken handling as DownloadThread.__fetch_url
+        if "authtoken" in params and params["authtoken"]:
+            (scheme, netloc, path, query, _) = urlparse.urlsplit(
+                params["urls"][self.mirror]
+            )
+            url = urlparse.urlunsplit(
+                (
+                    scheme,
+                    netloc,
+                    urlparse.urljoin(path, params["relative_path"]),
+                    query.rstrip("/"),
+                    "",
+                )
+            )
+        return url
+
+    def host(self):
+        return urlparse.urlsplit(self.params["urls"][self.mirror]).netloc
+
+
+class MultiDownloader:
+    """Download all files with one pycurl multi handle.
+
+    A single loop drives every transfer instead of a thread per connection.
+    The curl handles are reused and their connections with them, transfers
+    are started only while their mirror has less than max_host_connections
+    running and the bandwidth limit is split between the connections.
+    """
+
+    def __init__(
+        self, parent, max_connections, max_host_connections, bandwidth_limit=0
+    ):
+        self.parent = parent
+        self.max_host_connections = max_host_connections
+        self.speed_limit = 0
+        if bandwidth_limit:
+            self.speed_limit = max(1, bandwidth_limit // max_connections)
+        # pylint: disable=E1101
+        self.multi = pycurl.CurlMulti()
+        self.free = [pycurl.Curl() for _ in range(max_connections)]
+        self.handles = list(self.free)
+        self.waiting = {}
+        self.running = {}
+        self.active = 0
+        self.stats = DownloadStats()
+
+    def run(self, params_list):
+        for params in params_list:
+            self._queue(_Transfer(params))
+        last_report = time.time()
+        try:
+            while self.parent.can_continue() and (
+                self.active or any(self.waiting.values())
+            ):
+                self._start_transfers()
+                if not self.active:
+                    # waiting for a staging slot
+                    time.sleep(0.1)
+                    continue
+                self.multi.select(1.0)
+                self._perform()
+                if time.time() - last_report >= PROGRESS_INTERVAL:
+                    last_report = time.time()
+                    self.stats.log_progress()
+        finally:
+            self._close()
+        self.stats.log_summary()
+
+    def _queue(self, transfer):
+        self.waiting.setdefault(transfer.host(), deque()).append(transfer)
+
+    def _start_transfers(self):
+        # transfers failing to start are queued again, maybe for another host
+        for host, transfers in list(self.waiting.items()):
+            while (
+                transfers
+                and self.free
+                and self.running.get(host, 0) < self.max_host_connections
+            ):
+                if not self.parent.acquire_staging_slot(blocking=False):
+                    return
+                transfer = transfers.popleft()
+                if not self.parent.force and self._is_file_done(transfer.params):
+                    self._finish(transfer, True)
+                    continue
+                self._start(transfer, self.free.pop())
+
+    def _start(self, transfer, curl):
+        params = transfer.params
+        try:
+            # pylint: disable-next=consider-using-with
+            transfer.fileobj = open(params["target_file"], "wb")
+        except OSError as e:
+            self.free.append(curl)
+            self._failed(transfer, e)
+            return
+        url = transfer.url()
+        curl.reset()
+        curl.setopt(pycurl.URL, url)
+        curl.setopt(pycurl.NOSIGNAL, 1)
+        curl.setopt(pycurl.FOLLOWLOCATION, 1)
+        curl.setopt(pycurl.MAXREDIRS, 5)
+        if params.get("timeout"):
+            curl.setopt(pycurl.CONNECTTIMEOUT, params["timeout"])
+            curl.setopt(pycurl.LOW_SPEED_TIME, params["timeout"])
+            curl.setopt(pycurl.LOW_SPEED_LIMIT, params.get("minrate") or 1)
+        if self.speed_limit:
+            curl.setopt(pycurl.MAX_RECV_SPEED_LARGE, self.speed_limit)
+        if params.get("ssl_ca_cert"):
+            curl.setopt(pycurl.CAINFO, params["ssl_ca_cert"])
+        if params.get("ssl_client_cert"):
+            curl.setopt(pycurl.SSLCERT, params["ssl_client_cert"])
+        if params.get("ssl_client_key"):
+            curl.setopt(pycurl.SSLKEY, params["ssl_client_key"])
+        proxy = (params.get("proxies") or {}).get(urlparse.urlsplit(url).scheme)
+        if proxy:
+            curl.setopt(pycurl.PROXY, proxy)
+        headers = params.get("http_headers") or ()
+        if isinstance(headers, dict):
+            headers = headers.items()
+        if headers:
+            # pylint: disable-next=consider-using-f-string
+            curl.setopt(pycurl.HTTPHEADER, ["%s: %s" % item for item in headers])
+        if params.get("bytes_range"):
+            start, end = params["bytes_range"]
+            # pylint: disable-next=consider-using-f-string
+            curl.setopt(pycurl.RANGE, "%d-%s" % (start, end - 1 if end else ""))
+
+        curl.setopt(pycurl.WRITEDATA, transfer.fileobj)
+        curl.transfer = transfer
+        host = transfer.host()
+        self.running[host] = self.running.get(host, 0) + 1
+        self.active += 1
+        self.multi.add_handle(curl)
+
+    def _perform(self):
+        while True:
+            ret, _ = self.multi.perform()
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                break
+        while True:
+            queued, succeeded, failed = self.multi.info_read()
+            for curl in succeeded:
+                self._done(curl, None)
+            for curl, _errno, errmsg in failed:
+                self._done(curl, errmsg)
+            if not queued:
+                break
+
+    def _done(self, curl, error):
+        transfer = curl.transfer
+        curl.transfer = None
+        self.multi.remove_handle(curl)
+        self.free.append(curl)
+        transfer.fileobj.close()
+        host = transfer.host()
+        self.running[host] -= 1
+        self.active -= 1
+
+        params = transfer.params
+        code = curl.getinfo(pycurl.RESPONSE_CODE)
+        if error is None and code >= 400:
+            # pylint: disable-next=consider-using-f-string
+            error = "HTTP Error %d" % code
+        if error is None and not self._is_file_done(params):
+            error = (
+                # pylint: disable-next=consider-using-f-string
+                "Target file isn't valid. Checksum should be %s (%s)."
+                % (params["checksum"], params["checksum_type"])
+            )
+        if error is None:
+            self.stats.add(
+                host,
+                int(curl.getinfo(pycurl.SIZE_DOWNLOAD)),
+                curl.getinfo(pycurl.STARTTRANSFER_TIME),
+            )
+            self._finish(transfer, True)
+            return
+        self._failed(transfer, error)
+
+    def _failed(self, transfer, error):
+        """Retries the transfer on the next mirror, or gives up on it."""
+        params = transfer.params
+        if os.path.isfile(params["target_file"]):
+            os.unlink(params["target_file"])
+        if "No space left on device" in str(error):
+            self.parent.fail_download(FailedDownloadError(error))
+            self._finish(transfer, False)
+            return
+
+        mirrors = len(params["urls"])
+        transfer.attempt += 1
+        if transfer.attempt < max(self.parent.retries, mirrors):
+            log2(
+                0,
+                2,
+                # pylint: disable-next=consider-using-f-string
+                "WARNING: Download failed: %s - %s. Retrying..."
+                % (transfer.url(), error),
+                stream=sys.stderr,
+            )
+            transfer.mirror = (transfer.mirror + 1) % mirrors
+            # the slot is taken again when the transfer is restarted
+            self.parent.release_staging_slots()
+            self._queue(transfer)
+            return
+
+        log2(
+            0,
+            1,
+            # pylint: disable-next=consider-using-f-string
+            "ERROR: Download failed: %s - %s." % (transfer.url(), error),
+            stream=sys.stderr,
+        )
+        self._finish(transfer, False)
+
+    def _finish(self, transfer, success):
+        params = transfer.params
+        if self.parent.log_obj:
+            self.parent.log_obj.log(success, os.path.basename(params["relative_path"]))
+        if not success:
+            self.parent.failed_pkgs.add(os.path.basename(params["target_file"]))
+        if self.parent.done_callback:
+            try:
+                self.parent.done_callback(params, success)
+            # pylint: disable-next=broad-exception-caught
+            except Exception as e:
+                self.parent.fail_download(e)
+
+    @staticmethod
+    def _is_file_done(params):
+        local_path = params["target_file"]
+        if not os.path.isfile(local_path):
+            return False
+        if params["checksum_type"] and params["checksum"]:
+            return (
+                getFileChecksum(params["checksum_type"], filename=local_path)
+                == params["checksum"]
+            )
+        return True
+
+    def _close(self):
+        for curl in self.handles:
+            transfer = getattr(curl, "transfer", None)
+            if transfer is not None:
+                # interrupted, do not leave partial files behind
+                self.multi.remove_handle(curl)
+                transfer.fileobj.close()
+                if os.path.isfile(transfer.params["target_file"]):
+                    os.unlink(transfer.params["target_file"])
+            curl.close()
+        self.multi.close()
+
+
 # pylint: disable-next=missing-class-docstring
 class ThreadedDownloader:
-    def __init__(self, retries=3, log_obj=None, force=False):
+    def __init__(self, retries=3, log_obj=None, force=False, engine=None):
         self.queues = {}
         # pylint: disable-next=invalid-name
         with cfg_component("server.satellite") as CFG:
+            self.engine = engine or CFG.get("reposync_download_engine", "threads")
+            if self.engine == "multi":
+                try:
+                    self.max_connections = int(CFG.get("reposync_max_connections", 20))
+                    self.max_host_connections = int(
+                        CFG.get("reposync_max_host_connections", 5)
+                    )
+                    self.bandwidth_limit = int(CFG.get("reposync_bandwidth_limit", 0))
+                except ValueError as e:
+                    # pylint: disable-next=raise-missing-from
+                    raise ValueError(
+                        # pylint: disable-next=consider-using-f-string
+                        "Invalid download engine settings: %s"
+                        % e
+                    )
             try:
                 self.threads = int(CFG.REPOSYNC_DOWNLOAD_THREADS)
             except ValueError:
@@ -405,10 +754,39 @@ class ThreadedDownloader:
         self.first_in_queue_done = False
         self.first_in_queue_lock = Lock()
         self.failed_pkgs = set()
+        self.done_callback = None
+        self.staging = None
 
     def set_log_obj(self, log_obj):
         self.log_obj = log_obj
 
+    def set_done_callback(self, done_callback):
+        """Call done_callback(params, success) from the download thread
+        as soon as a file is finished, so it can be processed while the
+        remaining files are still being downloaded."""
+        self.done_callback = done_callback
+
+    def set_staging_limit(self, limit):
+        """Download at most limit files ahead of the consumer: a slot is
+        taken before every download and has to be given back with
+        release_staging_slots() once the file was processed."""
+        self.staging = Semaphore(limit) if limit else None
+
+    def acquire_staging_slot(self, blocking=True):
+        if self.staging is None:
+            return True
+        if not blocking:
+            return self.staging.acquire(blocking=False)
+        while not self.staging.acquire(timeout=1):
+            if not self.can_continue():
+                return False
+        return True
+
+    def release_staging_slots(self, count=1):
+        if self.staging is not None:
+            for _ in range(count):
+                self.staging.release()
+
     def set_force(self, force):
         self.force = force
 
@@ -450,6 +828,10 @@ class ThreadedDownloader:
         # pylint: disable-next=consider-using-f-string
         log(1, "Downloading total %d files from %d queues." % (size, len(self.queues)))
 
+        if self.engine == "multi":
+            self._run_multi()
+            return
+
         for index, queue in enumerate(self.queues.values()):
             # pylint: disable-next=consider-using-f-string
             log(2, "Downloading %d files from queue #%d." % (queue.qsize(), index))
@@ -479,6 +861,27 @@ class ThreadedDownloader:
         if self.exception:
             raise self.exception  # pylint: disable=E0702
 
+    def _run_multi(self):
+        params_list = []
+        for queue in self.queues.values():
+            while not queue.empty():
+                params_list.append(queue.get(block=False))
+        downloader = MultiDownloader(
+            self,
+            self.max_connections,
+            self.max_host_connections,
+            self.bandwidth_limit,
+        )
+        try:
+            downloader.run(params_list)
+        except KeyboardInterrupt:
+            e = sys.exc_info()[1]
+            self.fail_download(e)
+
+        # raise first detected exception if any
+        if self.exception:
+            raise self.exception  # pylint: disable=E0702
+
     def can_continue(self):
         self.lock.acquire()
         status = self.exception is None
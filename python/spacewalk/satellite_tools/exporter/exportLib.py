@@ -164,7 +164,7 @@ class BaseQueryDumper(BaseDumper):
     def set_iterator(self):
         if self._iterator:
             return self._iterator
-        h = rhnSQL.prepare(self.iterator_query)
+        h = rhnSQL.prepare_stream(self.iterator_query)
         h.execute()
         return h
 
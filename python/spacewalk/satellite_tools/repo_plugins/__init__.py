@@ -14,6 +14,7 @@
 # in this software or its documentation.
 #
 
+import fnmatch
 import re
 import rpm
 from uyuni.common import rhn_pkg
@@ -165,3 +166,62 @@ class ContentPackage:
 
     def __str__(self):
         return f"ContentPackage: name = {self.name}, epoch = {self.epoch}, version = {self.version}, release = {self.release}, arch = {self.arch}, checksum_type = {self.checksum_type}, checksum = {self.checksum}, checksums = {self.checksums}, path = {self.path}, a_pkg = {self.a_pkg}, unique_id = <{self.unique_id}>"
+
+
+class PackageFilter:
+    """Include / exclude filters of a repository, compiled once.
+
+    filters are: [ ('+', includelist1), ('-', excludelist1),
+                   ('+', includelist2), ... ]
+
+    A '+' filter selects the matching packages again, a '-' filter removes
+    them, so the last filter matching a package decides whether it is
+    synced. Packages no filter matches are selected only if the first
+    filter is an exclude. All filters are joined to one regular expression
+    in reverse order, so a single match finds the deciding filter.
+    """
+
+    def __init__(self, filters, exclude_only=False):
+        self.default = exclude_only or filters[0][0] == "-"
+        self.senses = {}
+        patterns = []
+        for index, (sense, pkg_list) in enumerate(filters):
+            if sense not in ("+", "-"):
+                raise IOError("Filters are malformed")
+            if exclude_only and sense == "+":
+                continue
+            # pylint: disable-next=consider-using-f-string
+            group = "filter%d" % index
+            self.senses[group] = sense == "+"
+            # pylint: disable-next=consider-using-f-string
+            patterns.append("(?P<%s>%s)" % (group, fnmatch.translate(pkg_list[0])))
+        self.regex = None
+        if patterns:
+            self.regex = re.compile("|".join(reversed(patterns)))
+
+    def match(self, name):
+        """Return True if the package called name passes the filters"""
+        found = self.regex.match(name) if self.regex else None
+        if found is None:
+            return self.default
+        return self.senses[found.lastgroup]
+
+    def apply(self, packages, key):
+        """Return the packages passing the filters, in their original order.
+
+        key(package) returns the name the filters are matched against.
+        """
+        selected = set()
+        rejected = set()
+        result = []
+        for pkg in packages:
+            name = key(pkg)
+            if name in selected:
+                result.append(pkg)
+            elif name not in rejected:
+                if self.match(name):
+                    selected.add(name)
+                    result.append(pkg)
+                else:
+                    rejected.add(name)
+        return result
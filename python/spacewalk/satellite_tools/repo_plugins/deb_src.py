@@ -16,11 +16,11 @@
 
 import sys
 import os.path
+import json
+import tempfile
 from shutil import rmtree
 from shutil import copyfile
 import time
-import re
-import fnmatch
 import requests
 import logging
 from functools import cmp_to_key
@@ -28,7 +28,11 @@ from uyuni.common import fileutils
 from spacewalk.common.suseLib import get_proxy
 from spacewalk.common.rhnConfig import cfg_component
 from spacewalk.satellite_tools.download import get_proxies
-from spacewalk.satellite_tools.repo_plugins import ContentPackage, CACHE_DIR
+from spacewalk.satellite_tools.repo_plugins import (
+    ContentPackage,
+    PackageFilter,
+    CACHE_DIR,
+)
 from spacewalk.satellite_tools.syncLib import log2
 from spacewalk.server import rhnSQL
 from spacewalk.common import repo
@@ -47,6 +51,8 @@ except ImportError:
 RETRIES = 10
 RETRY_DELAY = 1
 FORMAT_PRIORITY = [".xz", ".gz", ""]
+# Parsed package index, kept between syncs
+PACKAGES_CACHE = "packages-cache.json"
 log = logging.getLogger(__name__)
 
 
@@ -104,6 +110,72 @@ class DebPackage:
         )
 
 
+def parse_packages(lines):
+    """
+    Parse a Packages index and yield a DebPackage for every stanza.
+
+    lines is any iterable of the decompressed index lines, usually the open
+    index file, so the index is never completely held in memory.
+    """
+    package = None
+    checksums = {}
+    for line in lines:
+        if not line.strip():
+            if package is not None:
+                _set_best_checksum(package, checksums)
+                if package.is_populated():
+                    yield package
+            package = None
+            checksums = {}
+            continue
+        if line[0] in " \t":
+            # continuation of a multiline field
+            continue
+
+        if package is None:
+            package = DebPackage()
+            package.epoch = ""
+        field, _, value = line.partition(" ")
+        value = value.strip()
+        if field == "Package:":
+            package.name = value
+        elif field == "Architecture:":
+            package.arch = value + "-deb"
+        elif field == "Version:":
+            package["epoch"] = ""
+            version = value
+            if version.find(":") != -1:
+                package["epoch"], version = version.split(":", 1)
+            if version.find("-") != -1:
+                tmp = version.split("-")
+                package["version"] = "-".join(tmp[:-1])
+                package["release"] = tmp[-1]
+            else:
+                package["version"] = version
+                package["release"] = "X"
+        elif field == "Filename:":
+            package.relativepath = value
+        elif field == "SHA256:":
+            checksums["sha256"] = value
+        elif field == "SHA1:":
+            checksums["sha1"] = value
+        elif field == "MD5sum:":
+            checksums["md5"] = value
+
+    if package is not None:
+        _set_best_checksum(package, checksums)
+        if package.is_populated():
+            yield package
+
+
+def _set_best_checksum(package, checksums):
+    for checksum_type in ("sha256", "sha1", "md5"):
+        if checksum_type in checksums:
+            package.checksum_type = checksum_type
+            package.checksum = checksums[checksum_type]
+            break
+
+
 # pylint: disable-next=missing-class-docstring
 class DebRepo:
     # url example - http://ftp.debian.org/debian/dists/jessie/main/binary-amd64/
@@ -118,6 +190,7 @@ class DebRepo:
         gpg_verify=True,
         channel_label=None,
         timeout=None,
+        index_cache=True,
     ):
         self.url = url
         parts = url.rsplit("/dists/", 1)
@@ -211,6 +284,9 @@ class DebRepo:
         self.exclude = []
         self.pkgdir = pkg_dir
         self.http_headers = {}
+        self.index_cache = index_cache
+        # checksum of the package index in the verified Release file
+        self.index_checksum = None
 
     def verify(self):
         """
@@ -224,6 +300,7 @@ class DebRepo:
         log.debug("DebRepo.verify() dpkg_repo=%s", dpkg_repo)
         if not dpkg_repo.verify_packages_index():
             raise repo.GeneralRepoException("Package index checksum failure")
+        self.index_checksum = dpkg_repo.get_pkg_index_checksum()
 
     def _get_proxies(self):
         """
@@ -288,11 +365,7 @@ class DebRepo:
 
         return ""
 
-    def get_package_list(self):
-        decompressed = None
-        packages_raw = []
-        to_return = []
-
+    def _open_package_index(self):
         for extension in FORMAT_PRIORITY:
             scheme, netloc, path, query, fragid = urlparse.urlsplit(self.url)
             url = urlparse.urlunsplit(
@@ -313,62 +386,97 @@ class DebRepo:
                     newfilename = filename.split("?")[0]
                     os.rename(filename, newfilename)
                     filename = newfilename
-                decompressed = fileutils.decompress_open(filename)
-                break
+                return fileutils.decompress_open(filename)
+        return None
 
-        if decompressed:
-            for pkg in decompressed.read().split("\n\n"):
-                packages_raw.append(pkg)
-            decompressed.close()
-        else:
-            print("ERROR: Download of package list failed.")
+    def _index_cache_key(self):
+        if not self.index_cache or not self.index_checksum:
+            return None
+        return [self.url] + list(self.index_checksum)
 
-        # Parse and format package metadata
-        for chunk in packages_raw:
+    def _read_index_cache(self):
+        """
+        Return the packages parsed during the last sync if the package index
+        did not change since, None otherwise.
+        """
+        key = self._index_cache_key()
+        if key is None:
+            return None
+        try:
+            with open(
+                os.path.join(self.basecachedir, PACKAGES_CACHE), encoding="utf-8"
+            ) as cache:
+                data = json.load(cache)
+        except (OSError, ValueError):
+            return None
+        if data.get("index") != key:
+            return None
+
+        packages = []
+        for values in data["packages"]:
             package = DebPackage()
-            package.epoch = ""
-            lines = chunk.split("\n")
-            checksums = {}
-            for line in lines:
-                pair = tuple(p.strip() for p in line.split(" ", 1))
-                if pair[0] == "Package:":
-                    package.name = pair[1]
-                elif pair[0] == "Architecture:":
-                    package.arch = pair[1] + "-deb"
-                elif pair[0] == "Version:":
-                    package["epoch"] = ""
-                    version = pair[1]
-                    if version.find(":") != -1:
-                        package["epoch"], version = version.split(":")
-                    if version.find("-") != -1:
-                        tmp = version.split("-")
-                        package["version"] = "-".join(tmp[:-1])
-                        package["release"] = tmp[-1]
-                    else:
-                        package["version"] = version
-                        package["release"] = "X"
-                elif pair[0] == "Filename:":
-                    package.relativepath = pair[1]
-                elif pair[0] == "SHA256:":
-                    checksums["sha256"] = pair[1]
-                elif pair[0] == "SHA1:":
-                    checksums["sha1"] = pair[1]
-                elif pair[0] == "MD5sum:":
-                    checksums["md5"] = pair[1]
-
-            # Pick best available checksum
-            if "sha256" in checksums:
-                package.checksum_type = "sha256"
-                package.checksum = checksums["sha256"]
-            elif "sha1" in checksums:
-                package.checksum_type = "sha1"
-                package.checksum = checksums["sha1"]
-            elif "md5" in checksums:
-                package.checksum_type = "md5"
-                package.checksum = checksums["md5"]
-
-            if package.is_populated():
-                to_return.append(package)
+            (
+                package.name,
+                package.epoch,
+                package.version,
+                package.release,
+                package.arch,
+                package.relativepath,
+                package.checksum_type,
+                package.checksum,
+            ) = values
+            packages.append(package)
+        return packages
+
+    def _write_index_cache(self, packages):
+        key = self._index_cache_key()
+        if key is None:
+            return
+        data = {
+            "index": key,
+            "packages": [
+                [
+                    package.name,
+                    package.epoch,
+                    package.version,
+                    package.release,
+                    package.arch,
+                    package.relativepath,
+                    package.checksum_type,
+                    package.checksum,
+                ]
+                for package in packages
+            ],
+        }
+        fd, tmp_name = tempfile.mkstemp(dir=self.basecachedir, prefix=".packages")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as cache:
+                json.dump(data, cache)
+            os.replace(tmp_name, os.path.join(self.basecachedir, PACKAGES_CACHE))
+        except OSError as exc:
+            log.warning("Could not write the package index cache: %s", exc)
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    def get_package_list(self):
+        to_return = self._read_index_cache()
+        if to_return is not None:
+            log.debug(
+                "DebRepo.get_package_list() package index unchanged, %d packages",
+                len(to_return),
+            )
+            return to_return
+
+        decompressed = self._open_package_index()
+        if not decompressed:
+            print("ERROR: Download of package list failed.")
+            return []
+
+        try:
+            to_return = list(parse_packages(decompressed))
+        finally:
+            decompressed.close()
+        self._write_index_cache(to_return)
         return to_return
 
 
@@ -428,6 +536,13 @@ class ContentSource:
             except (AttributeError, ValueError):
                 self.nevra_filter = False
 
+            try:
+                # reuse the package index parsed by the last sync as long as
+                # the Release file lists the same checksum for it
+                index_cache = bool(CFG.REPOSYNC_DEB_INDEX_CACHE)
+            except (AttributeError, ValueError):
+                index_cache = True
+
             # SUSE vendor repositories belongs to org = NULL
             # The repository cache root will be "/var/cache/rhn/reposync/REPOSITORY_LABEL/"
             root = os.path.join(CACHE_DIR, str(org or "NULL"), self.reponame)
@@ -441,6 +556,7 @@ class ContentSource:
                 gpg_verify=not (insecure),
                 channel_label=channel_label,
                 timeout=self.timeout,
+                index_cache=index_cache,
             )
             self.repo.http_headers = http_headers
             self.repo.verify()
@@ -540,51 +656,9 @@ class ContentSource:
         if filters is None:
             return
 
-        selected = []
-        excluded = []
-        allmatched_include = []
-        allmatched_exclude = []
-        if filters[0][0] == "-":
-            # first filter is exclude, start with full package list
-            # and then exclude from it
-            selected = packages
-        else:
-            excluded = packages
-
-        for filter_item in filters:
-            sense, pkg_list = filter_item
-            regex = fnmatch.translate(pkg_list[0])
-            reobj = re.compile(regex)
-            if sense == "+":
-                # include
-                for excluded_pkg in excluded:
-                    if nevra_filter:
-                        pkg_name = excluded_pkg.nevra()
-                    else:
-                        pkg_name = excluded_pkg["name"]
-                    if reobj.match(pkg_name):
-                        allmatched_include.insert(0, excluded_pkg)
-                        selected.insert(0, excluded_pkg)
-                for pkg in allmatched_include:
-                    if pkg in excluded:
-                        excluded.remove(pkg)
-            elif sense == "-":
-                # exclude
-                for selected_pkg in selected:
-                    if nevra_filter:
-                        pkg_name = selected_pkg.nevra()
-                    else:
-                        pkg_name = selected_pkg["name"]
-                    if reobj.match(pkg_name):
-                        allmatched_exclude.insert(0, selected_pkg)
-                        excluded.insert(0, selected_pkg)
-                for pkg in allmatched_exclude:
-                    if pkg in selected:
-                        selected.remove(pkg)
-                excluded = excluded + allmatched_exclude
-            else:
-                raise IOError("Filters are malformed")
-        return selected
+        if nevra_filter:
+            return PackageFilter(filters).apply(packages, lambda pkg: pkg.nevra())
+        return PackageFilter(filters).apply(packages, lambda pkg: pkg["name"])
 
     def clear_cache(self, directory=None):
         if directory is None:
@@ -592,6 +666,9 @@ class ContentSource:
         # remove content in directory
         for item in os.listdir(directory):
             path = os.path.join(directory, item)
+            if item == PACKAGES_CACHE:
+                # only used if the package index did not change
+                continue
             if os.path.isfile(path):
                 os.unlink(path)
             elif os.path.isdir(path):
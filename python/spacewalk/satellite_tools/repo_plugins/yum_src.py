@@ -26,7 +26,6 @@ from __future__ import absolute_import, unicode_literals
 from shutil import rmtree, copytree
 
 import configparser
-import fnmatch
 
 # pylint: disable-next=unused-import
 import glob
@@ -66,7 +65,11 @@ from functools import cmp_to_key
 from shlex import quote as sh_quote
 from uyuni.common import checksum, fileutils
 from spacewalk.common import rhnLog
-from spacewalk.satellite_tools.repo_plugins import ContentPackage, CACHE_DIR
+from spacewalk.satellite_tools.repo_plugins import (
+    ContentPackage,
+    PackageFilter,
+    CACHE_DIR,
+)
 from spacewalk.satellite_tools.download import get_proxies
 from spacewalk.satellite_tools.syncLib import log
 
@@ -1243,53 +1246,10 @@ password={passwd}
         if filters is None:
             return
 
-        selected = []
-        excluded = []
-        allmatched_include = []
-        allmatched_exclude = []
-        if exclude_only or filters[0][0] == "-":
-            # first filter is exclude, start with full package list
-            # and then exclude from it
-            selected = packages
-        else:
-            excluded = packages
-
-        for filter_item in filters:
-            sense, pkg_list = filter_item
-            regex = fnmatch.translate(pkg_list[0])
-            reobj = re.compile(regex)
-            if sense == "+":
-                if exclude_only:
-                    continue
-                # include
-                for excluded_pkg in excluded:
-                    if nevra_filter:
-                        pkg_name = str(excluded_pkg)
-                    else:
-                        pkg_name = excluded_pkg.name
-                    if reobj.match(pkg_name):
-                        allmatched_include.insert(0, excluded_pkg)
-                        selected.insert(0, excluded_pkg)
-                for pkg in allmatched_include:
-                    if pkg in excluded:
-                        excluded.remove(pkg)
-            elif sense == "-":
-                # exclude
-                for selected_pkg in selected:
-                    if nevra_filter:
-                        pkg_name = str(selected_pkg)
-                    else:
-                        pkg_name = selected_pkg.name
-                    if reobj.match(pkg_name):
-                        allmatched_exclude.insert(0, selected_pkg)
-                        excluded.insert(0, selected_pkg)
-                for pkg in allmatched_exclude:
-                    if pkg in selected:
-                        selected.remove(pkg)
-                excluded = excluded + allmatched_exclude
-            else:
-                raise IOError("Filters are malformed")
-        return selected
+        package_filter = PackageFilter(filters, exclude_only)
+        if nevra_filter:
+            return package_filter.apply(packages, str)
+        return package_filter.apply(packages, lambda pkg: pkg.name)
 
     def get_susedata(self):
         """
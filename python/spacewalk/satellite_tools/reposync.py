@@ -34,13 +34,17 @@ from dateutil.tz import tzutc
 import gettext
 import errno
 import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing.managers import BaseManager
 
 from rhn.connections import idn_puny_to_unicode
 from rhn.stringutils import ustr
 
 from uyuni.common.usix import raise_with_tb
 
-from spacewalk.server import rhnPackage, rhnSQL, rhnChannel, suseEula
+from spacewalk.server import rhnPackage, rhnSQL, rhnChannel, rhnLookupCache, suseEula
 
 # pylint: disable-next=ungrouped-imports
 from uyuni.common import fileutils
@@ -76,7 +80,9 @@ from spacewalk.satellite_tools.syncLib import (
     log2,
     log2disk,
     dumpEMAIL_LOG,
+    initEMAIL_LOG,
     log2background,
+    log2email,
 )
 from spacewalk.satellite_tools.appstreams import ModuleMdImporter, ModuleMdIndexingError
 
@@ -93,6 +99,9 @@ relative_modules_dir = "rhn/modules"
 relative_mediaproducts_dir = "suse/media.1"
 checksum_cache_filename = "reposync/checksum_cache"
 default_import_batch_size = 20
+default_max_staged_packages = 200
+# seconds between two checks for packages claimed by other channels
+claim_poll_interval = 5
 
 errata_typemap = {
     "security": "Security Advisory",
@@ -464,6 +473,168 @@ def get_single_ssl_set(keys, check_dates=False):
     return None
 
 
+class ChecksumRegistry:
+    """Packages downloaded and imported by the channels synced in parallel.
+
+    The first channel that needs a package claims its checksum and is the
+    only one which downloads and imports it. The other channels wait until
+    the claim is released and then link the package from the database.
+    The registry lives in the manager process, every method is one call.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (checksum_type, checksum) -> pid of the owner, None once imported
+        self.owners = {}
+
+    def claim(self, keys, owner):
+        """Claims the free keys for owner, returns the keys other channels
+        are importing or have imported already."""
+        taken = []
+        with self.lock:
+            for key in keys:
+                current = self.owners.setdefault(key, owner)
+                if current != owner:
+                    taken.append(key)
+        return taken
+
+    def release(self, keys, owner, imported):
+        """Releases the claims of owner on keys. The imported keys stay
+        taken, the others can be claimed again."""
+        imported = set(imported)
+        with self.lock:
+            for key in keys:
+                if self.owners.get(key) != owner:
+                    continue
+                if key in imported:
+                    self.owners[key] = None
+                else:
+                    del self.owners[key]
+
+    def release_owner(self, owner):
+        """Releases all claims of owner, e.g. after its process died."""
+        with self.lock:
+            for key in [k for k, o in self.owners.items() if o == owner]:
+                del self.owners[key]
+
+    def pending(self, keys):
+        """Returns how many of keys are still being imported."""
+        with self.lock:
+            return sum(1 for key in keys if self.owners.get(key) is not None)
+
+
+class RegistryManager(BaseManager):
+    """Serves the ChecksumRegistry to the channel processes"""
+
+
+RegistryManager.register("ChecksumRegistry", ChecksumRegistry)
+
+
+class ParallelSync:
+    """Syncs several channels at once, every channel in its own process.
+
+    The channels share a ChecksumRegistry, so a package listed in several
+    of them is downloaded and imported once and only linked into the
+    others. The per-channel logs are written as in a sequential sync.
+    """
+
+    def __init__(self, processes):
+        self.processes = processes
+
+    def run(self, channels, create_sync):
+        """Syncs channels, a list of (label, urls) pairs. create_sync(label,
+        urls) is called in the channel process and returns the RepoSync.
+
+        Returns the first non zero return code of the channels.
+        """
+        # the channel processes open their own connections
+        rhnSQL.closeDB(committing=False)
+        results = multiprocessing.Queue()
+        waiting = list(channels)
+        running = {}
+        ret_code = 0
+        with RegistryManager() as manager:
+            registry = manager.ChecksumRegistry()  # pylint: disable=no-member
+            while waiting or running:
+                while waiting and len(running) < self.processes:
+                    label, urls = waiting.pop(0)
+                    # pylint: disable-next=consider-using-f-string
+                    log(0, "Sync of channel %s started." % label)
+                    process = multiprocessing.Process(
+                        target=self._sync_channel,
+                        args=(label, urls, create_sync, registry, results),
+                    )
+                    process.start()
+                    running[label] = process
+
+                try:
+                    finished = [results.get(timeout=1)]
+                except queue.Empty:
+                    finished = []
+                exited = [
+                    label
+                    for label, process in running.items()
+                    if process.exitcode is not None
+                ]
+                # an exited process has flushed its result to the queue
+                try:
+                    while True:
+                        finished.append(results.get_nowait())
+                except queue.Empty:
+                    pass
+                for label, channel_ret_code, email in finished:
+                    if self._channel_done(running, registry, label, email):
+                        ret_code = ret_code or channel_ret_code
+
+                # a channel process may have died without a result
+                for label in exited:
+                    process = running.pop(label, None)
+                    if process is None:
+                        continue
+                    registry.release_owner(process.pid)
+                    log2(
+                        0,
+                        0,
+                        # pylint: disable-next=consider-using-f-string
+                        "ERROR: Sync of channel %s failed." % label,
+                        stream=sys.stderr,
+                    )
+                    ret_code = ret_code or 1
+        return ret_code
+
+    @staticmethod
+    def _channel_done(running, registry, label, email):
+        """Cleans up after the channel process which sent its result. Returns
+        False if it was not running (any more)."""
+        process = running.pop(label, None)
+        if process is None:
+            return False
+        process.join()
+        registry.release_owner(process.pid)
+        if email:
+            log2email(0, email, cleanYN=1, notimeYN=1)
+        # pylint: disable-next=consider-using-f-string
+        log(0, "Sync of channel %s completed." % label)
+        return True
+
+    @staticmethod
+    def _sync_channel(label, urls, create_sync, registry, results):
+        ret_code = 1
+        if dumpEMAIL_LOG() is not None:
+            initEMAIL_LOG(reinit=1)
+        try:
+            sync = create_sync(label, urls)
+            sync.set_checksum_registry(registry)
+            _elapsed, ret_code = sync.sync()
+        except SystemExit as e:
+            ret_code = e.code if isinstance(e.code, int) else 1
+        # pylint: disable-next=broad-exception-caught
+        except Exception:
+            log2(0, 0, fetchTraceback(), stream=sys.stderr)
+        finally:
+            results.put((label, ret_code, dumpEMAIL_LOG()))
+
+
 # pylint: disable-next=missing-class-docstring
 class RepoSync(object):
     def __init__(
@@ -605,10 +776,25 @@ class RepoSync(object):
         self.arches = self.get_compatible_arches(int(self.channel["id"]))
         self.channel_arch = self.get_channel_arch(int(self.channel["id"]))
         self.import_batch_size = default_import_batch_size
+        # pylint: disable-next=invalid-name
+        with cfg_component("server.satellite") as CFG:
+            self.pipeline = bool(int(CFG.get("reposync_pipeline", 1)))
+            self.max_staged_packages = int(
+                CFG.get("reposync_max_staged_packages", default_max_staged_packages)
+            )
+        self.checksum_registry = None
 
     def set_import_batch_size(self, batch_size):
         self.import_batch_size = int(batch_size)
 
+    def set_pipeline(self, pipeline):
+        self.pipeline = pipeline
+
+    def set_checksum_registry(self, registry):
+        """Share the downloaded and imported packages with the channels
+        synced in parallel, see ParallelSync"""
+        self.checksum_registry = registry
+
     def set_urls_prefix(self, prefix):
         """If there are relative urls in DB, set their real location in runtime"""
         for index, url in enumerate(self.urls):
@@ -1371,6 +1557,9 @@ class RepoSync(object):
         # pylint: disable-next=invalid-name
         with cfg_component("server.susemanager") as CFG:
             mount_point = CFG.MOUNT_POINT
+        db_packages = self._get_db_packages(
+            [pack for pack in packages if pack.arch in self.arches], channel_id
+        )
         for pack in packages:
             if pack.arch not in self.arches:
                 # skip packages with incompatible architecture
@@ -1390,48 +1579,9 @@ class RepoSync(object):
             )
             self.available_packages[ident] = 1
 
-            packs = rhnPackage.get_info_for_package(
-                [pack.name, pack.version, pack.release, pack.epoch, pack.arch],
-                channel_id,
-                self.org_id,
+            to_download, to_link = self._match_db_package(
+                pack, db_packages, channel_id, mount_point, to_disassociate
             )
-            db_pack = None
-            for p in packs:
-                if p["checksum"] == pack.checksum:
-                    db_pack = p
-                    break
-
-            to_download = True
-            to_link = True
-            # Package exists in DB
-            if db_pack:
-                # Path in filesystem is defined
-                if db_pack["path"]:
-                    pack.path = os.path.join(mount_point, db_pack["path"])
-                else:
-                    pack.path = ""
-
-                # if the package exists, but under a different org_id we have to download it again
-                if self.metadata_only or self.match_package_checksum(pack, db_pack):
-                    # package is already on disk or not required
-                    to_download = False
-                    if db_pack["channel_id"] == channel_id:
-                        # package is already in the channel
-                        to_link = False
-
-                    # just pass data from DB, they will be used if there is no RPM available
-                    pack.set_checksum(db_pack["checksum_type"], db_pack["checksum"])
-                    pack.epoch = db_pack["epoch"]
-
-                    self.all_packages.add((pack.checksum_type, pack.checksum))
-
-                elif db_pack["channel_id"] == channel_id:
-                    # different package with SAME NVREA
-                    # disassociate from channel if it doesn't match package which will be downloaded
-                    to_disassociate[(db_pack["checksum_type"], db_pack["checksum"])] = (
-                        True
-                    )
-
             if to_download or to_link:
                 if pack.arch in ["src", "nosrc"]:
                     to_link = False
@@ -1454,9 +1604,83 @@ class RepoSync(object):
             # pylint: disable-next=consider-using-f-string
             log(0, "    Packages to sync:             %5d" % num_to_process)
 
+        deferred = []
+        claimed = []
+        if self.checksum_registry is not None:
+            to_process, deferred, claimed = self._claim_packages(to_process)
+        try:
+            to_process, affected_channels, failed_batches = self._fetch_packages(
+                plug, to_process, to_disassociate, is_non_local_repo
+            )
+        finally:
+            if claimed:
+                # the other channels link what was imported and fetch the rest
+                self.checksum_registry.release(
+                    claimed,
+                    os.getpid(),
+                    [key for key in claimed if key in self.all_packages],
+                )
+        failed_packages += failed_batches
+
+        if deferred:
+            to_link, affected_deferred, failed_deferred = self._fetch_deferred(
+                plug,
+                deferred,
+                channel_id,
+                mount_point,
+                to_disassociate,
+                is_non_local_repo,
+            )
+            to_process += to_link
+            affected_channels += affected_deferred
+            failed_packages += failed_deferred
+
+        if affected_channels:
+            errataCache.schedule_errata_cache_update(affected_channels)
+        log2background(0, "Importing packages finished.")
+
+        # Disassociate packages
+        for checksum_type, checksum in to_disassociate:
+            if to_disassociate[(checksum_type, checksum)]:
+                self.disassociate_package(checksum_type, checksum)
+        # Do not re-link if nothing was marked to link
+        if any([to_link for (pack, to_download, to_link) in to_process]):
+            log(0, "")
+            log(0, "  Linking packages to the channel.")
+            # Packages to append to channel
+            import_batches = list(
+                self.chunks(
+                    [
+                        self.associate_package(pack)
+                        for (pack, to_download, to_link) in to_process
+                        if to_link
+                    ],
+                    1000,
+                )
+            )
+            count = 0
+            for import_batch in import_batches:
+                backend = SQLBackend()
+                caller = "server.app.yumreposync"
+                importer = ChannelPackageSubscription(
+                    import_batch, backend, caller=caller, repogen=False
+                )
+                importer.run()
+                backend.commit()
+                del importer.batch
+                count += len(import_batch)
+                # pylint: disable-next=consider-using-f-string
+                log(0, "    {} packages linked".format(count))
+            self.regen = True
+            self.regenerate_bootstrap_repo = True
+        return failed_packages
+
+    def _fetch_packages(self, plug, to_process, to_disassociate, is_non_local_repo):
+        """Download the packages of to_process and import them to the DB"""
         downloader = ThreadedDownloader()
         to_download_count = 0
-        for what in to_process:
+        target_indexes = {}
+        for index, what in enumerate(to_process):
             pack, to_download, to_link = what
             if to_download:
                 target_file = os.path.join(
@@ -1476,13 +1700,150 @@ class RepoSync(object):
                     checksum_value=checksum,
                 )
                 downloader.add(params)
+                target_indexes.setdefault(target_file, []).append(index)
                 to_download_count += 1
-        if num_to_process != 0:
+        if to_process:
             # pylint: disable-next=consider-using-f-string
             log(0, "    New packages to download:     %5d" % to_download_count)
             log2(0, 0, "  Downloading packages:")
         logger = TextLogger(None, to_download_count)
         downloader.set_log_obj(logger)
+        if self.pipeline and to_download_count:
+            to_process, affected_channels, failed_batches = self._download_and_import(
+                downloader,
+                to_process,
+                target_indexes,
+                to_disassociate,
+                is_non_local_repo,
+            )
+        else:
+            to_process, affected_channels, failed_batches = self._download_then_import(
+                downloader, to_process, to_disassociate, is_non_local_repo
+            )
+        return to_process, affected_channels, failed_batches
+
+    def _claim_packages(self, to_process):
+        """Split off the packages other channels are downloading already.
+
+        Returns to_process without them, the list of the deferred ones and
+        the checksums claimed for this channel.
+        """
+        keys = [
+            (pack.checksum_type, pack.checksum)
+            for pack, to_download, _ in to_process
+            if to_download
+        ]
+        taken = set(self.checksum_registry.claim(keys, os.getpid()))
+        claimed = [key for key in keys if key not in taken]
+        if not taken:
+            return to_process, [], claimed
+        own = []
+        deferred = []
+        for what in to_process:
+            pack, to_download, _ = what
+            if to_download and (pack.checksum_type, pack.checksum) in taken:
+                deferred.append(what)
+            else:
+                own.append(what)
+        log(
+            0,
+            # pylint: disable-next=consider-using-f-string
+            "    Packages synced by other channels: %5d" % len(deferred),
+        )
+        return own, deferred, claimed
+
+    def _fetch_deferred(
+        self,
+        plug,
+        deferred,
+        channel_id,
+        mount_point,
+        to_disassociate,
+        is_non_local_repo,
+    ):
+        """Wait for the packages other channels claimed and link them. The
+        ones the other channels failed to import are fetched here."""
+        keys = [(pack.checksum_type, pack.checksum) for pack, _, _ in deferred]
+        pending = self.checksum_registry.pending(keys)
+        if pending:
+            log(
+                0,
+                # pylint: disable-next=consider-using-f-string
+                "  Waiting for %d packages synced by other channels." % pending,
+            )
+        while pending:
+            time.sleep(claim_poll_interval)
+            pending = self.checksum_registry.pending(keys)
+
+        db_packages = self._get_db_packages(
+            [pack for pack, _, _ in deferred], channel_id
+        )
+        to_process = []
+        for pack, _, _ in deferred:
+            to_download, to_link = self._match_db_package(
+                pack, db_packages, channel_id, mount_point, to_disassociate
+            )
+            if to_download or to_link:
+                if pack.arch in ["src", "nosrc"]:
+                    to_link = False
+                to_process.append((pack, to_download, to_link))
+        if not any(to_download for _, to_download, _ in to_process):
+            return to_process, [], 0
+        return self._fetch_packages(
+            plug, to_process, to_disassociate, is_non_local_repo
+        )
+
+    def _match_db_package(
+        self, pack, db_packages, channel_id, mount_point, to_disassociate
+    ):
+        """Returns (to_download, to_link) of a repository package, depending
+        on the packages already in the database."""
+        packs = db_packages.get(
+            rhnPackage.package_info_key(
+                pack.name, pack.version, pack.release, pack.epoch, pack.arch
+            ),
+            [],
+        )
+        db_pack = None
+        for p in packs:
+            if p["checksum"] == pack.checksum:
+                db_pack = p
+                break
+
+        to_download = True
+        to_link = True
+        # Package exists in DB
+        if db_pack:
+            # Path in filesystem is defined
+            if db_pack["path"]:
+                pack.path = os.path.join(mount_point, db_pack["path"])
+            else:
+                pack.path = ""
+
+            # if the package exists, but under a different org_id we have to download it again
+            if self.metadata_only or self.match_package_checksum(pack, db_pack):
+                # package is already on disk or not required
+                to_download = False
+                if db_pack["channel_id"] == channel_id:
+                    # package is already in the channel
+                    to_link = False
+
+                # just pass data from DB, they will be used if there is no RPM available
+                pack.set_checksum(db_pack["checksum_type"], db_pack["checksum"])
+                pack.epoch = db_pack["epoch"]
+
+                self.all_packages.add((pack.checksum_type, pack.checksum))
+
+            elif db_pack["channel_id"] == channel_id:
+                # different package with SAME NVREA
+                # disassociate from channel if it doesn't match package which will be downloaded
+                to_disassociate[(db_pack["checksum_type"], db_pack["checksum"])] = True
+
+        return to_download, to_link
+
+    def _download_then_import(
+        self, downloader, to_process, to_disassociate, is_non_local_repo
+    ):
         downloader.run()
 
         log(0, "Filtering packages that failed to download")
@@ -1505,6 +1866,7 @@ class RepoSync(object):
         ]
 
         affected_channels = []
+        failed_packages = 0
         with multiprocessing.Pool(
             processes=min(os.cpu_count() * 2, 32), maxtasksperchild=1
         ) as pool:
@@ -1534,46 +1896,105 @@ class RepoSync(object):
                 self.all_packages.update(all_packages)
                 for j, processed in enumerate(processed_batch):
                     to_process[twisted_batch_indexes[i][j]] = processed
+        return to_process, affected_channels, failed_packages
 
-        if affected_channels:
-            errataCache.schedule_errata_cache_update(affected_channels)
-        log2background(0, "Importing packages finished.")
+    def _download_and_import(
+        self, downloader, to_process, target_indexes, to_disassociate, is_non_local_repo
+    ):
+        """Import the packages in batches as soon as they are downloaded,
+        instead of waiting for the whole repository to be on disk.
 
-        # Disassociate packages
-        for checksum_type, checksum in to_disassociate:
-            if to_disassociate[(checksum_type, checksum)]:
-                self.disassociate_package(checksum_type, checksum)
-        # Do not re-link if nothing was marked to link
-        if any([to_link for (pack, to_download, to_link) in to_process]):
-            log(0, "")
-            log(0, "  Linking packages to the channel.")
-            # Packages to append to channel
-            import_batches = list(
-                self.chunks(
-                    [
-                        self.associate_package(pack)
-                        for (pack, to_download, to_link) in to_process
-                        if to_link
+        target_indexes maps every target file to its indexes in to_process.
+        The downloader gets at most max_staged_packages files ahead of the
+        import, so the staging area stays bounded for big repositories.
+        """
+        batch_size = self.import_batch_size
+        batch_count = (len(target_indexes) + batch_size - 1) // batch_size
+        downloader.set_staging_limit(max(self.max_staged_packages, 2 * batch_size))
+
+        lock = threading.Lock()
+        ready = []
+        done = set()
+        batches = []
+
+        log2background(0, "Importing packages started.")
+        log(0, "")
+        log(0, "  Downloading and importing packages to DB:")
+
+        # The workers are forked now, before the download threads are started,
+        # so they stay alive for the whole sync instead of one batch each.
+        with multiprocessing.Pool(processes=min(os.cpu_count() * 2, 32)) as pool:
+
+            def submit(target_files):
+                indexes = [i for f in target_files for i in target_indexes[f]]
+                result = pool.apply_async(
+                    self.import_package_batch,
+                    args=[
+                        [to_process[i] for i in indexes],
+                        to_disassociate,
+                        is_non_local_repo,
+                        len(batches),
+                        max(batch_count, len(batches) + 1),
                     ],
-                    1000,
+                    callback=lambda _: downloader.release_staging_slots(
+                        len(target_files)
+                    ),
+                    error_callback=downloader.fail_download,
                 )
-            )
-            count = 0
-            for import_batch in import_batches:
-                backend = SQLBackend()
-                caller = "server.app.yumreposync"
-                importer = ChannelPackageSubscription(
-                    import_batch, backend, caller=caller, repogen=False
+                batches.append((indexes, result))
+
+            def downloaded(params, success):
+                with lock:
+                    done.add(params["target_file"])
+                    if not success:
+                        downloader.release_staging_slots()
+                        return
+                    ready.append(params["target_file"])
+                    if len(ready) >= batch_size:
+                        submit(ready[:])
+                        del ready[:]
+
+            downloader.set_done_callback(downloaded)
+            downloader.run()
+
+            with lock:
+                # files that were not downloaded at all (e.g. because of a missing
+                # certificate) fail in the import, as they do without the pipeline
+                ready.extend(
+                    f
+                    for f in target_indexes
+                    if f not in done
+                    and os.path.basename(f) not in downloader.failed_pkgs
                 )
-                importer.run()
-                backend.commit()
-                del importer.batch
-                count += len(import_batch)
-                # pylint: disable-next=consider-using-f-string
-                log(0, "    {} packages linked".format(count))
-            self.regen = True
-            self.regenerate_bootstrap_repo = True
-        return failed_packages
+                for i in range(0, len(ready), batch_size):
+                    submit(ready[i : i + batch_size])
+                del ready[:]
+
+            affected_channels = []
+            failed_packages = 0
+            imported_packages = set()
+            for indexes, result in batches:
+                (
+                    affected_channels_batch,
+                    failed_packages_batch,
+                    all_packages,
+                    processed_batch,
+                ) = result.get()
+                affected_channels += affected_channels_batch
+                failed_packages += failed_packages_batch
+                imported_packages.update(all_packages)
+                for index, processed in zip(indexes, processed_batch):
+                    to_process[index] = processed
+        # self is pickled for every batch, do not modify it before all are done
+        self.all_packages.update(imported_packages)
+
+        log(0, "Filtering packages that failed to download")
+        to_process = [
+            i
+            for i in to_process
+            if os.path.basename(i[0].path) not in downloader.failed_pkgs
+        ]
+        return to_process, affected_channels, failed_packages
 
     def twisted_batch_indexes(self, total_size, batch_size):
         """Assume a list of total_size elements, and consider the following two possible divisions of its elements: per "batch" or per "chunk".
@@ -1815,6 +2236,8 @@ class RepoSync(object):
                 batch_index + 1, batch_count
             ),
         )
+        # pool workers leave through os._exit(), without the atexit handlers
+        rhnLog.log_flush()
         return affected_channels, failed_packages, all_packages, to_process
 
     def show_packages(self, plug, source_id):
@@ -1855,11 +2278,13 @@ class RepoSync(object):
         with cfg_component("server.susemanager") as CFG:
             mount_point = CFG.MOUNT_POINT
 
+        db_packages = self._get_db_packages(packages, channel_id)
         for pack in packages:
-            packs = rhnPackage.get_info_for_package(
-                [pack.name, pack.version, pack.release, pack.epoch, pack.arch],
-                channel_id,
-                self.org_id,
+            packs = db_packages.get(
+                rhnPackage.package_info_key(
+                    pack.name, pack.version, pack.release, pack.epoch, pack.arch
+                ),
+                [],
             )
             db_pack = None
             for p in packs:
@@ -1903,6 +2328,29 @@ class RepoSync(object):
 
             log(0, "    " + pack_status + pack_full_name + pack_size + pack_hash_info)
 
+    def _get_db_packages(self, packages, channel_id):
+        """
+        Look up all the repository packages in the database at once.
+
+        Returns the rhnPackage.get_info_for_packages() index of packages.
+        """
+        start_time = datetime.now()
+        db_packages = rhnPackage.get_info_for_packages(
+            [
+                [pack.name, pack.version, pack.release, pack.epoch, pack.arch]
+                for pack in packages
+            ],
+            channel_id,
+            self.org_id,
+        )
+        log(
+            1,
+            # pylint: disable-next=consider-using-f-string
+            "    Looked up %d packages in the database in %s"
+            % (len(packages), datetime.now() - start_time),
+        )
+        return db_packages
+
     def match_package_checksum(self, md_pack, db_pack):
         """compare package checksum"""
 
@@ -2737,7 +3185,27 @@ class RepoSync(object):
     # pylint: disable-next=redefined-outer-name
     def import_products(self, repo):
         products = repo.get_products()
+        evr_ids = rhnLookupCache.lookup_evrs(
+            (p["epoch"], p["version"], p["release"]) for p in products
+        )
+        arch_ids = rhnLookupCache.lookup_labels(
+            "rhnPackageArch", set(p["arch"] for p in products)
+        )
         for product in products:
+            if product["arch"] not in arch_ids:
+                log(
+                    0,
+                    # pylint: disable-next=consider-using-f-string
+                    "Unknown architecture %s of product %s, skipping it"
+                    % (product["arch"], product["name"]),
+                )
+                continue
+            ids = {
+                "evr_id": evr_ids[
+                    (product["epoch"], product["version"], product["release"])
+                ],
+                "package_arch_id": arch_ids[product["arch"]],
+            }
             query = rhnSQL.prepare(
                 """
                 select spf.id
@@ -2745,14 +3213,14 @@ class RepoSync(object):
                   join rhnpackageevr pe on pe.id = spf.evr_id
                   join rhnpackagearch pa on pa.id = spf.package_arch_id
                  where spf.name = :name
-                   and spf.evr_id = LOOKUP_EVR(:epoch, :version, :release, 'rpm')
-                   and spf.package_arch_id = LOOKUP_PACKAGE_ARCH(:arch)
+                   and spf.evr_id = :evr_id
+                   and spf.package_arch_id = :package_arch_id
                    and spf.vendor = :vendor
                    and spf.summary = :summary
                    and spf.description = :description
             """
             )
-            query.execute(**product)
+            query.execute(**product, **ids)
             row = query.fetchone_dict()
             if not row or "id" not in row:
                 get_id_q = rhnSQL.prepare(
@@ -2768,11 +3236,11 @@ class RepoSync(object):
                     """
                     insert into suseProductFile
                         (id, name, evr_id, package_arch_id, vendor, summary, description)
-                    VALUES (:id, :name, LOOKUP_EVR(:epoch, :version, :release, 'rpm'),
-                            LOOKUP_PACKAGE_ARCH(:arch), :vendor, :summary, :description)
+                    VALUES (:id, :name, :evr_id, :package_arch_id, :vendor, :summary,
+                            :description)
                 """
                 )
-                h.execute(id=row["id"], **product)
+                h.execute(id=row["id"], **product, **ids)
 
             params = {
                 # pylint: disable-next=consider-using-f-string
@@ -2826,8 +3294,17 @@ class RepoSync(object):
     def import_susedata(self, repo):
         kwcache = {}
         susedata = repo.get_susedata()
+        # susedata exists only for package type == rpm
+        evr_ids = rhnLookupCache.lookup_evrs(
+            (p["epoch"], p["version"], p["release"]) for p in susedata
+        )
+        arch_ids = rhnLookupCache.lookup_labels(
+            "rhnPackageArch", set(p["arch"] for p in susedata)
+        )
         for package in susedata:
-            # susedata exists only for package type == rpm
+            if package["arch"] not in arch_ids:
+                # no such package in the DB
+                continue
             query = rhnSQL.prepare(
                 """
                 SELECT p.id
@@ -2836,18 +3313,17 @@ class RepoSync(object):
                   JOIN rhnChecksumView c ON p.checksum_id = c.id
                   JOIN rhnChannelPackage cp ON p.id = cp.package_id
                  WHERE pn.name = :name
-                   AND p.evr_id = LOOKUP_EVR(:epoch, :version, :release, 'rpm')
-                   AND p.package_arch_id = LOOKUP_PACKAGE_ARCH(:arch)
+                   AND p.evr_id = :evr_id
+                   AND p.package_arch_id = :package_arch_id
                    AND cp.channel_id = :channel_id
                    AND c.checksum = :pkgid
                 """
             )
+            evr = (package["epoch"], package["version"], package["release"])
             query.execute(
                 name=package["name"],
-                epoch=package["epoch"],
-                version=package["version"],
-                release=package["release"],
-                arch=package["arch"],
+                evr_id=evr_ids[evr],
+                package_arch_id=arch_ids[package["arch"]],
                 pkgid=package["pkgid"],
                 channel_id=int(self.channel["id"]),
             )
@@ -3089,10 +3565,10 @@ class RepoSync(object):
         if d and d["label"] == repo_checksum_type:
             # checksum_type is the same, no need to change anything
             return
-        h = rhnSQL.prepare("""SELECT id FROM rhnChecksumType WHERE label = :clabel""")
-        h.execute(clabel=repo_checksum_type)
-        d = h.fetchone_dict() or None
-        if not (d and d["id"]):
+        checksum_type_id = rhnLookupCache.lookup_labels(
+            "rhnChecksumType", [repo_checksum_type]
+        ).get(repo_checksum_type)
+        if not checksum_type_id:
             # unknown or invalid checksum_type
             # better not change the channel
             return
@@ -3102,7 +3578,7 @@ class RepoSync(object):
                                  SET checksum_type_id = :ctid
                                WHERE id = :cid"""
         )
-        h.execute(ctid=d["id"], cid=self.channel["id"])
+        h.execute(ctid=checksum_type_id, cid=self.channel["id"])
 
     @staticmethod
     def get_compatible_arches(channel_id):
@@ -32,7 +32,7 @@ from uyuni.common.usix import raise_with_tb
 from uyuni.common import rhnLib
 from spacewalk.common.rhnLog import log_time, log_clean
 from spacewalk.common.fileutils import chown_chmod_path, create_path
-from spacewalk.common.rhnConfig import cfg_component
+from spacewalk.common.rhnConfig import config_snapshot
 
 from . import messages
 
@@ -132,11 +132,10 @@ def log2stream(level, msg, cleanYN, notimeYN, stream):
     """
     if not isinstance(msg, type([])):
         msg = [msg]
-    with cfg_component(component=None) as CFG:
-        if CFG.DEBUG >= level:
-            for m in msg:
-                stream.write(_prepLogMsg(m, cleanYN, notimeYN, shortYN=1) + "\n")
-            stream.flush()
+    if config_snapshot().DEBUG >= level:
+        for m in msg:
+            stream.write(_prepLogMsg(m, cleanYN, notimeYN, shortYN=1) + "\n")
+        stream.flush()
 
 
 def log2email(level, msg, cleanYN=0, notimeYN=0):
@@ -202,9 +201,9 @@ class FileManip:
         self.relative_path = relative_path
         self.timestamp = rhnLib.timestamp(timestamp)
         self.file_size = file_size
-        with cfg_component(component=None) as CFG:
-            self.full_path = os.path.join(CFG.MOUNT_POINT, self.relative_path)
-            self.buffer_size = CFG.BUFFER_SIZE
+        cfg = config_snapshot()
+        self.full_path = os.path.join(cfg.MOUNT_POINT, self.relative_path)
+        self.buffer_size = cfg.BUFFER_SIZE
 
     def write_file(self, stream_in):
         """Writes the contents of stream_in to the filesystem
@@ -239,13 +238,13 @@ class FileManip:
         fout = open(self.full_path, "wb")
         # setting file permissions; NOTE: rhnpush uses apache to write to disk,
         # hence the 6 setting.
-        with cfg_component(component=None) as CFG:
-            chown_chmod_path(
-                self.full_path,
-                user=CFG.httpd_user,
-                group=CFG.httpd_group,
-                chmod=int("0644", 8),
-            )
+        cfg = config_snapshot()
+        chown_chmod_path(
+            self.full_path,
+            user=cfg.httpd_user,
+            group=cfg.httpd_group,
+            chmod=int("0644", 8),
+        )
         size = 0
         try:
             while 1:
@@ -18,6 +18,7 @@
 
 import os
 import gzip
+import json
 from spacewalk.common.fileutils import create_path
 from uyuni.common.rhnLib import hash_object_id
 
@@ -473,6 +474,56 @@ class ClonedChannelsDiskSource(DiskSource):
         return "%s/cloned_channels.xml" % dirname
 
 
+class DeltaManifestDiskSource(DiskSource):
+    """The delta manifest an incremental export writes next to the files.
+
+    It lists the packages, errata and RPMs the export wrote, an import of
+    the export can skip all other objects of these kinds.
+    """
+
+    filename = "manifest-delta.json"
+
+    def __init__(self, mountPoint):
+        DiskSource.__init__(self, mountPoint)
+        self._manifest = None
+
+    def _getFile(self, create=0):
+        return os.path.join(self.mountPoint, self.filename)
+
+    def _get_manifest(self):
+        if self._manifest is None:
+            self._manifest = {}
+            filename = self._getFile()
+            if os.path.isfile(filename):
+                with open(filename, "r", encoding="utf-8") as f:
+                    self._manifest = json.load(f)
+        return self._manifest
+
+    def is_incremental(self):
+        return "objects" in self._get_manifest()
+
+    def since(self):
+        """Time stamp of the export the delta is based on."""
+        return self._get_manifest().get("since")
+
+    def changed(self, kind, object_id):
+        """Whether the export wrote the object. Without a delta manifest
+        everything has to be imported."""
+        if not self.is_incremental():
+            return True
+        return str(object_id) in self._get_manifest()["objects"].get(kind, {})
+
+    def checksum(self, kind, object_id):
+        """Returns (checksum type, checksum) of the exported file, None if
+        the export did not write it."""
+        if not self.is_incremental():
+            return None
+        entry = self._get_manifest()["objects"].get(kind, {}).get(str(object_id))
+        if entry is None:
+            return None
+        return entry[1], entry[2]
+
+
 if __name__ == "__main__":
     # TEST CODE
     s = ChannelDiskSource("/tmp")
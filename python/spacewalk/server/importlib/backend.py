@@ -26,11 +26,11 @@ import sys
 
 from uyuni.common.usix import raise_with_tb
 from uyuni.common import rhn_rpm
-from spacewalk.common.rhnConfig import cfg_component
+from spacewalk.common.rhnConfig import config_snapshot
 from spacewalk.common.rhnException import rhnFault
 from spacewalk.common.rhnLog import log_debug
 from spacewalk.satellite_tools import syncLib
-from spacewalk.server import rhnSQL, rhnChannel, taskomatic
+from spacewalk.server import rhnSQL, rhnChannel, rhnLookupCache, taskomatic
 from .importLib import (
     Diff,
     Package,
@@ -49,6 +49,7 @@ from .backendLib import (
     TableLookup,
     addHash,
     TableInsert,
+    TableCopy,
 )
 
 
@@ -80,6 +81,12 @@ sequences = {
     "suseSCCRepository": "suse_sccrepository_id_seq",
 }
 
+# Tables with fewer rows to insert than this are not worth the additional
+# statements of a COPY based insert
+BULK_COPY_MIN_ROWS = 500
+# The child rows of new packages kept in memory before they are loaded
+BULK_COPY_MAX_ROWS = 200000
+
 
 # pylint: disable-next=missing-class-docstring
 class Backend:
@@ -92,6 +99,9 @@ class Backend:
     def __init__(self, dbmodule):
         self.dbmodule = dbmodule
         self.sequences = {}
+        # Child table rows of new objects, inserted with COPY later; see
+        # processPackages
+        self.bulk_insert = None
 
     # TODO: Why is there a pseudo-constructor here instead of just using
     # __init__?
@@ -170,9 +180,8 @@ class Backend:
 
     # pylint: disable-next=invalid-name
     def processChangeLog(self, changelogHash):
-        with cfg_component(None) as cfg:
-            if cfg.get("package_import_skip_changelog"):
-                return None
+        if config_snapshot().get("package_import_skip_changelog"):
+            return None
 
         if not changelogHash:
             return
@@ -417,15 +426,8 @@ class Backend:
         if not archHash:
             return
 
-        # pylint: disable-next=consider-using-f-string
-        sql = "select id from %s where label = :name" % table
-        h = self.dbmodule.prepare(sql)
-        for k in list(archHash.keys()):
-            h.execute(name=str(k))
-            row = h.fetchone_dict()
-            if row:
-                archHash[k] = row["id"]
-            # Else, it's an unsupported architecture
+        # Unsupported architectures are left alone
+        archHash.update(rhnLookupCache.lookup_labels(table, archHash))
 
     # pylint: disable-next=invalid-name
     def lookupChannelArches(self, archHash):
@@ -725,11 +727,7 @@ class Backend:
     def lookupPackageNames(self, nameHash):
         if not nameHash:
             return
-        sql = "select LOOKUP_PACKAGE_NAME(:name) id from dual"
-        h = self.dbmodule.prepare(sql)
-        for k in sorted(nameHash.keys()):
-            h.execute(name=k)
-            nameHash[k] = h.fetchone_dict()["id"]
+        nameHash.update(rhnLookupCache.lookup_package_names(nameHash))
 
     # pylint: disable-next=invalid-name
     def lookupErratum(self, erratum):
@@ -784,85 +782,23 @@ class Backend:
 
     # pylint: disable-next=invalid-name
     def lookupEVRs(self, evrHash, ptype):
-        sql = "select LOOKUP_EVR(:epoch, :version, :release, :ptype) id from dual"
-        h = self.dbmodule.prepare(sql)
-        for evr in sorted(evrHash.keys(), key=lambda k: (str(k[0] or 0), k[1], k[2])):
-            epoch, version, release = evr
-            if epoch == "" or epoch is None:
-                epoch = None
-            else:
-                epoch = str(epoch)
-            h.execute(epoch=epoch, version=version, release=release, ptype=ptype)
-            row = h.fetchone_dict()
-            if row:
-                evrHash[evr] = row["id"]
+        if not evrHash:
+            return
+        evrHash.update(rhnLookupCache.lookup_evrs(evrHash, ptype))
 
     # pylint: disable-next=invalid-name
     def lookupChecksums(self, checksumHash):
         if not checksumHash:
             return
-
-        sql = """
-            WITH wanted (ordering, checksum_type, checksum) AS (
-              VALUES %s
-            ),
-            missing AS (
-              SELECT nextval('rhnchecksum_seq') AS id, rhnChecksumType.id AS checksum_type_id, wanted.*
-                FROM wanted
-                  JOIN rhnChecksumType ON wanted.checksum_type = rhnChecksumType.label
-                  LEFT JOIN rhnChecksum
-                    ON rhnChecksum.checksum_type_id = rhnChecksumType.id
-                      AND rhnChecksum.checksum = wanted.checksum
-                WHERE rhnChecksum.id IS NULL
-            )
-            INSERT INTO rhnChecksum(id, checksum_type_id, checksum)
-              SELECT id, checksum_type_id, checksum
-                FROM missing
-                ORDER BY ordering
-              ON CONFLICT DO NOTHING
-        """
-        sorted_checksums = sorted(checksumHash.keys(), key=lambda k: (k[0], k[1] or ""))
-        values = [
-            (i, key[0], key[1])
-            for i, key in enumerate(sorted_checksums)
-            if key[1] != ""
-        ]
-
-        if not values:
-            return
-
-        h = self.dbmodule.prepare(sql)
-        # pylint: disable-next=unused-variable
-        r = h.execute_values(sql, values, fetch=False)
-
-        sql = """
-        WITH wanted (ordering, checksum_type, checksum) AS (
-            VALUES %s
-          )
-          SELECT wanted.checksum_type, wanted.checksum, rhnChecksum.id
-            FROM wanted
-              JOIN rhnChecksumType ON wanted.checksum_type = rhnChecksumType.label
-              JOIN rhnChecksum
-                ON rhnChecksum.checksum_type_id = rhnChecksumType.id
-                  AND rhnChecksum.checksum = wanted.checksum
-        """
-        h = self.dbmodule.prepare(sql)
-        checksums = h.execute_values(sql, values)
-
-        for checksum in checksums:
-            checksumHash[(checksum[0], checksum[1])] = checksum[2]
+        checksumHash.update(rhnLookupCache.lookup_checksums(checksumHash))
 
     # pylint: disable-next=invalid-name
     def lookupChecksumTypes(self, checksumTypeHash):
         if not checksumTypeHash:
             return
-        sql = "select id from rhnChecksumType where label = :label"
-        h = self.dbmodule.prepare(sql)
-        for l in list(checksumTypeHash.keys()):
-            h.execute(label=l)
-            row = h.fetchone_dict()
-            if row:
-                checksumTypeHash[l] = row["id"]
+        checksumTypeHash.update(
+            rhnLookupCache.lookup_labels("rhnChecksumType", checksumTypeHash)
+        )
 
     # pylint: disable-next=invalid-name
     def lookupPackageNEVRAs(self, nevraHash):
@@ -986,8 +922,11 @@ class Backend:
         seq = self.dbmodule.Sequence(sequence_name)
         to_insert = []
         to_update = []
-        result = {}
+        # Entries already in the table, with the same name
+        result = rhnLookupCache.lookup_labels(table_name, hash, names=hash)
         for label, name in list(hash.items()):
+            if label in result:
+                continue
             row = t[label]
             if not row:
                 row_id = seq.next()
@@ -998,6 +937,10 @@ class Backend:
             result[label] = row_id
             if row["name"] != name:
                 to_update.append((label, name))
+                # The cached id is only good for the current name
+                rhnLookupCache.invalidate(
+                    table_name + ".name", [(str(label), row["name"])]
+                )
                 continue
             # Entry found in the table - nothing more to do
 
@@ -1120,10 +1063,30 @@ class Backend:
             "susePackageEula": "package_id",
             "rhnPackageExtraTag": "package_id",
         }
-        with cfg_component(None) as cfg:
-            if cfg.get("package_import_skip_changelog"):
-                del childTables["rhnPackageChangeLogRec"]
+        cfg = config_snapshot()
+        if cfg.get("package_import_skip_changelog"):
+            del childTables["rhnPackageChangeLogRec"]
+
+        if cfg.get("package_import_bulk_copy", 1):
+            # The child rows of new packages are collected and loaded with
+            # COPY; already uploaded packages are still diffed row by row
+            self.bulk_insert = DML(list(childTables.keys()), self.tables).insert
+        try:
+            self.__processPackages(
+                packages,
+                childTables,
+                uploadForce=uploadForce,
+                forceVerify=forceVerify,
+                ignoreUploaded=ignoreUploaded,
+                transactional=transactional,
+            )
+            if self.bulk_insert is not None:
+                self.__doBulkInsert()
+        finally:
+            self.bulk_insert = None
 
+    # pylint: disable-next=invalid-name
+    def __processPackages(self, packages, childTables, **kwargs):
         for package in packages:
             if not isinstance(package, Package):
                 raise TypeError("Expected a Package instance")
@@ -1144,11 +1107,8 @@ class Backend:
                     ],
                     "rhnPackage",
                     tableList,
-                    uploadForce=uploadForce,
-                    forceVerify=forceVerify,
-                    ignoreUploaded=ignoreUploaded,
                     severityLimit=1,
-                    transactional=transactional,
+                    **kwargs,
                 )
             except Exception as e:
                 syncLib.log(
@@ -1166,6 +1126,11 @@ class Backend:
                 )
                 raise
 
+            if self.bulk_insert is not None and (
+                _row_count(self.bulk_insert) >= BULK_COPY_MAX_ROWS
+            ):
+                self.__doBulkInsert()
+
     # pylint: disable-next=invalid-name
     def processErrata(self, errata):
         # Insert/update the packages
@@ -2577,7 +2542,10 @@ class Backend:
                     modified_packages[1].append(package_id)
 
         self.__doDeleteTable("rhnChannelPackage", extra_cp)
-        self.__doInsertTable("rhnChannelPackage", hash)
+        if config_snapshot().get("package_import_bulk_copy", 1):
+            self.__doCopyTable("rhnChannelPackage", hash)
+        else:
+            self.__doInsertTable("rhnChannelPackage", hash)
         # This function returns the channels that were affected
         return affected_channels
 
@@ -2815,6 +2783,7 @@ class Backend:
                 addHash(dml.insert[parentTable], extObject)
 
                 # Insert child table information
+                insert = dml.insert if self.bulk_insert is None else self.bulk_insert
                 for tname in childTables:
                     tbl = self.tables[tname]
                     # Get the list of objects for this package
@@ -2842,7 +2811,7 @@ class Backend:
                             # column as well
                             entry[seq_col] = new_id
                         _buildExternalValue(extObject, entry, tbl)
-                        addHash(dml.insert[tname], extObject)
+                        addHash(insert[tname], extObject)
                 object.diff_result = Diff()
                 # New object
                 object.diff_result.level = -1
@@ -3049,6 +3018,26 @@ class Backend:
         insertObj.query(hash)
         return
 
+    # pylint: disable-next=invalid-name
+    def __doBulkInsert(self):
+        for tname, columns in list(self.bulk_insert.items()):
+            try:
+                self.__doCopyTable(tname, columns)
+            except rhnSQL.SQLError as e:
+                raise_with_tb(rhnFault(54, str(e), explain=0), sys.exc_info()[2])
+            for values in list(columns.values()):
+                del values[:]
+
+    # pylint: disable-next=invalid-name,redefined-builtin
+    def __doCopyTable(self, table, hash):
+        rows = _row_count({table: hash})
+        if rows < BULK_COPY_MIN_ROWS:
+            self.__doInsertTable(table, hash)
+            return
+        # pylint: disable-next=consider-using-f-string
+        log_debug(3, "Loading %s rows into %s with COPY" % (rows, table))
+        TableCopy(self.tables[table], self.dbmodule).query(hash)
+
     # pylint: disable-next=invalid-name,redefined-builtin
     def __doDelete(self, hash, tables):
         for tname in tables:
@@ -3287,11 +3276,10 @@ class Backend:
     def validate_pks(self):
         # If nevra is enabled use checksum as primary key
         tbs = self.tables["rhnPackage"]
-        with cfg_component("server") as cfg:
-            if not cfg.ENABLE_NVREA:
-                # remove checksum from a primary key if nevra is disabled.
-                if "checksum_id" in tbs.pk:
-                    tbs.pk.remove("checksum_id")
+        if not config_snapshot("server").ENABLE_NVREA:
+            # remove checksum from a primary key if nevra is disabled.
+            if "checksum_id" in tbs.pk:
+                tbs.pk.remove("checksum_id")
 
 
 # Returns a tuple for the hash's values
@@ -3341,6 +3329,11 @@ class DML:
                 dmlhash[tname] = hash
 
 
+def _row_count(tables):
+    # Rows in a hash of table names to hashes of column value lists
+    return sum(len(next(iter(columns.values()), [])) for columns in tables.values())
+
+
 # pylint: disable-next=invalid-name
 def _buildDatabaseValue(row, fieldsHash):
     # Returns a dictionary containing the interesting values of the row,
@@ -492,6 +492,49 @@ class TableInsert(TableUpdate):
         )
 
 
+class TableCopy(TableInsert):
+    """
+    Bulk insert through COPY: the rows are streamed into a temporary
+    staging table and merged into the table with a single INSERT ... SELECT.
+    Rows conflicting with existing ones are skipped.
+    """
+
+    def __init__(self, table, dbmodule):
+        TableInsert.__init__(self, table, dbmodule)
+        self.stage = "stage_" + self.table.name.lower()
+
+    def _statement(self, template):
+        if template not in self.queries:
+            columns = ", ".join(self.insert_fields)
+            self.queries[template] = self.dbmodule.prepare(
+                template
+                % {"table": self.table.name, "stage": self.stage, "columns": columns}
+            )
+        return self.queries[template]
+
+    def query(self, values):
+        # The staging table has the columns of the table, but none of its
+        # constraints, defaults or triggers; it lives until the session ends
+        # and is emptied by every commit
+        self._statement(
+            """create temporary table if not exists %(stage)s
+               on commit delete rows
+               as select %(columns)s from %(table)s with no data"""
+        ).execute()
+        # Left over by a failed load in this transaction
+        self._statement("truncate %(stage)s").execute()
+
+        l = len(values[self.insert_fields[0]])
+        self._statement("copy %(stage)s (%(columns)s) from stdin").copy_from(
+            [values[f][i] for f in self.insert_fields] for i in range(l)
+        )
+        return self._statement(
+            """insert into %(table)s (%(columns)s)
+               select %(columns)s from %(stage)s
+               on conflict do nothing"""
+        ).execute()
+
+
 def sanitizeValue(value, datatype):
     if isinstance(datatype, DBstring):
         return _sanitize_dbstring(value, datatype)
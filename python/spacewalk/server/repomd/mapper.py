@@ -33,14 +33,21 @@ from . import domain
 
 CACHE_PREFIX = "/var/cache/rhn/"
 
+# Number of packages loaded at once by BulkSqlPackageMapper
+BULK_PAGE_SIZE = 1000
+
 
 class ChannelMapper:
     """Data Mapper for Channels to the RHN db."""
 
-    def __init__(self, pkg_mapper, erratum_mapper, repomd_mapper):
+    def __init__(
+        self, pkg_mapper, erratum_mapper, repomd_mapper, channel_pkg_mapper=None
+    ):
         self.pkg_mapper = pkg_mapper
         self.erratum_mapper = erratum_mapper
         self.repomd_mapper = repomd_mapper
+        # Optional mapper able to load all the packages of a channel at once
+        self.channel_pkg_mapper = channel_pkg_mapper
 
         self.channel_details_sql = rhnSQL.prepare(
             """
@@ -148,7 +155,10 @@ class ChannelMapper:
         package_ids = self.channel_sql.fetchall()
 
         channel.num_packages = len(package_ids)
-        channel.packages = self._package_generator(package_ids)
+        if self.channel_pkg_mapper is not None:
+            channel.packages = self.channel_pkg_mapper.get_channel_packages(channel_id)
+        else:
+            channel.packages = self._package_generator(package_ids)
 
         channel.errata = self._erratum_generator(channel_id)
 
@@ -460,7 +470,10 @@ class SqlPackageMapper:
         """Load the packages basic details (summary, description, etc)."""
         self.details_sql.execute(package_id=package.id)
         pkg = self.details_sql.fetchone()
+        self._set_package_details(package, pkg)
 
+    def _set_package_details(self, package, pkg):
+        """Set the packages basic details from a details_sql row."""
         package.name = pkg[0]
         package.version = pkg[1]
         package.release = pkg[2]
@@ -493,55 +506,59 @@ class SqlPackageMapper:
         deps = self.prco_sql.fetchall() or []
 
         for item in deps:
-            version = item[3] or ""
-            relation = ""
-            release = None
-            epoch = 0
-            if version:
-                sense = item[1] or 0
-                relation = SqlPackageMapper.__get_relation(sense)
-
-                vertup = version.split("-")
-                if len(vertup) > 1:
-                    version = vertup[0]
-                    release = vertup[1]
-
-                vertup = version.split(":")
-                if len(vertup) > 1:
-                    epoch = vertup[0]
-                    version = vertup[1]
-
-            dep = {
-                "name": string_to_unicode(item[2]),
-                "flag": relation,
-                "version": version,
-                "release": release,
-                "epoch": epoch,
-            }
-
-            if item[0] == "provides":
-                package.provides.append(dep)
-            elif item[0] == "requires":
-                package.requires.append(dep)
-            elif item[0] == "conflicts":
-                package.conflicts.append(dep)
-            elif item[0] == "obsoletes":
-                package.obsoletes.append(dep)
-            elif item[0] == "recommends":
-                package.recommends.append(dep)
-            elif item[0] == "supplements":
-                package.supplements.append(dep)
-            elif item[0] == "enhances":
-                package.enhances.append(dep)
-            elif item[0] == "suggests":
-                package.suggests.append(dep)
-            elif item[0] == "breaks":
-                package.breaks.append(dep)
-            elif item[0] == "predepends":
-                package.predepends.append(dep)
-            else:
-                # pylint: disable-next=consider-using-f-string
-                assert False, "Unknown PRCO type: %s" % item[0]
+            self._add_package_dep(package, item)
+
+    def _add_package_dep(self, package, item):
+        """Add a (type, sense, name, version) prco_sql row to the package."""
+        version = item[3] or ""
+        relation = ""
+        release = None
+        epoch = 0
+        if version:
+            sense = item[1] or 0
+            relation = SqlPackageMapper.__get_relation(sense)
+
+            vertup = version.split("-")
+            if len(vertup) > 1:
+                version = vertup[0]
+                release = vertup[1]
+
+            vertup = version.split(":")
+            if len(vertup) > 1:
+                epoch = vertup[0]
+                version = vertup[1]
+
+        dep = {
+            "name": string_to_unicode(item[2]),
+            "flag": relation,
+            "version": version,
+            "release": release,
+            "epoch": epoch,
+        }
+
+        if item[0] == "provides":
+            package.provides.append(dep)
+        elif item[0] == "requires":
+            package.requires.append(dep)
+        elif item[0] == "conflicts":
+            package.conflicts.append(dep)
+        elif item[0] == "obsoletes":
+            package.obsoletes.append(dep)
+        elif item[0] == "recommends":
+            package.recommends.append(dep)
+        elif item[0] == "supplements":
+            package.supplements.append(dep)
+        elif item[0] == "enhances":
+            package.enhances.append(dep)
+        elif item[0] == "suggests":
+            package.suggests.append(dep)
+        elif item[0] == "breaks":
+            package.breaks.append(dep)
+        elif item[0] == "predepends":
+            package.predepends.append(dep)
+        else:
+            # pylint: disable-next=consider-using-f-string
+            assert False, "Unknown PRCO type: %s" % item[0]
 
     #    @staticmethod
     def __get_relation(sense):
@@ -584,14 +601,217 @@ class SqlPackageMapper:
         log_data = self.other_sql.fetchall() or []
 
         for data in log_data:
-            date = oratimestamp_to_sinceepoch(data[2])
+            self._add_package_changelog(package, data)
+
+    def _add_package_changelog(self, package, data):
+        """Add a (name, text, time) other_sql row to the package."""
+        date = oratimestamp_to_sinceepoch(data[2])
+
+        chglog = {
+            "author": string_to_unicode(data[0]),
+            "date": date,
+            "text": string_to_unicode(data[1]),
+        }
+        package.changelog.append(chglog)
+
+
+class BulkSqlPackageMapper(SqlPackageMapper):
+    """
+    Data Mapper loading all the Packages of a channel from the RHN db.
+
+    Packages are read in package id ordered pages, with one query per
+    attribute table and page instead of a handful of queries per package.
+    """
+
+    # (prco type, table) pairs, in the same order as SqlPackageMapper.prco_sql
+    prco_tables = (
+        ("provides", "rhnPackageProvides"),
+        ("requires", "rhnPackageRequires"),
+        ("recommends", "rhnPackageRecommends"),
+        ("supplements", "rhnPackageSupplements"),
+        ("enhances", "rhnPackageEnhances"),
+        ("suggests", "rhnPackageSuggests"),
+        ("conflicts", "rhnPackageConflicts"),
+        ("obsoletes", "rhnPackageObsoletes"),
+        ("breaks", "rhnPackageBreaks"),
+        ("predepends", "rhnPackagePredepends"),
+    )
 
-            chglog = {
-                "author": string_to_unicode(data[0]),
-                "date": date,
-                "text": string_to_unicode(data[1]),
-            }
-            package.changelog.append(chglog)
+    def __init__(self, page_size=None):
+        SqlPackageMapper.__init__(self)
+
+        if page_size is None:
+            page_size = CFG.get("repomd_bulk_page_size", BULK_PAGE_SIZE)
+        self.page_size = int(page_size)
+
+        self.page_sql = rhnSQL.prepare(
+            """
+        select
+            package_id
+        from
+            rhnChannelPackage
+        where
+            channel_id = :channel_id
+        and package_id > :after_id
+        order by package_id
+        limit :page_size
+        """
+        )
+
+        self.bulk_details_sql = rhnSQL.prepare(
+            """
+        select
+            p.id,
+            pn.name,
+            pevr.version,
+            pevr.release,
+            pevr.epoch,
+            pa.label arch,
+            c.checksum checksum,
+            p.summary,
+            p.description,
+            p.vendor,
+            p.build_time,
+            p.package_size,
+            p.payload_size,
+            p.installed_size,
+            p.header_start,
+            p.header_end,
+            pg.name package_group,
+            p.build_host,
+            p.copyright,
+            p.path,
+            sr.name source_rpm,
+            p.last_modified,
+            c.checksum_type
+        from
+            rhnChannelPackage cp,
+            rhnPackage p,
+            rhnPackageName pn,
+            rhnPackageEVR pevr,
+            rhnPackageArch pa,
+            rhnPackageGroup pg,
+            rhnSourceRPM sr,
+            rhnChecksumView c
+        where
+            cp.channel_id = :channel_id
+        and cp.package_id between :first_id and :last_id
+        and p.id = cp.package_id
+        and p.name_id = pn.id
+        and p.evr_id = pevr.id
+        and p.package_arch_id = pa.id
+        and p.package_group = pg.id
+        and p.source_rpm_id = sr.id
+        and p.checksum_id = c.id
+        """
+        )
+
+        self.bulk_filelist_sql = rhnSQL.prepare(
+            """
+        select
+            pf.package_id,
+            pc.name
+        from
+            rhnChannelPackage cp,
+            rhnPackageCapability pc,
+            rhnPackageFile pf
+        where
+            cp.channel_id = :channel_id
+        and cp.package_id between :first_id and :last_id
+        and pf.package_id = cp.package_id
+        and pf.capability_id = pc.id
+        """
+        )
+
+        prco_selects = []
+        for prco_type, table in self.prco_tables:
+            prco_selects.append(
+                # pylint: disable-next=consider-using-f-string
+                """
+        select
+           dep.package_id,
+           '%s',
+           dep.sense,
+           pc.name,
+           pc.version
+        from
+           rhnChannelPackage cp,
+           rhnPackageCapability pc,
+           %s dep
+        where
+           cp.channel_id = :channel_id
+           and cp.package_id between :first_id and :last_id
+           and dep.package_id = cp.package_id
+           and dep.capability_id = pc.id
+        """
+                % (prco_type, table)
+            )
+        self.bulk_prco_sql = rhnSQL.prepare("union all".join(prco_selects))
+
+        self.bulk_other_sql = rhnSQL.prepare(
+            """
+        select
+            cl.package_id,
+            cl.name,
+            cl.text,
+            cl.time
+        from
+            rhnChannelPackage cp,
+            rhnPackageChangelog cl
+        where
+            cp.channel_id = :channel_id
+        and cp.package_id between :first_id and :last_id
+        and cl.package_id = cp.package_id
+        """
+        )
+
+    def get_channel_packages(self, channel_id):
+        """
+        Yield all the packages of the channel with id channel_id.
+
+        Only one page of packages is kept in memory at a time.
+        """
+        after_id = 0
+        while True:
+            self.page_sql.execute(
+                channel_id=channel_id, after_id=after_id, page_size=self.page_size
+            )
+            package_ids = [row[0] for row in self.page_sql.fetchall() or []]
+            if not package_ids:
+                return
+
+            packages = self._get_package_page(
+                channel_id, package_ids[0], package_ids[-1]
+            )
+            for package_id in package_ids:
+                yield packages[package_id]
+
+            after_id = package_ids[-1]
+
+    def _get_package_page(self, channel_id, first_id, last_id):
+        """Load the packages of the channel with ids from first_id to last_id."""
+        params = {"channel_id": channel_id, "first_id": first_id, "last_id": last_id}
+        packages = {}
+
+        self.bulk_details_sql.execute(**params)
+        for row in self.bulk_details_sql.fetchall() or []:
+            package = domain.Package(str(row[0]))
+            self._set_package_details(package, row[1:])
+            packages[row[0]] = package
+
+        self.bulk_prco_sql.execute(**params)
+        for row in self.bulk_prco_sql.fetchall() or []:
+            self._add_package_dep(packages[row[0]], row[1:])
+
+        self.bulk_filelist_sql.execute(**params)
+        for row in self.bulk_filelist_sql.fetchall() or []:
+            packages[row[0]].files.append(string_to_unicode(row[1]))
+
+        self.bulk_other_sql.execute(**params)
+        for row in self.bulk_other_sql.fetchall() or []:
+            self._add_package_changelog(packages[row[0]], row[1:])
+
+        return packages
 
 
 class CachedErratumMapper:
@@ -796,7 +1016,9 @@ def get_channel_mapper():
     package_mapper = get_package_mapper()
     erratum_mapper = get_erratum_mapper(package_mapper)
     repomd_mapper = SqlRepoMDMapper()
-    channel_mapper = ChannelMapper(package_mapper, erratum_mapper, repomd_mapper)
+    channel_mapper = ChannelMapper(
+        package_mapper, erratum_mapper, repomd_mapper, BulkSqlPackageMapper()
+    )
 
     return channel_mapper
 
@@ -19,19 +19,12 @@
 
 import time
 
-try:
-    #  python 2
-    import StringIO
-except ImportError:
-    #  python3
-    import io as StringIO
 import shutil
 import os.path
 
+from io import BytesIO
 from gzip import GzipFile
-from gzip import write32u
 
-from uyuni.common.usix import LongType
 from uyuni.common import checksum
 from spacewalk.common import rhnCache
 from spacewalk.common.rhnLog import log_debug
@@ -45,6 +38,11 @@ from spacewalk.server import rhnChannel
 # One meg
 CHUNK_SIZE = 1048576
 
+# Directory below rhnCache.CACHEDIR holding the generated metadata files
+CACHE_DIR = "repomd"
+# Default size limit of the generated metadata files, in megabytes
+CACHE_MAX_SIZE = 2048
+
 comps_mapping = {
     "rhel-x86_64-client-5": "rhn/kickstart/ks-rhel-x86_64-client-5/Client/repodata/comps-rhel5-client-core.xml",
     "rhel-x86_64-client-vt-5": "rhn/kickstart/ks-rhel-x86_64-client-5/VT/repodata/comps-rhel5-vt.xml",
@@ -80,42 +78,30 @@ class Repository(object):
 
         self._channel = None
 
-        cache = rhnCache.Cache()
-        self.cache = rhnCache.NullCache(cache)
+        self.cache = get_metadata_cache()
 
     def get_primary_xml_file(self):
         """Return a file-like object of the primarl.xml for this channel."""
-        ret = self.get_primary_cache()
-
-        if not ret:
-            viewobj = self.get_primary_view()
-
-            self.generate_files([viewobj])
-            ret = self.get_primary_cache()
-
-        return ret
+        return self._get_xml_file(self.primary_prefix, self.get_primary_view)
 
     def get_other_xml_file(self):
         """Return a file-like object of the other.xml for this channel."""
-        ret = self.get_other_cache()
-
-        if not ret:
-            viewobj = self.get_other_view()
-
-            self.generate_files([viewobj])
-            ret = self.get_other_cache()
-
-        return ret
+        return self._get_xml_file(self.other_prefix, self.get_other_view)
 
     def get_filelists_xml_file(self):
         """Return a file-like object of the filelists.xml for this channel."""
-        ret = self.get_filelists_cache()
+        return self._get_xml_file(self.filelists_prefix, self.get_filelists_view)
 
-        if not ret:
-            viewobj = self.get_filelists_view()
+    def _get_xml_file(self, cache_prefix, view_method):
+        ret = self.get_cache_file(cache_prefix)
 
-            self.generate_files([viewobj])
-            ret = self.get_filelists_cache()
+        if not ret:
+            with self.generation_lock():
+                # Somebody else may have generated it while we were waiting
+                ret = self.get_cache_file(cache_prefix)
+                if not ret:
+                    self.generate_files([view_method()])
+                    ret = self.get_cache_file(cache_prefix)
 
         return ret
 
@@ -124,17 +110,29 @@ class Repository(object):
         ret = self.get_cache_file(self.updateinfo_prefix)
 
         if not ret:
-            viewobj = self.get_cache_view(self.updateinfo_prefix, view.UpdateinfoView)
-
-            viewobj.write_updateinfo()
-            viewobj.fileobj.close()
-            ret = self.get_cache_file(self.updateinfo_prefix)
+            with self.generation_lock():
+                ret = self.get_cache_file(self.updateinfo_prefix)
+                if not ret:
+                    viewobj = self.get_cache_view(
+                        self.updateinfo_prefix, view.UpdateinfoView
+                    )
+                    self._write_views([viewobj], viewobj.write_updateinfo)
+                    ret = self.get_cache_file(self.updateinfo_prefix)
 
         return ret
 
     def get_cache_entry_name(self, cache_prefix):
         # pylint: disable-next=consider-using-f-string
-        return "%s-%s" % (cache_prefix, self.channel_id)
+        return "%s/%s-%s" % (CACHE_DIR, cache_prefix, self.channel_id)
+
+    def generation_lock(self):
+        """
+        Return the lock to hold while generating metadata for this channel,
+        so that concurrent requests wait for one generation to finish rather
+        than all generating the same files.
+        """
+        # pylint: disable-next=consider-using-f-string
+        return self.cache.lock("%s/%s" % (CACHE_DIR, self.channel_id))
 
     def get_cache_file(self, cache_prefix):
         cache_entry = self.get_cache_entry_name(cache_prefix)
@@ -205,6 +203,9 @@ class Repository(object):
         return self.get_repomd_file(self.channel.modules, "get_modules_file")
 
     def generate_files(self, views):
+        self._write_views(views, self._write_packages, views)
+
+    def _write_packages(self, views):
         # pylint: disable-next=redefined-outer-name
         for view in views:
             view.write_start()
@@ -215,7 +216,24 @@ class Repository(object):
 
         for view in views:
             view.write_end()
-            view.fileobj.close()
+
+    # pylint: disable-next=redefined-outer-name
+    def _write_views(self, views, write_method, *args):
+        """
+        Call write_method and publish the files of views in the cache, or
+        throw them away if writing failed.
+        """
+        try:
+            write_method(*args)
+        # pylint: disable-next=bare-except
+        except:
+            for viewobj in views:
+                viewobj.fileobj.abort()
+            raise
+
+        for viewobj in views:
+            viewobj.fileobj.close()
+        evict_metadata_cache()
 
     def __get_channel(self):
         """Late binding for the channel."""
@@ -262,7 +280,7 @@ class CompressedRepository:
         return getattr(self.repository, x)
 
     def __get_compressed_file(self, uncompressed_file):
-        string_file = StringIO.StringIO()
+        string_file = BytesIO()
         gzip_file = NoTimeStampGzipFile(mode="wb", fileobj=string_file)
 
         shutil.copyfileobj(uncompressed_file, gzip_file)
@@ -281,8 +299,7 @@ class CachedRepository:
     def __init__(self, repository):
         self.repository = repository
 
-        cache = rhnCache.Cache()
-        self.cache = rhnCache.NullCache(cache)
+        self.cache = get_metadata_cache()
 
     def get_primary_xml_file(self):
         """Return the cached primary metadata file, if it exists."""
@@ -309,20 +326,31 @@ class CachedRepository:
         fallback_method is the method to call if the cached data doesn't exist
         or isn't new enough.
         """
-        # pylint: disable-next=consider-using-f-string
-        cache_entry = "%s-%s" % (cache_prefix, self.channel_id)
+        cache_entry = self.get_cache_entry_name(cache_prefix)
         ret = self.cache.get_file(cache_entry, self.last_modified)
         if ret:
             log_debug(4, "Scored cache hit", self.channel_id)
-        else:
+            return ret
+
+        with self.generation_lock():
+            ret = self.cache.get_file(cache_entry, self.last_modified)
+            if ret:
+                log_debug(4, "Scored cache hit after waiting", self.channel_id)
+                return ret
+
             ret = fallback_method()
             cache_file = self.cache.set_file(cache_entry, self.last_modified)
 
-            shutil.copyfileobj(ret, cache_file)
+            try:
+                shutil.copyfileobj(ret, cache_file)
+            # pylint: disable-next=bare-except
+            except:
+                cache_file.abort()
+                raise
 
-            # pylint: disable-next=pointless-statement
-            ret.close
+            ret.close()
             cache_file.close()
+            evict_metadata_cache()
             ret = self.cache.get_file(cache_entry, self.last_modified)
         return ret
 
@@ -348,87 +376,96 @@ class MetadataRepository:
     def get_repomd_file(self):
         """Return uncompressed repomd.xml file"""
 
-        # pylint: disable-next=consider-using-f-string
-        cache_entry = "%s-%s" % (self.repomd_prefix, self.channel_id)
+        cache_entry = self.get_cache_entry_name(self.repomd_prefix)
         ret = self.cache.get_file(cache_entry, self.last_modified)
 
         if not ret:
-            # We need the time in seconds since the epoch for the xml file.
-            timestamp = int(
-                time.mktime(time.strptime(self.last_modified, "%Y%m%d%H%M%S"))
-            )
+            with self.generation_lock():
+                ret = self.cache.get_file(cache_entry, self.last_modified)
+                if not ret:
+                    ret = self.__generate_repomd_file(cache_entry)
 
-            to_generate = []
+        return ret
 
-            if not self.repository.get_primary_cache():
-                to_generate.append(self.repository.get_primary_view())
-            if not self.repository.get_other_cache():
-                to_generate.append(self.repository.get_other_view())
-            if not self.repository.get_filelists_cache():
-                to_generate.append(self.repository.get_filelists_view())
+    def __generate_repomd_file(self, cache_entry):
+        # We need the time in seconds since the epoch for the xml file.
+        timestamp = int(time.mktime(time.strptime(self.last_modified, "%Y%m%d%H%M%S")))
 
-            self.repository.generate_files(to_generate)
+        to_generate = []
 
-            primary = self.__compute_checksums(
-                timestamp,
-                self.repository.get_primary_xml_file(),
-                self.compressed_repository.get_primary_xml_file(),
-            )
+        if not self.repository.get_primary_cache():
+            to_generate.append(self.repository.get_primary_view())
+        if not self.repository.get_other_cache():
+            to_generate.append(self.repository.get_other_view())
+        if not self.repository.get_filelists_cache():
+            to_generate.append(self.repository.get_filelists_view())
 
-            filelists = self.__compute_checksums(
-                timestamp,
-                self.repository.get_filelists_xml_file(),
-                self.compressed_repository.get_filelists_xml_file(),
-            )
+        self.repository.generate_files(to_generate)
 
-            other = self.__compute_checksums(
-                timestamp,
-                self.repository.get_other_xml_file(),
-                self.compressed_repository.get_other_xml_file(),
-            )
+        primary = self.__compute_checksums(
+            timestamp,
+            self.repository.get_primary_xml_file(),
+            self.compressed_repository.get_primary_xml_file(),
+        )
 
-            updateinfo = self.__compute_checksums(
-                timestamp,
-                self.repository.get_updateinfo_xml_file(),
-                self.compressed_repository.get_updateinfo_xml_file(),
-            )
+        filelists = self.__compute_checksums(
+            timestamp,
+            self.repository.get_filelists_xml_file(),
+            self.compressed_repository.get_filelists_xml_file(),
+        )
 
-            # Comps and modules might not exist on disc
-            comps = None
-            comps_file = None
-            modules = None
-            modules_file = None
-            try:
-                comps_file = self.repository.get_comps_file()
-            except IOError:
-                pass
-            try:
-                modules_file = self.repository.get_modules_file()
-            except IOError:
-                pass
-            if comps_file:
-                comps = self.__compute_open_checksum(timestamp, comps_file)
-            if modules_file:
-                # pylint: disable-next=no-value-for-parameter
-                modules = self.__compute_checksums(timestamp, modules_file)
-
-            ret = self.cache.set_file(cache_entry, self.last_modified)
-            repomd_view = view.RepoView(
-                primary,
-                filelists,
-                other,
-                updateinfo,
-                comps,
-                modules,
-                ret,
-                self.__get_checksumtype(),
-            )
+        other = self.__compute_checksums(
+            timestamp,
+            self.repository.get_other_xml_file(),
+            self.compressed_repository.get_other_xml_file(),
+        )
 
-            repomd_view.write_repomd()
-            ret.close()
-            ret = self.cache.get_file(cache_entry, self.last_modified)
+        updateinfo = self.__compute_checksums(
+            timestamp,
+            self.repository.get_updateinfo_xml_file(),
+            self.compressed_repository.get_updateinfo_xml_file(),
+        )
 
-        return ret
+        # Comps and modules might not exist on disc
+        comps = None
+        comps_file = None
+        modules = None
+        modules_file = None
+        try:
+            comps_file = self.repository.get_comps_file()
+        except IOError:
+            pass
+        try:
+            modules_file = self.repository.get_modules_file()
+        except IOError:
+            pass
+        if comps_file:
+            comps = self.__compute_open_checksum(timestamp, comps_file)
+        if modules_file:
+            # pylint: disable-next=no-value-for-parameter
+            modules = self.__compute_checksums(timestamp, modules_file)
+
+        cache_file = self.cache.set_file(cache_entry, self.last_modified)
+        repomd_view = view.RepoView(
+            primary,
+            filelists,
+            other,
+            updateinfo,
+            comps,
+            modules,
+            cache_file,
+            self.__get_checksumtype(),
+        )
+
+        try:
+            repomd_view.write_repomd()
+        # pylint: disable-next=bare-except
+        except:
+            cache_file.abort()
+            raise
+        cache_file.close()
+        evict_metadata_cache()
+        return self.cache.get_file(cache_entry, self.last_modified)
 
     def __get_file_checksum(self, xml_file):
         hash_computer = checksum.getHashlibInstance(self.__get_checksumtype(), False)
@@ -462,6 +499,19 @@ class MetadataRepository:
         return getattr(self.compressed_repository, x)
 
 
+def get_metadata_cache():
+    """Return the cache used for the generated metadata files."""
+    return rhnCache.NullCache(rhnCache.AtomicCache())
+
+
+def evict_metadata_cache():
+    """Keep the generated metadata files below the configured size."""
+    max_size = int(CFG.get("repomd_cache_max_size", CACHE_MAX_SIZE))
+    evicted = rhnCache.evict(CACHE_DIR, max_size * 1024 * 1024)
+    if evicted:
+        log_debug(3, "Evicted metadata cache files", evicted)
+
+
 def get_repository(channel):
     """Factory Method-ish function to create a repository from a channel."""
     repository = Repository(channel)
@@ -475,11 +525,8 @@ def get_repository(channel):
 
 
 class NoTimeStampGzipFile(GzipFile):
-    def _write_gzip_header(self):
-        self.fileobj.write("\037\213")
-        self.fileobj.write("\010")
-        # no flags
-        self.fileobj.write("\x00")
-        write32u(self.fileobj, LongType(0))
-        self.fileobj.write("\002")
-        self.fileobj.write("\377")
+    """GzipFile writing a zero timestamp, so the output only depends on the input."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs["mtime"] = 0
+        GzipFile.__init__(self, *args, **kwargs)
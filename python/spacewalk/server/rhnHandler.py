@@ -15,7 +15,7 @@
 #
 #
 
-from spacewalk.common.rhnLog import log_debug, log_error
+from spacewalk.common.rhnLog import log_debug, log_error, log_setsession
 from spacewalk.common.rhnConfig import CFG
 from spacewalk.common.rhnException import rhnFault
 from spacewalk.common.rhnTranslate import _
@@ -62,6 +62,7 @@ class rhnHandler(RPC_Base):
             raise rhnFault(9, _("Please run rhn_register as root on this client"))
         self.server_id = server.getid()
         self.server = server
+        log_setsession(self.server_id)
         # update the latest checkin time
         if self.update_checkin:
             server.checkin()
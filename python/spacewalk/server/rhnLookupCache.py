@@ -0,0 +1,327 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Process wide cache of the ids of lookup table rows: package names, EVRs,
+# arches, checksum types and checksums.
+#
+# These rows are added, but neither changed nor deleted, so an id stays
+# valid once it is known. The lookup_* functions resolve a whole set of keys
+# with a single query for the keys which are not cached yet. Keys without a
+# row (unknown arches or checksum types) are not cached. Ids of rows which
+# the running transaction may have created are only shared with the rest of
+# the process once it is committed.
+#
+
+import threading
+from collections import OrderedDict
+
+from spacewalk.common.rhnConfig import CFG
+from spacewalk.server import rhnSQL
+
+# Ids kept per lookup table, see the lookup_cache_size option
+DEFAULT_SIZE = 100000
+# Keys resolved per statement
+PAGE_SIZE = 10000
+
+
+def _max_size():
+    if CFG.is_initialized():
+        return int(CFG.get("lookup_cache_size", DEFAULT_SIZE))
+    return DEFAULT_SIZE
+
+
+class LookupCache:
+    """
+    Ids of up to lookup_cache_size keys of a lookup table, least recently
+    used first out.
+
+    Ids found during a transaction are pending until it ends: they may
+    belong to rows added by it, which a rollback removes again.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, keys):
+        """Returns the known ids of keys, as a dict."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                else:
+                    value = self._pending.get(key)
+                if value is None:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                found[key] = value
+        return found
+
+    def add(self, values):
+        """Adds the ids (a dict of keys to ids) found in this transaction."""
+        with self._lock:
+            for key, value in values.items():
+                if value is not None and key not in self._entries:
+                    self._pending[key] = value
+            self._trim(self._pending)
+
+    def transaction_done(self, committed):
+        """See rhnSQL.add_transaction_hook()."""
+        with self._lock:
+            if committed:
+                self._entries.update(self._pending)
+                self._trim(self._entries)
+            elif committed is None:
+                self._entries.clear()
+            self._pending.clear()
+
+    def invalidate(self, keys=None):
+        """Forgets the ids of keys, of all keys by default."""
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+                self._pending.clear()
+                return
+            for key in keys:
+                self._entries.pop(key, None)
+                self._pending.pop(key, None)
+
+    @staticmethod
+    def _trim(entries):
+        max_size = _max_size()
+        while len(entries) > max_size:
+            entries.popitem(last=False)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name):
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = LookupCache(name)
+        return _caches[name]
+
+
+def _transaction_done(committed):
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.transaction_done(committed)
+
+
+rhnSQL.add_transaction_hook(_transaction_done)
+
+
+def invalidate(name=None, keys=None):
+    """Forgets the cached ids of keys of a lookup table (of all of them)."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        if name is None or cache.name == name:
+            cache.invalidate(keys)
+
+
+def stats():
+    """Returns the size and hit/miss counters of every cache."""
+    with _caches_lock:
+        return {
+            name: {"entries": len(cache), "hits": cache.hits, "misses": cache.misses}
+            for name, cache in _caches.items()
+        }
+
+
+def _sort_key(key):
+    # the same order in every process, so concurrent inserts do not deadlock
+    return tuple("" if value is None else str(value) for value in key)
+
+
+def _resolve(name, keys, normalize, query):
+    """
+    Returns the ids of keys as a dict; keys without a row are left out.
+
+    normalize turns a key into the tuple of values the lookup table is
+    queried with (and the cache is keyed on). query(values) gets a list of
+    those tuples, prefixed with their index in the list, and returns
+    (index, id) rows.
+    """
+    cache = get_cache(name)
+    wanted = {}
+    for key in keys:
+        wanted.setdefault(normalize(key), []).append(key)
+    ids = cache.get_many(wanted)
+
+    missing = sorted((k for k in wanted if k not in ids), key=_sort_key)
+    if missing:
+        found = {}
+        for row in query([(i,) + key for i, key in enumerate(missing)]):
+            if row[1] is not None:
+                found[missing[row[0]]] = int(row[1])
+        cache.add(found)
+        ids.update(found)
+
+    return {
+        key: ids[normalized]
+        for normalized, originals in wanted.items()
+        if normalized in ids
+        for key in originals
+    }
+
+
+def _select(sql):
+    def query(values):
+        h = rhnSQL.prepare(sql)
+        return h.execute_values(sql, values, page_size=PAGE_SIZE)
+
+    return query
+
+
+def lookup_package_names(names):
+    """Returns the ids of the package names, adding the unknown ones."""
+    return _resolve(
+        "rhnPackageName",
+        names,
+        lambda name: (name,),
+        _select(
+            """
+            SELECT wanted.ordering, LOOKUP_PACKAGE_NAME(wanted.name)
+              FROM (VALUES %s) AS wanted (ordering, name)
+            """
+        ),
+    )
+
+
+def _normalize_evr(evr):
+    epoch, version, release = evr
+    if epoch == "" or epoch is None:
+        epoch = None
+    else:
+        epoch = str(epoch)
+    return (epoch, version, release)
+
+
+def lookup_evrs(evrs, evr_type="rpm"):
+    """
+    Returns the ids of the (epoch, version, release) tuples of evr_type
+    ('rpm' or 'deb'), adding the unknown ones.
+    """
+    select = _select(
+        """
+        SELECT wanted.ordering,
+               LOOKUP_EVR(wanted.epoch, wanted.version, wanted.release, wanted.type)
+          FROM (VALUES %s) AS wanted (ordering, epoch, version, release, type)
+        """
+    )
+    return _resolve(
+        "rhnPackageEVR." + evr_type,
+        evrs,
+        _normalize_evr,
+        lambda values: select([value + (evr_type,) for value in values]),
+    )
+
+
+def lookup_labels(table, labels, names=None):
+    """
+    Returns the ids of the rows of table (rhnPackageArch, rhnChecksumType,
+    ...) with the labels, unknown labels are left out. With names, a dict
+    of labels to names, only the rows having that name as well are found.
+    """
+    if names is None:
+        return _resolve(
+            table,
+            labels,
+            lambda label: (str(label),),
+            _select(
+                # pylint: disable-next=consider-using-f-string
+                """
+                SELECT wanted.ordering, t.id
+                  FROM (VALUES %%s) AS wanted (ordering, label)
+                  JOIN %s t ON t.label = wanted.label
+                """
+                % table
+            ),
+        )
+    return _resolve(
+        table + ".name",
+        labels,
+        lambda label: (str(label), names[label]),
+        _select(
+            # pylint: disable-next=consider-using-f-string
+            """
+            SELECT wanted.ordering, t.id
+              FROM (VALUES %%s) AS wanted (ordering, label, name)
+              JOIN %s t ON t.label = wanted.label AND t.name = wanted.name
+            """
+            % table
+        ),
+    )
+
+
+def _query_checksums(values):
+    sql = """
+        WITH wanted (ordering, checksum_type, checksum) AS (
+          VALUES %s
+        ),
+        missing AS (
+          SELECT nextval('rhnchecksum_seq') AS id, rhnChecksumType.id AS checksum_type_id, wanted.*
+            FROM wanted
+              JOIN rhnChecksumType ON wanted.checksum_type = rhnChecksumType.label
+              LEFT JOIN rhnChecksum
+                ON rhnChecksum.checksum_type_id = rhnChecksumType.id
+                  AND rhnChecksum.checksum = wanted.checksum
+            WHERE rhnChecksum.id IS NULL
+        )
+        INSERT INTO rhnChecksum(id, checksum_type_id, checksum)
+          SELECT id, checksum_type_id, checksum
+            FROM missing
+            ORDER BY ordering
+          ON CONFLICT DO NOTHING
+    """
+    h = rhnSQL.prepare(sql)
+    h.execute_values(sql, values, fetch=False, page_size=PAGE_SIZE)
+
+    return _select(
+        """
+        WITH wanted (ordering, checksum_type, checksum) AS (
+            VALUES %s
+          )
+          SELECT wanted.ordering, rhnChecksum.id
+            FROM wanted
+              JOIN rhnChecksumType ON wanted.checksum_type = rhnChecksumType.label
+              JOIN rhnChecksum
+                ON rhnChecksum.checksum_type_id = rhnChecksumType.id
+                  AND rhnChecksum.checksum = wanted.checksum
+        """
+    )(values)
+
+
+def lookup_checksums(checksums):
+    """
+    Returns the ids of the (checksum type, checksum) tuples, adding the
+    unknown ones. Empty checksums and unknown checksum types are left out.
+    """
+    return _resolve(
+        "rhnChecksum",
+        [key for key in checksums if key[1]],
+        tuple,
+        _query_checksums,
+    )
@@ -288,6 +288,90 @@ def get_info_for_package(pkg, channel_id, org_id):
     return ret
 
 
+def package_info_key(name, version, release, epoch, arch):
+    """
+    Key of get_info_for_packages() results for a package.
+
+    yum repos have epoch="0" when the epoch is "0" but also when it is NULL,
+    so both are normalized to an empty string.
+    """
+    epoch = str(epoch) if epoch is not None else ""
+    if epoch == "0":
+        epoch = ""
+    return (str(name), str(version), str(release), epoch, str(arch))
+
+
+def get_info_for_packages(pkgs, channel_id, org_id, page_size=1000):
+    """
+    Bulk version of get_info_for_package.
+
+    pkgs is an iterable of [name, version, release, epoch, arch] lists.
+    Returns a dict mapping package_info_key() of each package found in the
+    database to the list get_info_for_package would have returned for it.
+    """
+    wanted = {package_info_key(*pkg) for pkg in pkgs}
+    if not wanted:
+        return {}
+    log_debug(3, len(wanted), channel_id, org_id)
+
+    if org_id:
+        # pylint: disable-next=consider-using-f-string
+        orgStatement = "p.org_id = %d" % int(org_id)
+    else:
+        orgStatement = "p.org_id is null"
+
+    # pylint: disable-next=consider-using-f-string
+    statement = """
+    with wanted (name, version, release, epoch, arch) as (
+      values %%s
+    )
+    select wanted.name, wanted.version, wanted.release, wanted.epoch, wanted.arch,
+           p.path, cp.channel_id,
+           cv.checksum_type, cv.checksum, p.org_id, pe.epoch
+      from wanted
+      join rhnPackageName pn
+        on pn.name = wanted.name
+      join rhnPackage p
+        on p.name_id = pn.id
+      join rhnPackageEVR pe
+        on p.evr_id = pe.id
+       and pe.version = wanted.version
+       and pe.release = wanted.release
+       and coalesce(pe.epoch, '0') = coalesce(nullif(wanted.epoch, ''), '0')
+      join rhnPackageArch pa
+        on p.package_arch_id = pa.id
+       and pa.label = wanted.arch
+      left join rhnChannelPackage cp
+        on p.id = cp.package_id
+       and cp.channel_id = %d
+      join rhnChecksumView cv
+        on p.checksum_id = cv.id
+     where %s
+     order by cp.channel_id nulls last,
+              p.id desc
+    """ % (
+        int(channel_id),
+        orgStatement,
+    )
+
+    h = rhnSQL.prepare(statement)
+    rows = h.execute_values(statement, sorted(wanted), page_size=page_size) or []
+
+    ret = {}
+    for row in rows:
+        ret.setdefault(tuple(row[:5]), []).append(
+            {
+                "path": row[5],
+                "channel_id": row[6],
+                "checksum_type": row[7],
+                "checksum": row[8],
+                "org_id": _none2emptyString(row[9]),
+                "epoch": row[10],
+            }
+        )
+    return ret
+
+
 def _none2emptyString(foo):
     if foo is None:
         return ""
@@ -51,6 +51,26 @@ from .sql_base import (
 # instantiated by the initDB call. This object/instance should NEVER,
 # EVER be exposed to the calling applications.
 
+# Callables told about the end of every transaction, see
+# add_transaction_hook()
+_transaction_hooks = []
+
+
+def add_transaction_hook(hook):
+    """
+    Call hook(True) after every commit and hook(False) after every rollback
+    (including the rollback to a savepoint, the commit of a failed
+    transaction and closing without committing) of this process. hook(None)
+    tells that the process connected to another database.
+    """
+    if hook not in _transaction_hooks:
+        _transaction_hooks.append(hook)
+
+
+def _run_transaction_hooks(committed):
+    for hook in _transaction_hooks:
+        hook(committed)
+
 
 def __init__DB(backend, host, port, username, password, database, sslmode, sslrootcert):
     """
@@ -77,13 +97,16 @@ def __init__DB(backend, host, port, username, password, database, sslmode, sslro
         __DB.check_connection()
         return
 
+    committed = not __DB.transaction_failed()
     __DB.commit()
     __DB.close()
+    _run_transaction_hooks(committed)
     # now we have to get a different connection
     __DB = dbi.get_database_class(backend=backend)(
         host, port, username, password, database, sslmode, sslrootcert
     )
     __DB.connect()
+    _run_transaction_hooks(None)
     return 0
 
 
@@ -181,11 +204,15 @@ def closeDB(committing=True, closing=True):
         return
     else:
         del my_db
+    committed = False
     if committing:
+        # committing a failed transaction rolls it back
+        committed = not __DB.transaction_failed()
         __DB.commit()
     if closing:
         __DB.close()
     del __DB
+    _run_transaction_hooks(committed)
     return
 
 
@@ -248,6 +275,13 @@ def prepare(sql, blob_map=None):
     return db.prepare(sql, blob_map=blob_map)
 
 
+def prepare_stream(sql, batch_size=None):
+    db = __test_DB()
+    if isinstance(sql, Statement):
+        sql = sql.statement
+    return db.prepare_stream(sql, batch_size=batch_size)
+
+
 def execute(sql, *args, **kwargs):
     db = __test_DB()
     return db.execute(sql, *args, **kwargs)
@@ -265,14 +299,32 @@ def fetchone_dict(sql, *args, **kwargs):
     return h.fetchone_dict()
 
 
+def fetchiter_dict(sql, *args, **kwargs):
+    """Iterate over the rows of a query using a server side cursor."""
+    h = prepare_stream(sql)
+    h.execute(*args, **kwargs)
+    return h.fetchiter_dict()
+
+
+def statement_stats():
+    """Return the hit/miss counters of the statement caches of this process."""
+    db = __test_DB()
+    return db.statement_stats()
+
+
 def commit():
     db = __test_DB()
-    return db.commit()
+    committed = not db.transaction_failed()
+    ret = db.commit()
+    _run_transaction_hooks(committed)
+    return ret
 
 
 def rollback(name=None):
     db = __test_DB()
-    return db.rollback(name)
+    ret = db.rollback(name)
+    _run_transaction_hooks(False)
+    return ret
 
 
 def transaction(name):
@@ -23,6 +23,8 @@ import sys
 # pylint: disable-next=unused-import
 import string
 import re
+import functools
+import itertools
 import psycopg2
 import psycopg2.extras
 
@@ -49,10 +51,68 @@ from spacewalk.common.rhnLog import log_debug, log_error
 # pylint: disable-next=wrong-import-position
 from spacewalk.common.rhnException import rhnException
 
+# pylint: disable-next=wrong-import-position
+from spacewalk.common.rhnConfig import CFG
+
 # pylint: disable-next=wrong-import-position
 from .const import POSTGRESQL
 
 
+# Number of converted queries kept by convert_named_query_params
+QUERY_CACHE_SIZE = 2048
+
+# Statement counters, see statement_stats()
+_stats = {
+    "prepared": 0,
+    "prepared_executions": 0,
+    "prepare_failures": 0,
+}
+
+
+# Size of the chunks the rows of copy_from() are sent to the server in
+COPY_BUFFER_SIZE = 64 * 1024
+
+# Escapes of the COPY text format
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # bytea hex format, with the backslash escaped for COPY
+        return "\\\\x" + bytes(value).hex()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+class CopyStream:
+    """
+    File like object serving rows in the COPY text format, built while
+    psycopg2 reads them so the rows never have to be held in memory
+    as a whole.
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ""
+        self.count = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += "\t".join(_copy_value(v) for v in row) + "\n"
+            self.count += 1
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
 def convert_named_query_params(query):
     """
     Convert a query with named parameters (i.e. :id, :name, etc) into one
@@ -60,7 +120,8 @@ def convert_named_query_params(query):
 
     python-psycopg2 requires parameters to be in this form, so to keep our
     existing queries intact we'll convert them when provided to the
-    postgresql driver.
+    postgresql driver. Conversions are cached, as the same queries get
+    prepared over and over.
 
     RETURNS: the new query with parameters replaced
     """
@@ -72,6 +133,119 @@ def convert_named_query_params(query):
     return new_query
 
 
+def to_positional_query_params(query):
+    """
+    Convert a query with %(name)s parameters, as returned by
+    convert_named_query_params, into one using $1, $2, etc, as needed by
+    PREPARE.
+
+    RETURNS: the new query and the list of parameter names, in order
+    """
+    names = []
+
+    def repl(match):
+        if match.group(0) == "%%":
+            return "%"
+        name = match.group(1).lower()
+        if name not in names:
+            names.append(name)
+        # pylint: disable-next=consider-using-f-string
+        return "$%d" % (names.index(name) + 1)
+
+    return re.sub(r"%\((\w+)\)s|%%", repl, query), names
+
+
+def statement_stats():
+    """Return the statement caching counters of this process."""
+    # pylint: disable-next=no-value-for-parameter
+    info = convert_named_query_params.cache_info()
+    stats = dict(_stats)
+    stats["converted_hits"] = info.hits
+    stats["converted_misses"] = info.misses
+    stats["converted_size"] = info.currsize
+    return stats
+
+
+def _get_prepare_threshold():
+    """
+    Number of executions after which a statement is prepared on the server,
+    from the db_prepare_threshold option. 0 (the default) disables it.
+    """
+    try:
+        if CFG.is_initialized():
+            return int(CFG.get("db_prepare_threshold", 0) or 0)
+    except (KeyError, ValueError):
+        pass
+    return 0
+
+
+class PreparedStatements:
+
+    """
+    Server-side prepared statements of one connection.
+
+    Statements executed more than threshold times are PREPAREd and run via
+    EXECUTE from then on. Statements the server cannot prepare (e.g. when
+    parameter types cannot be inferred) keep being executed directly.
+    """
+
+    # Statements worth preparing
+    _preparable = re.compile(r"^\s*(select|insert|update|delete|with)\b", re.I)
+
+    def __init__(self, dbh, threshold):
+        self.dbh = dbh
+        self.threshold = threshold
+        # sql -> number of executions
+        self.counts = {}
+        # sql -> (EXECUTE statement) or None if it can not be prepared
+        self.statements = {}
+
+    def get(self, sql):
+        """Return the EXECUTE statement to use for sql, or None."""
+        if sql in self.statements:
+            return self.statements[sql]
+
+        if len(self.counts) > QUERY_CACHE_SIZE:
+            # Do not let one-off statements pile up
+            self.counts.clear()
+        count = self.counts.get(sql, 0) + 1
+        self.counts[sql] = count
+        if count <= self.threshold:
+            return None
+
+        del self.counts[sql]
+        self.statements[sql] = self._prepare(sql)
+        return self.statements[sql]
+
+    def _prepare(self, sql):
+        if not self._preparable.match(sql):
+            return None
+
+        # pylint: disable-next=consider-using-f-string
+        name = "rhn_stmt_%d" % len(self.statements)
+        query, names = to_positional_query_params(sql)
+        cursor = self.dbh.cursor()
+        cursor.execute("SAVEPOINT rhn_prepare")
+        try:
+            # pylint: disable-next=consider-using-f-string
+            cursor.execute("PREPARE %s AS %s" % (name, query))
+        except psycopg2.Error:
+            cursor.execute("ROLLBACK TO SAVEPOINT rhn_prepare")
+            _stats["prepare_failures"] += 1
+            log_debug(4, "Cannot prepare statement", sql)
+            return None
+        finally:
+            cursor.execute("RELEASE SAVEPOINT rhn_prepare")
+            cursor.close()
+
+        _stats["prepared"] += 1
+        if not names:
+            # pylint: disable-next=consider-using-f-string
+            return "EXECUTE %s" % name
+        # pylint: disable-next=consider-using-f-string
+        return "EXECUTE %s (%s)" % (name, ", ".join("%%(%s)s" % n for n in names))
+
+
 class Function(sql_base.Procedure):
 
     """
@@ -195,6 +369,7 @@ class Database(sql_base.Database):
             self.port = -1
 
         self.dbh = None
+        self.prepared_statements = None
 
         sql_base.Database.__init__(self)
 
@@ -241,6 +416,12 @@ class Database(sql_base.Database):
                 decimal2intfloat,
             )
             psycopg2.extensions.register_type(DEC2INTFLOAT)
+
+            threshold = _get_prepare_threshold()
+            if threshold > 0:
+                self.prepared_statements = PreparedStatements(self.dbh, threshold)
+            else:
+                self.prepared_statements = None
         except psycopg2.Error:
             e = sys.exc_info()[1]
             if reconnect > 0:
@@ -290,9 +471,21 @@ class Database(sql_base.Database):
                 "Exception information: %s" % sys.exc_info()[1],
             )
             self.connect()  # only allow one try
+            # whatever the lost connection did is gone
+            # pylint: disable-next=protected-access
+            rhnSQL._run_transaction_hooks(False)
 
     def prepare(self, sql, force=0, blob_map=None):
-        return Cursor(dbh=self.dbh, sql=sql, force=force, blob_map=blob_map)
+        return Cursor(
+            dbh=self.dbh,
+            sql=sql,
+            force=force,
+            blob_map=blob_map,
+            prepared_statements=self.prepared_statements,
+        )
+
+    def prepare_stream(self, sql, batch_size=None):
+        return StreamCursor(dbh=self.dbh, sql=sql, batch_size=batch_size)
 
     def execute(self, sql, *args, **kwargs):
         cursor = self.prepare(sql)
@@ -310,6 +503,13 @@ class Database(sql_base.Database):
         if self.dbh is not None:
             self.dbh.commit()
 
+    def transaction_failed(self):
+        return (
+            self.dbh is not None
+            and self.dbh.get_transaction_status()
+            == psycopg2.extensions.TRANSACTION_STATUS_INERROR
+        )
+
     def rollback(self, name=None):
         if name:
             # pylint: disable-next=consider-using-f-string
@@ -333,14 +533,20 @@ class Database(sql_base.Database):
     def _read_lob(self, lob):
         return bytes(lob)
 
+    def statement_stats(self):
+        return statement_stats()
+
 
 class Cursor(sql_base.Cursor):
 
     """PostgreSQL specific wrapper over sql_base.Cursor."""
 
-    def __init__(self, dbh=None, sql=None, force=None, blob_map=None):
+    def __init__(
+        self, dbh=None, sql=None, force=None, blob_map=None, prepared_statements=None
+    ):
         sql_base.Cursor.__init__(self, dbh, sql, force)
         self.blob_map = blob_map
+        self.prepared_statements = prepared_statements
 
         # Accept Oracle style named query params, but convert for python-pgsql
         # under the hood:
@@ -395,8 +601,13 @@ class Cursor(sql_base.Cursor):
         PostgreSQL specific execution of the query.
         """
         params = UserDictCase(kwargs)
+        sql = self.sql
+        if self.prepared_statements is not None and not self.blob_map:
+            sql = self.prepared_statements.get(self.sql) or self.sql
+            if sql is not self.sql:
+                _stats["prepared_executions"] += 1
         try:
-            self._real_cursor.execute(self.sql, params)
+            self._real_cursor.execute(sql, params)
         except psycopg2.OperationalError:
             e = sys.exc_info()[1]
             # pylint: disable-next=raise-missing-from,consider-using-f-string
@@ -439,6 +650,17 @@ class Cursor(sql_base.Cursor):
         self.description = self._real_cursor.description
         return results
 
+    def _copy_from(self, rows):
+        stream = CopyStream(rows)
+        try:
+            self._real_cursor.copy_expert(self.sql, stream, size=COPY_BUFFER_SIZE)
+        except psycopg2.OperationalError:
+            e = sys.exc_info()[1]
+            # pylint: disable-next=raise-missing-from,consider-using-f-string
+            raise sql_base.SQLError("Cannot execute SQL statement: %s" % str(e))
+        self.description = None
+        return stream.count
+
     def update_blob(self, table_name, column_name, where_clause, data, **kwargs):
         """
         PostgreSQL uses bytea columns instead of blobs. Nothing special
@@ -458,3 +680,103 @@ class Cursor(sql_base.Cursor):
 
     def close(self):
         pass
+
+
+class StreamCursor(Cursor):
+
+    """
+    Server side (named) cursor: PostgreSQL keeps the result set and hands it
+    out batch_size rows at a time, so large result sets can be iterated
+    without holding them in memory.
+
+    The cursor lives until the end of the transaction, do not commit while
+    iterating over it.
+    """
+
+    _names = itertools.count(1)
+
+    def __init__(self, dbh=None, sql=None, batch_size=None):
+        self.batch_size = batch_size or sql_base.STREAM_BATCH_SIZE
+        self._rows = iter(())
+        Cursor.__init__(self, dbh, sql)
+
+    # Named cursors only get the description after the first fetch
+    @property
+    def description(self):
+        if self._real_cursor is None:
+            return None
+        return self._real_cursor.description
+
+    @description.setter
+    def description(self, value):
+        pass
+
+    def _prepare(self, force=None):
+        # A named cursor can be executed only once: it is created by every
+        # execute() and never stored in the cursor cache
+        return None
+
+    def _prepare_sql(self):
+        # pylint: disable-next=consider-using-f-string
+        cursor = self.dbh.cursor(name="rhn_stream_%d" % next(self._names))
+        cursor.itersize = self.batch_size
+        return cursor
+
+    def _execute_(self, args, kwargs):
+        self.close()
+        self._real_cursor = self._prepare_sql()
+        params = UserDictCase(kwargs)
+        try:
+            self._real_cursor.execute(self.sql, params)
+        except psycopg2.OperationalError:
+            e = sys.exc_info()[1]
+            # pylint: disable-next=raise-missing-from,consider-using-f-string
+            raise sql_base.SQLError("Cannot execute SQL statement: %s" % str(e))
+        self._rows = iter(self._real_cursor)
+        return self._real_cursor.rowcount
+
+    def _executemany(self, *args, **kwargs):
+        raise rhnException("executemany() is not supported by streaming cursors")
+
+    def _execute_values(self, sql, argslist, template=None, page_size=1000, fetch=True):
+        raise rhnException("execute_values() is not supported by streaming cursors")
+
+    def _copy_from(self, rows):
+        raise rhnException("copy_from() is not supported by streaming cursors")
+
+    # Iterating over a named cursor fetches itersize rows per round trip,
+    # while its fetchone() would issue a FETCH for every single row
+    def fetchone(self):
+        row = next(self._rows, None)
+        if row is None:
+            self.close()
+        return row
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchone_dict(self):
+        row = self.fetchone()
+        if row is None:
+            return None
+        return sql_base.ociDict(self.description, row)
+
+    def fetchall_dict(self):
+        ret = list(self.fetchiter_dict())
+        if not ret:
+            return None
+        return ret
+
+    def fetchiter_dict(self, batch_size=None):
+        if batch_size and self._real_cursor is not None:
+            self._real_cursor.itersize = batch_size
+        try:
+            for x in self._rows:
+                yield sql_base.ociDict(self.description, x)
+        finally:
+            self.close()
+
+    def close(self):
+        self._rows = iter(())
+        if self._real_cursor is not None and not self._real_cursor.closed:
+            self._real_cursor.close()
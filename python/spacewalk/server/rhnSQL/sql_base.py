@@ -28,6 +28,9 @@ import sys
 from . import sql_types
 from uyuni.common import usix
 
+# Default number of rows transferred per round trip by fetchiter_dict()
+STREAM_BATCH_SIZE = 1000
+
 
 # pylint: disable-next=invalid-name
 def ociDict(names=None, row=None):
@@ -169,6 +172,15 @@ class Cursor:
             self._execute_values, sql, argslist, template, page_size, fetch
         )
 
+    def copy_from(self, rows):
+        """
+        Bulk load rows with the prepared COPY ... FROM STDIN statement.
+
+        rows is an iterable of sequences of column values, in the order of
+        the column list of the statement. It is consumed while loading.
+        """
+        return self._execute_wrapper(self._copy_from, rows)
+
     def _execute_wrapper(self, function, *p, **kw):
         """
         Database specific execute wrapper. Mostly used just to catch DB
@@ -191,6 +203,9 @@ class Cursor:
     def _execute_values(self, *args, **kwargs):
         raise NotImplementedError()
 
+    def _copy_from(self, rows):
+        raise NotImplementedError()
+
     def _execute_(self, args, kwargs):
         """Database specific execution of the query."""
         raise NotImplementedError()
@@ -233,6 +248,21 @@ class Cursor:
             return None
         return ret
 
+    def fetchiter_dict(self, batch_size=None):
+        """
+        Iterate over the rows as dictionaries, fetching them batch_size
+        rows at a time instead of building the whole result list.
+        """
+        batch_size = batch_size or STREAM_BATCH_SIZE
+        while 1:
+            rows = self._real_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for x in rows:
+                d = ociDict(self.description, x)
+                if len(d) > 0:
+                    yield d
+
     def _is_sequence_type(self, val):
         if type(val) in (usix.ListType, usix.TupleType):
             return 1
@@ -289,10 +319,25 @@ class Database:
         """Prepare an SQL statement."""
         raise NotImplementedError()
 
+    def prepare_stream(self, sql, batch_size=None):
+        """
+        Prepare an SQL statement whose result set is meant to be iterated
+        with fetchiter_dict(). Drivers supporting server side cursors keep
+        the rows in the database until they are fetched.
+        """
+        return self.prepare(sql)
+
     def commit(self):
         """Commit changes"""
         raise NotImplementedError()
 
+    def transaction_failed(self):
+        """
+        True if a statement of the running transaction failed, so that
+        committing it rolls it back instead.
+        """
+        return False
+
     def procedure(self, name):
         """Return a pointer to a callable instance for a given stored
         procedure.
@@ -345,6 +390,10 @@ class Database:
         "Reads a lob's contents"
         return None
 
+    def statement_stats(self):
+        "Returns a dictionary of statement caching counters"
+        return {}
+
     def is_connected_to(
         self, backend, host, port, username, password, database, sslmode
     ):
@@ -24,7 +24,7 @@ from uyuni.common.usix import DictType, raise_with_tb
 from uyuni.common import rhn_rpm
 from spacewalk.common.rhnLog import log_debug
 from spacewalk.common.rhnException import rhnFault
-from spacewalk.server import rhnSQL, rhnAction
+from spacewalk.server import rhnSQL, rhnAction, rhnLookupCache
 from .server_lib import snapshot_server, check_entitlement
 
 UNCHANGED = 0
@@ -259,27 +259,31 @@ class Packages:
                 """
             insert into rhnServerPackage
             (server_id, name_id, evr_id, package_arch_id, installtime)
-            values (:sysid, LOOKUP_PACKAGE_NAME(:n), LOOKUP_EVR(:e, :v, :r, :t),
-                LOOKUP_PACKAGE_ARCH(:a), TO_TIMESTAMP(:instime, 'YYYY-MM-DD HH24:MI:SS')
+            values (:sysid, :name_id, :evr_id, :package_arch_id,
+                TO_TIMESTAMP(:instime, 'YYYY-MM-DD HH24:MI:SS')
             )
             """
             )
-            # some fields are not allowed to contain empty string (varchar)
-
-            def lambdaae(a):
-                if a.e == "":
-                    return None
-                else:
-                    return a.e
+            # The ids of all names, EVRs and arches, a query for each at most
+            name_ids = rhnLookupCache.lookup_package_names(a.n for a in alist)
+            evr_ids = {}
+            for package_type in set(a.t for a in alist):
+                evrs = [(a.e, a.v, a.r) for a in alist if a.t == package_type]
+                found = rhnLookupCache.lookup_evrs(evrs, package_type)
+                for evr, evr_id in found.items():
+                    evr_ids[(package_type,) + evr] = evr_id
+            arch_ids = rhnLookupCache.lookup_labels(
+                "rhnPackageArch", set(a.a for a in alist)
+            )
+            if any(a.a not in arch_ids for a in alist):
+                log_debug(2, "Unknown package arch found")
+                raise rhnFault(45, "Unknown package arch found")
 
             package_data = {
                 "sysid": [sysid] * len(alist),
-                "n": [a.n for a in alist],
-                "v": [a.v for a in alist],
-                "r": [a.r for a in alist],
-                "e": list(map(lambdaae, alist)),
-                "a": [a.a for a in alist],
-                "t": [a.t for a in alist],
+                "name_id": [name_ids[a.n] for a in alist],
+                "evr_id": [evr_ids[(a.t, a.e, a.v, a.r)] for a in alist],
+                "package_arch_id": [arch_ids[a.a] for a in alist],
                 "instime": [self.__expand_installtime(a.installtime) for a in alist],
             }
             try:
@@ -0,0 +1,103 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Compare the insert rate of the importer for new package child rows with
+# and without COPY.
+#
+# Usage: python benchmark_bulk_import.py [rows] [table]
+#
+# Needs the database configured in /etc/rhn/rhn.conf. The rows (100000 by
+# default) of a synthetic package file list are inserted into a temporary
+# copy of the table (rhnPackageFile by default, with its indexes but without
+# foreign keys) once with the multi row INSERT used for updates and once
+# through the COPY staging table used for new packages. Everything is rolled
+# back at the end.
+#
+
+import sys
+import time
+
+from spacewalk.common.rhnConfig import initCFG
+from spacewalk.server import rhnSQL
+from spacewalk.server.importlib.backendLib import (
+    DBdateTime,
+    DBint,
+    DBstring,
+    Table,
+    TableCopy,
+    TableInsert,
+)
+from spacewalk.server.importlib.backendOracle import PostgresqlBackend
+
+PACKAGES = 100
+
+
+def values(table, rows):
+    fields = table.getFields()
+    result = {}
+    for name, datatype in fields.items():
+        if name == "package_id":
+            column = [i % PACKAGES + 1 for i in range(rows)]
+        elif name == "capability_id":
+            column = list(range(1, rows + 1))
+        elif isinstance(datatype, DBint):
+            column = [i % 65536 for i in range(rows)]
+        elif isinstance(datatype, DBdateTime):
+            column = ["2026-01-01 12:00:00"] * rows
+        elif isinstance(datatype, DBstring):
+            # pylint: disable-next=consider-using-f-string
+            column = ["value\t%d" % i for i in range(rows)]
+        else:
+            column = [None] * rows
+        result[name] = column
+    return result
+
+
+def run(loader, table, rows):
+    # pylint: disable-next=consider-using-f-string
+    rhnSQL.prepare("truncate %s" % table.name).execute()
+    data = values(table, rows)
+    start = time.time()
+    loader(table, rhnSQL).query(data)
+    seconds = time.time() - start
+    # pylint: disable-next=consider-using-f-string
+    count = rhnSQL.fetchone_dict("select count(*) as count from %s" % table.name)
+    return seconds, count["count"]
+
+
+if __name__ == "__main__":
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    table_name = sys.argv[2] if len(sys.argv) > 2 else "rhnPackageFile"
+
+    initCFG("server.satellite")
+    rhnSQL.initDB()
+    template = PostgresqlBackend.tables[table_name]
+    bench_table = Table(
+        "bench_" + table_name.lower(),
+        fields=template.getFields(),
+        pk=template.getPK(),
+    )
+    rhnSQL.prepare(
+        # pylint: disable-next=consider-using-f-string
+        "create temporary table %s (like %s including defaults including indexes)"
+        % (bench_table.name, table_name)
+    ).execute()
+
+    try:
+        for label, loader_class in (("insert", TableInsert), ("copy", TableCopy)):
+            elapsed, inserted = run(loader_class, bench_table, row_count)
+            print(
+                # pylint: disable-next=consider-using-f-string
+                "%-8s %9d rows %8.3f seconds %10.0f rows/s"
+                % (label, inserted, elapsed, inserted / elapsed)
+            )
+    finally:
+        rhnSQL.rollback()
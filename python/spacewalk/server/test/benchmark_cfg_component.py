@@ -0,0 +1,187 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Count the configuration lookups done while syncing a repository and the
+# time they cost.
+#
+# Usage: python benchmark_cfg_component.py <channel label> [packages]
+#        python benchmark_cfg_component.py --micro [calls]
+#
+# The first form builds a synthetic repository of empty noarch packages
+# (500 by default, needs rpmbuild and createrepo_c), syncs it into the
+# channel and reports how often initCFG (entered twice by every
+# cfg_component block) and RHNOptions.parse ran and how long they took.
+# WARNING: the packages of the channel are deleted first, use a scratch
+# custom channel.
+#
+# The second form needs neither a database nor a channel and compares the
+# cost of a single option lookup through cfg_component and config_snapshot.
+#
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from spacewalk.common import rhnConfig, rhnLog
+from spacewalk.common.rhnConfig import cfg_component, config_snapshot, initCFG
+
+SPEC = """Name: benchmark-%(index)d
+Version: 1.0
+Release: 1
+Summary: Synthetic package
+License: GPL-2.0-only
+BuildArch: noarch
+
+%%description
+Synthetic package for benchmark_cfg_component.py
+
+%%files
+"""
+
+
+class Counter:
+    """Wraps a function and counts the calls and the time spent in them."""
+
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+        self.function = getattr(owner, name)
+        self.calls = 0
+        self.seconds = 0.0
+        setattr(owner, name, self)
+
+    def __call__(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return self.function(*args, **kwargs)
+        finally:
+            self.calls += 1
+            self.seconds += time.time() - start
+
+    def __get__(self, instance, owner):
+        # wrapping a method
+        if instance is None:
+            return self
+        return lambda *args, **kwargs: self(instance, *args, **kwargs)
+
+    def restore(self):
+        setattr(self.owner, self.name, self.function)
+
+    def report(self):
+        print(
+            # pylint: disable-next=consider-using-f-string
+            "%-20s %8d calls %9.3f seconds %9.1f us/call"
+            % (
+                self.name,
+                self.calls,
+                self.seconds,
+                self.seconds / self.calls * 1000000 if self.calls else 0,
+            )
+        )
+
+
+def synthetic_repository(packages):
+    topdir = tempfile.mkdtemp()
+    for index in range(packages):
+        spec = os.path.join(topdir, "benchmark.spec")
+        # pylint: disable-next=unspecified-encoding
+        with open(spec, "w") as f:
+            f.write(SPEC % {"index": index})
+        subprocess.check_call(
+            # pylint: disable-next=consider-using-f-string
+            ["rpmbuild", "-bb", "--quiet", "--define", "_topdir %s" % topdir, spec]
+        )
+    repo = os.path.join(topdir, "RPMS")
+    subprocess.check_call(["createrepo_c", "--quiet", repo])
+    return topdir, "file://" + repo
+
+
+def sync(label, url):
+    # pylint: disable-next=import-outside-toplevel
+    from spacewalk.server import rhnSQL
+
+    # pylint: disable-next=import-outside-toplevel
+    from spacewalk.satellite_tools import contentRemove, reposync
+
+    rhnSQL.initDB()
+    contentRemove.delete_channels([label], force=1, skip_channels=1)
+    rhnSQL.commit()
+
+    counters = [
+        Counter(rhnConfig, "initCFG"),
+        Counter(rhnConfig.RHNOptions, "parse"),
+    ]
+    start = time.time()
+    try:
+        reposync.RepoSync(
+            channel_label=label, url=[url], no_errata=True, noninteractive=True
+        ).sync(update_repodata=False)
+    finally:
+        for counter in counters:
+            counter.restore()
+    seconds = time.time() - start
+
+    # pylint: disable-next=consider-using-f-string
+    print("%-20s %8s       %9.3f seconds" % ("reposync", "", seconds))
+    for counter in counters:
+        counter.report()
+
+
+def micro(calls):
+    for name, lookup in (
+        ("cfg_component", _lookup_cfg_component),
+        ("config_snapshot", _lookup_config_snapshot),
+    ):
+        start = time.time()
+        for _ in range(calls):
+            lookup()
+        seconds = time.time() - start
+        print(
+            # pylint: disable-next=consider-using-f-string
+            "%-20s %8d calls %9.3f seconds %9.1f us/call"
+            % (name, calls, seconds, seconds / calls * 1000000)
+        )
+
+
+def _lookup_cfg_component():
+    with cfg_component("server.satellite") as cfg:
+        return cfg.MOUNT_POINT
+
+
+def _lookup_config_snapshot():
+    return config_snapshot("server.satellite").MOUNT_POINT
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write(
+            # pylint: disable-next=consider-using-f-string
+            "Usage: %s <channel label> [packages] | --micro [calls]\n"
+            % sys.argv[0]
+        )
+        sys.exit(1)
+
+    initCFG("server.satellite")
+    if sys.argv[1] == "--micro":
+        micro(int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+        sys.exit(0)
+
+    rhnLog.initLOG("/var/log/rhn/reposync.log", 1)
+    tmpdir, repo_url = synthetic_repository(
+        int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    )
+    try:
+        sync(sys.argv[1], repo_url)
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,122 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Compare the threaded reposync download engine with the pycurl multi
+# engine.
+#
+# Usage: python benchmark_download_engine.py [files] [size in bytes] [delay in ms]
+#
+# Serves a synthetic repository (2000 files of 20 KiB by default) from a
+# local HTTP server that answers every request after the given delay (20 ms
+# by default) to simulate the round trip to a remote mirror, then downloads
+# all files with both engines and reports the time they needed.
+#
+
+import hashlib
+import os
+import shutil
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+from spacewalk.common.rhnConfig import initCFG
+from spacewalk.satellite_tools.download import ThreadedDownloader
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class DelayedHandler(SimpleHTTPRequestHandler):
+    delay = 0
+    root = None
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        super().do_GET()
+
+    def translate_path(self, path):
+        path = super().translate_path(path)
+        return os.path.join(self.root, os.path.relpath(path, os.getcwd()))
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def synthetic_repository(path, count, size):
+    checksums = {}
+    for index in range(count):
+        data = os.urandom(size)
+        # pylint: disable-next=consider-using-f-string
+        name = "package-%d.rpm" % index
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(data)
+        checksums[name] = hashlib.sha256(data).hexdigest()
+    return checksums
+
+
+def run(engine, url, checksums, target):
+    downloader = ThreadedDownloader(force=True, engine=engine)
+    for name, checksum in checksums.items():
+        downloader.add(
+            {
+                "urls": [url],
+                "relative_path": name,
+                "authtoken": None,
+                "target_file": os.path.join(target, name),
+                "ssl_ca_cert": None,
+                "ssl_client_cert": None,
+                "ssl_client_key": None,
+                "checksum_type": "sha256",
+                "checksum": checksum,
+                "bytes_range": None,
+                "http_headers": {},
+                "proxies": {},
+                "urlgrabber_logspec": None,
+            }
+        )
+    start = time.time()
+    downloader.run()
+    return time.time() - start, len(downloader.failed_pkgs)
+
+
+if __name__ == "__main__":
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    file_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20480
+    DelayedHandler.delay = (int(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000.0
+
+    initCFG("server.satellite")
+    workdir = tempfile.mkdtemp()
+    try:
+        repository = os.path.join(workdir, "repo")
+        os.mkdir(repository)
+        files = synthetic_repository(repository, file_count, file_size)
+        DelayedHandler.root = repository
+        server = ThreadingHTTPServer(("127.0.0.1", 0), DelayedHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # pylint: disable-next=consider-using-f-string
+        base_url = "http://127.0.0.1:%d/" % server.server_address[1]
+
+        for name in ("threads", "multi"):
+            cache = os.path.join(workdir, name)
+            os.mkdir(cache)
+            seconds, failed = run(name, base_url, files, cache)
+            print(
+                # pylint: disable-next=consider-using-f-string
+                "%-8s %6d files %4d failed %9.2f seconds %9.2f files/s"
+                % (name, len(files), failed, seconds, len(files) / seconds)
+            )
+        server.shutdown()
+    finally:
+        shutil.rmtree(workdir)
@@ -0,0 +1,134 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Compare the compiled repository package filter with the previous
+# list based implementation.
+#
+# Usage: python benchmark_package_filter.py [packages] [filters] [--no-legacy]
+#
+# Builds a synthetic package list (100000 packages by default, several
+# versions per name) and a chain of alternating include / exclude filters
+# (20 by default), then reports the time both implementations need and
+# checks that they select the same packages. The legacy implementation is
+# quadratic, skip it with --no-legacy for very big lists.
+#
+
+import fnmatch
+import random
+import re
+import sys
+import time
+
+from spacewalk.satellite_tools.repo_plugins import PackageFilter
+
+PREFIXES = ["lib", "python3-", "perl-", "golang-", "texlive-", "kernel-", ""]
+SUFFIXES = ["", "-devel", "-doc", "-lang", "-debuginfo", "-32bit"]
+
+
+def legacy_filter_packages(packages, filters):
+    """The filter loop ContentSource._filter_packages used before"""
+    selected = []
+    excluded = []
+    allmatched_include = []
+    allmatched_exclude = []
+    if filters[0][0] == "-":
+        selected = packages
+    else:
+        excluded = packages
+
+    for sense, pkg_list in filters:
+        reobj = re.compile(fnmatch.translate(pkg_list[0]))
+        if sense == "+":
+            for excluded_pkg in excluded:
+                if reobj.match(excluded_pkg):
+                    allmatched_include.insert(0, excluded_pkg)
+                    selected.insert(0, excluded_pkg)
+            for pkg in allmatched_include:
+                if pkg in excluded:
+                    excluded.remove(pkg)
+        else:
+            for selected_pkg in selected:
+                if reobj.match(selected_pkg):
+                    allmatched_exclude.insert(0, selected_pkg)
+                    excluded.insert(0, selected_pkg)
+            for pkg in allmatched_exclude:
+                if pkg in selected:
+                    selected.remove(pkg)
+            excluded = excluded + allmatched_exclude
+    return selected
+
+
+def synthetic_packages(count):
+    rnd = random.Random(count)
+    packages = []
+    while len(packages) < count:
+        # pylint: disable-next=consider-using-f-string
+        name = "%s%s%d%s" % (
+            rnd.choice(PREFIXES),
+            rnd.choice("abcdefghijklmnopqrstuvwxyz") * rnd.randint(2, 6),
+            rnd.randint(0, 5000),
+            rnd.choice(SUFFIXES),
+        )
+        for version in range(rnd.randint(1, 4)):
+            # pylint: disable-next=consider-using-f-string
+            packages.append("%s-1.%d-1.1.x86_64" % (name, version))
+    return packages[:count]
+
+
+def synthetic_filters(count):
+    rnd = random.Random(count)
+    filters = []
+    for index in range(count):
+        sense = "-" if index % 2 else "+"
+        # pylint: disable-next=consider-using-f-string
+        pattern = "%s%s*" % (
+            rnd.choice(PREFIXES),
+            rnd.choice("abcdefghijklmnopqrstuvwxyz"),
+        )
+        if index % 3 == 2:
+            pattern += rnd.choice(SUFFIXES[1:])
+        filters.append((sense, [pattern]))
+    return filters
+
+
+def run(function, packages, filters):
+    start = time.time()
+    result = function(list(packages), filters)
+    return result, time.time() - start
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    package_count = int(args[0]) if args else 100000
+    filter_count = int(args[1]) if len(args) > 1 else 20
+
+    pkgs = synthetic_packages(package_count)
+    rules = synthetic_filters(filter_count)
+
+    compiled, seconds = run(
+        lambda p, f: PackageFilter(f).apply(p, lambda pkg: pkg), pkgs, rules
+    )
+    print(
+        # pylint: disable-next=consider-using-f-string
+        "%-10s %7d packages %3d filters %7d selected %9.3f seconds"
+        % ("compiled", len(pkgs), len(rules), len(compiled), seconds)
+    )
+
+    if "--no-legacy" not in sys.argv:
+        legacy, seconds = run(legacy_filter_packages, pkgs, rules)
+        print(
+            # pylint: disable-next=consider-using-f-string
+            "%-10s %7d packages %3d filters %7d selected %9.3f seconds"
+            % ("legacy", len(pkgs), len(rules), len(legacy), seconds)
+        )
+        if set(legacy) != set(compiled):
+            print("ERROR: the filters selected different packages")
+            sys.exit(1)
@@ -0,0 +1,103 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Compare the per-package and the bulk repomd package mappers.
+#
+# Usage: python benchmark_repomd_mapper.py <channel label> [page size]
+#
+# Reports the number of SQL statements executed and the wall time needed to
+# load every package of the channel with each mapper, and checks that both
+# mappers return the same data.
+#
+
+import sys
+import time
+
+from spacewalk.common.rhnConfig import initCFG
+from spacewalk.server import rhnSQL, rhnChannel
+from spacewalk.server.rhnSQL import driver_postgresql
+from spacewalk.server.repomd import mapper
+
+_queries = [0]
+_execute_wrapper = driver_postgresql.Cursor._execute_wrapper
+
+
+def _counting_execute_wrapper(self, function, *p, **kw):
+    _queries[0] += 1
+    return _execute_wrapper(self, function, *p, **kw)
+
+
+driver_postgresql.Cursor._execute_wrapper = _counting_execute_wrapper
+
+
+def _fingerprint(package):
+    return (
+        package.id,
+        package.name,
+        package.version,
+        package.release,
+        package.checksum,
+        package.filename,
+        len(package.files),
+        len(package.provides),
+        len(package.requires),
+        len(package.changelog),
+    )
+
+
+def run(label, channel_mapper):
+    channel_id = rhnChannel.channel_info(label)["id"]
+    _queries[0] = 0
+    start = time.time()
+    channel = channel_mapper.get_channel(channel_id)
+    packages = [_fingerprint(p) for p in channel.packages]
+    elapsed = time.time() - start
+    return packages, _queries[0], elapsed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        # pylint: disable-next=consider-using-f-string
+        sys.stderr.write("Usage: %s <channel label> [page size]\n" % sys.argv[0])
+        sys.exit(1)
+
+    initCFG("server.xmlrpc")
+    rhnSQL.initDB()
+
+    channel_label = sys.argv[1]
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    package_mapper = mapper.get_package_mapper()
+    legacy_mapper = mapper.ChannelMapper(
+        package_mapper,
+        mapper.get_erratum_mapper(package_mapper),
+        mapper.SqlRepoMDMapper(),
+    )
+    bulk_mapper = mapper.ChannelMapper(
+        package_mapper,
+        mapper.get_erratum_mapper(package_mapper),
+        mapper.SqlRepoMDMapper(),
+        mapper.BulkSqlPackageMapper(page_size),
+    )
+
+    results = {}
+    for name, channel_mapper in (("per-package", legacy_mapper), ("bulk", bulk_mapper)):
+        pkgs, queries, seconds = run(channel_label, channel_mapper)
+        results[name] = sorted(pkgs)
+        print(
+            # pylint: disable-next=consider-using-f-string
+            "%-12s %7d packages %9d queries %9.2f seconds"
+            % (name, len(pkgs), queries, seconds)
+        )
+
+    if results["per-package"] != results["bulk"]:
+        print("ERROR: the mappers returned different packages")
+        sys.exit(1)
@@ -0,0 +1,70 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Compare the package import of reposync with and without the download
+# and import pipeline.
+#
+# Usage: python benchmark_reposync_pipeline.py <channel label> <file:// url> [runs]
+#
+# WARNING: the packages of the channel are deleted before every run, use a
+# scratch custom channel. The repository should be a local mirror, so that
+# the numbers do not depend on the network.
+#
+
+import sys
+import time
+
+from spacewalk.common import rhnLog
+from spacewalk.common.rhnConfig import initCFG
+from spacewalk.server import rhnSQL
+from spacewalk.satellite_tools import contentRemove, reposync
+
+
+def run(label, url, pipeline):
+    contentRemove.delete_channels([label], force=1, skip_channels=1)
+    rhnSQL.commit()
+    sync = reposync.RepoSync(
+        channel_label=label,
+        url=[url],
+        no_errata=True,
+        noninteractive=True,
+    )
+    sync.set_pipeline(pipeline)
+    start = time.time()
+    sync.sync(update_repodata=False)
+    return time.time() - start, len(sync.all_packages)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.stderr.write(
+            # pylint: disable-next=consider-using-f-string
+            "Usage: %s <channel label> <file:// url> [runs]\n"
+            % sys.argv[0]
+        )
+        sys.exit(1)
+
+    initCFG("server.satellite")
+    rhnLog.initLOG("/var/log/rhn/reposync.log", 1)
+    rhnSQL.initDB()
+
+    channel_label = sys.argv[1]
+    repo_url = sys.argv[2]
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+
+    for name, mode in (("sequential", False), ("pipeline", True)):
+        for _ in range(runs):
+            seconds, packages = run(channel_label, repo_url, mode)
+            print(
+                # pylint: disable-next=consider-using-f-string
+                "%-12s %7d packages %9.2f seconds %9.2f packages/s"
+                % (name, packages, seconds, packages / seconds if seconds else 0)
+            )
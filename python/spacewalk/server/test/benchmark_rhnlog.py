@@ -0,0 +1,87 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Compare the cost of a log_debug call at every debug level.
+#
+# Usage: python benchmark_rhnlog.py [messages]
+#
+# For every debug level 0-5 the same mix of log_debug calls (levels 1 to 5,
+# 20000 messages by default) is logged to a temporary file with the
+# previous traceback based caller lookup, the synchronous text log, the
+# asynchronous text log and the synchronous JSON log. The time per message
+# includes writing the queued lines of the asynchronous log.
+#
+
+import sys
+import tempfile
+import time
+import traceback
+
+from spacewalk.common import rhnLog
+
+ARGS = ("channel", 1234, {"arch": "x86_64"})
+
+
+class TracebackLog(rhnLog.rhnLog):
+    """rhnLog with the caller lookup of the previous implementation"""
+
+    # pylint: disable-next=unused-argument
+    def logMessage(self, *args, level=None):
+        tbStack = traceback.extract_stack()
+        callid = len(tbStack) - 3
+        module = tbStack[callid][0]
+        arr = module.split("/")
+        filename = arr[-1]
+        module = arr[-2] + "/" + filename[: filename.rindex(".")]
+        # pylint: disable-next=consider-using-f-string
+        msg = "%s%s.%s" % (self.log_info, module, tbStack[callid][2])
+        if args:
+            # pylint: disable-next=consider-using-f-string
+            msg = "%s%s" % (msg, repr(args))
+        self.writeMessage(msg)
+
+
+def run(log, level, messages):
+    rhnLog.LOG = log
+    log.level = level
+    start = time.time()
+    for i in range(messages):
+        rhnLog.log_debug(i % 5 + 1, *ARGS)
+    log.flush()
+    seconds = time.time() - start
+    if log.writer:
+        log.writer.close()
+    rhnLog.LOG = None
+    return seconds / messages * 1000000
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    variants = (
+        ("traceback", lambda f: TracebackLog(f, 0, "")),
+        ("text", lambda f: rhnLog.rhnLog(f, 0, "")),
+        ("text async", lambda f: rhnLog.rhnLog(f, 0, "", log_async=1)),
+        ("json", lambda f: rhnLog.rhnLog(f, 0, "", log_format="json")),
+    )
+
+    # pylint: disable-next=consider-using-f-string
+    print("%-6s" % "level" + "".join("%14s" % name for name, _ in variants))
+    for debug_level in range(6):
+        costs = []
+        for _, factory in variants:
+            with tempfile.NamedTemporaryFile(suffix=".log") as tmp:
+                costs.append(run(factory(tmp.name), debug_level, count))
+        print(
+            # pylint: disable-next=consider-using-f-string
+            "%-6d" % debug_level
+            # pylint: disable-next=consider-using-f-string
+            + "".join("%11.2f us" % cost for cost in costs)
+        )
@@ -559,6 +559,7 @@ fi
 %{python3rhnroot}/satellite_tools/disk_dumper/iss_ui.py*
 %{python3rhnroot}/satellite_tools/disk_dumper/iss_isos.py*
 %{python3rhnroot}/satellite_tools/disk_dumper/iss_actions.py*
+%{python3rhnroot}/satellite_tools/disk_dumper/iss_manifest.py*
 %{python3rhnroot}/satellite_tools/disk_dumper/dumper.py*
 %{python3rhnroot}/satellite_tools/disk_dumper/string_buffer.py*
 %dir %{python3rhnroot}/satellite_tools/repo_plugins
@@ -25,7 +25,7 @@ from random import randint
 import pytest
 
 from spacewalk.server import rhnSQL
-from spacewalk.server.rhnSQL import sql_base
+from spacewalk.server.rhnSQL import driver_postgresql, sql_base
 
 TEST_IDS = [1, 2, 3]
 TEST_NAMES = ["Bill", "Susan", "Joe"]
@@ -215,3 +215,89 @@ def test_unicode_string_argument(temp_table):
     # pylint: disable-next=consider-using-f-string
     query = rhnSQL.prepare("SELECT * FROM %s WHERE name=:name" % temp_table)
     query.execute(name="blah")
+
+
+# pylint: disable-next=redefined-outer-name
+def test_prepared_statements(temp_table):
+    # pylint: disable-next=consider-using-f-string
+    query = "SELECT name FROM %s WHERE id = :id" % temp_table
+    cursor = rhnSQL.prepare(query)
+    # Prepare the statement on the server after its first execution
+    cursor.prepared_statements = driver_postgresql.PreparedStatements(cursor.dbh, 1)
+    before = rhnSQL.statement_stats()
+
+    for i, test_id in enumerate(TEST_IDS):
+        cursor.execute(id=test_id)
+        assert cursor.fetchone()[0] == TEST_NAMES[i]
+
+    after = rhnSQL.statement_stats()
+    assert after["prepared"] == before["prepared"] + 1
+    assert after["prepared_executions"] == before["prepared_executions"] + 2
+
+
+def test_positional_query_params():
+    query = driver_postgresql.convert_named_query_params(
+        "SELECT * FROM t WHERE a = :a AND b LIKE '%x' AND c = :A AND d = :d"
+    )
+    assert driver_postgresql.to_positional_query_params(query) == (
+        "SELECT * FROM t WHERE a = $1 AND b LIKE '%x' AND c = $1 AND d = $2",
+        ["a", "d"],
+    )
+
+
+def test_stream_cursor(temp_table):
+    # pylint: disable-next=consider-using-f-string
+    query = "SELECT id, name FROM %s WHERE id > :id ORDER BY id" % temp_table
+    cursor = rhnSQL.prepare_stream(query, batch_size=2)
+    assert isinstance(cursor, driver_postgresql.StreamCursor)
+
+    cursor.execute(id=0)
+    rows = list(cursor.fetchiter_dict())
+    assert [row["id"] for row in rows] == TEST_IDS
+    assert [row["name"] for row in rows] == TEST_NAMES
+
+    # Every execute() declares a new server side cursor
+    cursor.execute(id=1)
+    assert cursor.fetchone_dict()["name"] == TEST_NAMES[1]
+    assert cursor.fetchone_dict()["name"] == TEST_NAMES[2]
+    assert cursor.fetchone_dict() is None
+
+
+def test_fetchiter_dict(temp_table):
+    # pylint: disable-next=consider-using-f-string
+    query = "SELECT name FROM %s WHERE id > :id ORDER BY id" % temp_table
+    names = [row["name"] for row in rhnSQL.fetchiter_dict(query, id=1)]
+    assert names == TEST_NAMES[1:]
+
+    cursor = rhnSQL.prepare(query)
+    cursor.execute(id=0)
+    names = [row["name"] for row in cursor.fetchiter_dict(batch_size=1)]
+    assert names == TEST_NAMES
+
+
+def test_copy_from(temp_table):
+    rows = [
+        (4, "tab\there", 1.5),
+        (5, "new\nline and back\\slash", None),
+        (6, None, 2),
+    ]
+    # pylint: disable-next=consider-using-f-string
+    cursor = rhnSQL.prepare("COPY %s (id, name, num) FROM STDIN" % temp_table)
+    assert cursor.copy_from(iter(rows)) == 3
+
+    # pylint: disable-next=consider-using-f-string
+    query = "SELECT id, name, num FROM %s WHERE id > :id ORDER BY id" % temp_table
+    cursor = rhnSQL.prepare(query)
+    cursor.execute(id=3)
+    assert [
+        (row_id, name, None if num is None else float(num))
+        for row_id, name, num in cursor.fetchall()
+    ] == rows
+
+
+def test_copy_stream():
+    rows = [(1, "a\\b", None, True), (2, b"\x01\xff", "\r", False)]
+    stream = driver_postgresql.CopyStream(rows)
+    data = "".join(iter(lambda: stream.read(5), ""))
+    assert data == "1\ta\\\\b\t\\N\tt\n2\t\\\\x01ff\t\\r\tf\n"
+    assert stream.count == 2
@@ -0,0 +1,60 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import errno
+import os
+
+import pytest
+from mock import Mock, patch
+
+from spacewalk.common.fileutils import copy_file
+
+
+def _source(tmp_path):
+    source = tmp_path / "source.rpm"
+    source.write_bytes(os.urandom(300000))
+    return source
+
+
+def test_copy_file(tmp_path):
+    source = _source(tmp_path)
+    target = tmp_path / "target.rpm"
+    copy_file(str(source), str(target))
+    assert target.read_bytes() == source.read_bytes()
+
+
+@patch(
+    "spacewalk.common.fileutils.fcntl.ioctl",
+    Mock(side_effect=OSError(errno.EOPNOTSUPP, "no reflinks")),
+)
+@patch(
+    "spacewalk.common.fileutils.os.copy_file_range",
+    Mock(side_effect=OSError(errno.EXDEV, "cross device")),
+    create=True,
+)
+def test_copy_file_falls_back_to_plain_copy(tmp_path):
+    source = _source(tmp_path)
+    target = tmp_path / "target.rpm"
+    target.write_bytes(b"old content, much longer than nothing")
+    copy_file(str(source), str(target))
+    assert target.read_bytes() == source.read_bytes()
+
+
+@patch("spacewalk.common.fileutils.fcntl.ioctl", Mock(side_effect=OSError()))
+@patch(
+    "spacewalk.common.fileutils.os.copy_file_range",
+    Mock(side_effect=OSError(errno.ENOSPC, "no space left")),
+    create=True,
+)
+def test_copy_file_raises_real_errors(tmp_path):
+    source = _source(tmp_path)
+    with pytest.raises(OSError):
+        copy_file(str(source), str(tmp_path / "target.rpm"))
@@ -156,6 +156,34 @@ class TestCommonRepo:
             repo = DpkgRepo("file://ubuntu/dists/bionic/restricted/binary-amd64/")
             assert repo.verify_packages_index()
 
+    @patch(
+        "spacewalk.common.repo.DpkgRepo.get_pkg_index_raw",
+        MagicMock(return_value=("Packages.gz", b"\x00")),
+    )
+    @patch("spacewalk.common.repo.DpkgRepo.is_flat", MagicMock(return_value=False))
+    def test_get_pkg_index_checksum(self):
+        """
+        Test get_pkg_index_checksum returns the strongest checksum available.
+
+        :return:
+        """
+        gri = DpkgRepo.ReleaseEntry(size=999, uri="restricted/binary-amd64")
+        gri.checksum.md5 = "6b1a7b8a7c0c3e2f0a5a0e6f3b4c2d1e"
+        gri.checksum.sha256 = (
+            "6e340b9cffb37a989ca544e6bb780a2c78901d3fb33738768511a30617afa01d"
+        )
+
+        release_index = MagicMock()
+        release_index().get = MagicMock(return_value=gri)
+        with patch("spacewalk.common.repo.DpkgRepo.get_release_index", release_index):
+            repo = DpkgRepo(
+                "http://mygreathost.com/ubuntu/dists/bionic/restricted/binary-amd64/"
+            )
+            assert repo.get_pkg_index_checksum() == (
+                "sha256",
+                "6e340b9cffb37a989ca544e6bb780a2c78901d3fb33738768511a30617afa01d",
+            )
+
     @patch("spacewalk.common.repo.DpkgRepo.get_release_index", mock_release_index)
     def test_is_flat(self):
         """
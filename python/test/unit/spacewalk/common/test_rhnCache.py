@@ -16,8 +16,15 @@
 #
 #
 
+import os
+import shutil
 import sys
+import tempfile
+import time
 import unittest
+
+from mock import patch
+
 from spacewalk.common import rhnCache
 
 
@@ -106,5 +113,162 @@ class Tests(unittest.TestCase):
         self.assertFalse(rhnCache.has_key(key))
 
 
+# pylint: disable-next=missing-class-docstring
+class AtomicCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cachedir = rhnCache.CACHEDIR
+        rhnCache.CACHEDIR = tempfile.mkdtemp()
+        self.cache = rhnCache.NullCache(rhnCache.AtomicCache())
+
+    def tearDown(self):
+        shutil.rmtree(rhnCache.CACHEDIR)
+        rhnCache.CACHEDIR = self.cachedir
+
+    def _write(self, key, content, modified=None):
+        f = self.cache.set_file(key, modified)
+        f.write(content)
+        f.close()
+
+    def test_modified(self):
+        "Entries are only returned for the modified time they were set with"
+        self._write("atomic/a", "content", "20041110001122")
+        self.assertEqual(
+            b"content", self.cache.get_file("atomic/a", "20041110001122").read()
+        )
+        self.assertEqual(None, self.cache.get_file("atomic/a", "20001122112233"))
+
+    def test_abort(self):
+        "Aborted writes leave the previous entry in place"
+        self._write("atomic/a", b"old")
+        f = self.cache.set_file("atomic/a")
+        f.write(b"new")
+        f.abort()
+        self.assertEqual(b"old", self.cache.get_file("atomic/a").read())
+        self.assertEqual(["a"], os.listdir(os.path.join(rhnCache.CACHEDIR, "atomic")))
+
+    def test_lock_is_reentrant(self):
+        with self.cache.lock("atomic/a"):
+            with self.cache.lock("atomic/a"):
+                pass
+
+    def test_evict_least_recently_used(self):
+        for i in range(4):
+            self._write("atomic/%d" % i, b"x" * 100)
+            os.utime(os.path.join(rhnCache.CACHEDIR, "atomic", str(i)), (i + 1, i + 1))
+        # Reading an entry makes it the most recently used one
+        self.cache.get_file("atomic/0")
+
+        self.assertEqual(2, rhnCache.evict("atomic", 250))
+        self.assertEqual(
+            ["0", "3"], sorted(os.listdir(os.path.join(rhnCache.CACHEDIR, "atomic")))
+        )
+
+    def test_evict_stale_temporary_files(self):
+        os.makedirs(os.path.join(rhnCache.CACHEDIR, "atomic"))
+        tmpname = os.path.join(rhnCache.CACHEDIR, "atomic", ".a.tmp")
+        # pylint: disable-next=unspecified-encoding
+        with open(tmpname, "w") as f:
+            f.write("partial")
+        os.utime(tmpname, (time.time() - 7200, time.time() - 7200))
+
+        rhnCache.evict("atomic", 1024)
+        self.assertFalse(os.path.exists(tmpname))
+
+    def test_evict_max_age(self):
+        for i in range(2):
+            self._write("atomic/%d" % i, b"x")
+        old = time.time() - 7200
+        os.utime(os.path.join(rhnCache.CACHEDIR, "atomic", "0"), (old, old))
+
+        self.assertEqual(1, rhnCache.evict("atomic", 1024, max_age=3600))
+        self.assertEqual(["1"], os.listdir(os.path.join(rhnCache.CACHEDIR, "atomic")))
+
+
+# pylint: disable-next=missing-class-docstring
+class TieredCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cachedir = rhnCache.CACHEDIR
+        rhnCache.CACHEDIR = tempfile.mkdtemp()
+        rhnCache.reset()
+
+    def tearDown(self):
+        shutil.rmtree(rhnCache.CACHEDIR)
+        rhnCache.CACHEDIR = self.cachedir
+        rhnCache.reset()
+
+    def test_memory_hit(self):
+        "Reading an entry again does not read the file"
+        rhnCache.set("tiered/a", [1, 2, 3])
+        self.assertEqual([1, 2, 3], rhnCache.get("tiered/a"))
+        with patch.object(rhnCache.AtomicCache, "get_file") as get_file:
+            value = rhnCache.get("tiered/a")
+        self.assertFalse(get_file.called)
+        self.assertEqual([1, 2, 3], value)
+
+        # every caller gets its own copy of the object
+        value.append(4)
+        self.assertEqual([1, 2, 3], rhnCache.get("tiered/a"))
+
+        stats = rhnCache.stats()
+        self.assertEqual(1, stats["disk_hits"])
+        self.assertEqual(2, stats["memory_hits"])
+        self.assertEqual(1, stats["memory_entries"])
+
+    def test_entry_written_by_other_process(self):
+        "Entries replaced on disk are read again"
+        rhnCache.set("tiered/a", "old")
+        self.assertEqual("old", rhnCache.get("tiered/a"))
+        rhnCache.ObjectCache(rhnCache.AtomicCache()).set("tiered/a", "new")
+        self.assertEqual("new", rhnCache.get("tiered/a"))
+
+        rhnCache.AtomicCache.delete("tiered/a")
+        self.assertEqual(None, rhnCache.get("tiered/a"))
+
+    def test_modified(self):
+        rhnCache.set("tiered/a", "content", modified="20041110001122")
+        self.assertEqual("content", rhnCache.get("tiered/a", "20041110001122"))
+        self.assertEqual(None, rhnCache.get("tiered/a", "20001122112233"))
+        self.assertEqual("content", rhnCache.get("tiered/a", "20041110001122"))
+
+    def test_memory_eviction(self):
+        memory = rhnCache.MemoryCache(100)
+        for i in range(5):
+            memory.set(i, "sig", "x" * 20, 20)
+        memory.get(0, "sig")
+        memory.set(5, "sig", "x" * 20, 20)
+
+        self.assertEqual(100, memory.size)
+        self.assertNotEqual(None, memory.get(0, "sig"))
+        self.assertEqual(None, memory.get(1, "sig"))
+        self.assertEqual(1, rhnCache.stats()["memory_evictions"])
+
+    def test_set_evicts_directory(self):
+        rhnCache.set("tiered/a", "x" * 100, raw=1)
+        os.utime(os.path.join(rhnCache.CACHEDIR, "tiered", "a"), (1, 1))
+        with patch.object(rhnCache, "MAX_SIZE", 0), patch.object(
+            rhnCache, "EVICTED_DIRECTORIES", ("tiered",)
+        ), patch.dict(rhnCache.TieredCache._evicted, clear=True):
+            rhnCache.set("tiered/b", "y", raw=1)
+        self.assertEqual([], os.listdir(os.path.join(rhnCache.CACHEDIR, "tiered")))
+        self.assertEqual(2, rhnCache.stats()["disk_evictions"])
+
+    def test_set_evicts_only_own_directories(self):
+        "Entries outside of EVICTED_DIRECTORIES are never trimmed"
+        other = os.path.join(rhnCache.CACHEDIR, "reposync", "a")
+        os.makedirs(os.path.dirname(other))
+        with open(other, "wb") as f:
+            f.write(b"x" * 100)
+        os.utime(other, (1, 1))
+        # an absolute name, as given by the ISS dumper
+        absolute = os.path.join(tempfile.mkdtemp(dir=rhnCache.CACHEDIR), "b")
+        with patch.object(rhnCache, "MAX_SIZE", 0), patch.dict(
+            rhnCache.TieredCache._evicted, clear=True
+        ):
+            rhnCache.set(absolute, "y", raw=1)
+            rhnCache.set("reposync/b", "y", raw=1)
+        self.assertTrue(os.path.exists(other))
+        self.assertEqual(0, rhnCache.stats()["disk_evictions"])
+
+
 if __name__ == "__main__":
     sys.exit(unittest.main() or 0)
@@ -0,0 +1,76 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import os
+
+import pytest
+from mock import patch
+
+from spacewalk.common import rhnConfig
+
+
+@pytest.fixture
+def conf_file(tmp_path):
+    filename = str(tmp_path / "rhn.conf")
+    # pylint: disable-next=unspecified-encoding
+    with open(filename, "w") as f:
+        f.write("server.satellite.mount_point = /srv/packages\n")
+    rhnConfig.reload_config_snapshots()
+    yield filename
+    rhnConfig.reload_config_snapshots()
+
+
+def _rewrite(filename, content):
+    # pylint: disable-next=unspecified-encoding
+    with open(filename, "w") as f:
+        f.write(content)
+    mtime = os.stat(filename).st_mtime + 10
+    os.utime(filename, (mtime, mtime))
+
+
+def test_config_snapshot(conf_file):
+    cfg = rhnConfig.config_snapshot("server.satellite", filename=conf_file)
+    assert cfg.MOUNT_POINT == "/srv/packages"
+    assert cfg["mount_point"] == "/srv/packages"
+    assert cfg.get("MOUNT_POINT") == "/srv/packages"
+    assert cfg.get("no_such_option", 42) == 42
+    with pytest.raises(AttributeError):
+        # pylint: disable-next=pointless-statement
+        cfg.no_such_option
+    with pytest.raises(AttributeError):
+        cfg.mount_point = "/tmp"
+
+
+def test_config_snapshot_reload(conf_file):
+    cfg = rhnConfig.config_snapshot("server.satellite", filename=conf_file)
+    _rewrite(conf_file, "server.satellite.mount_point = /srv/other\n")
+
+    # the config file is not looked at again within the stat interval
+    assert rhnConfig.config_snapshot("server.satellite", filename=conf_file) is cfg
+
+    with patch.object(rhnConfig, "SNAPSHOT_STAT_INTERVAL", 0):
+        cfg = rhnConfig.config_snapshot("server.satellite", filename=conf_file)
+    assert cfg.MOUNT_POINT == "/srv/other"
+
+    _rewrite(conf_file, "server.satellite.mount_point = /srv/third\n")
+    cfg = rhnConfig.config_snapshot("server.satellite", filename=conf_file, reload=True)
+    assert cfg.MOUNT_POINT == "/srv/third"
+
+
+def test_config_snapshot_override(conf_file):
+    rhnConfig.config_snapshot("server.satellite", filename=conf_file)
+    options = rhnConfig.RHNOptions("server.satellite", filename=conf_file)
+    options.parse()
+    with patch.dict(rhnConfig._overrides, clear=True):
+        options.set("DEBUG", 6)
+        cfg = rhnConfig.config_snapshot("server.satellite", filename=conf_file)
+        assert cfg.DEBUG == 6
+        assert rhnConfig.config_snapshot("server", filename=conf_file).DEBUG != 6
@@ -0,0 +1,108 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import json
+import os
+
+import pytest
+from mock import Mock, patch
+
+from spacewalk.common import rhnLog
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    # an existing file, a new one would be given to the apache user
+    path = tmp_path / "test.log"
+    path.touch()
+    yield str(path)
+    rhnLog.LOG = None
+
+
+def _lines(log_file):
+    # pylint: disable-next=unspecified-encoding
+    with open(log_file) as f:
+        return f.read().splitlines()
+
+
+def _caller():
+    rhnLog.log_debug(2, "message", 1)
+
+
+def test_caller(log_file):
+    rhnLog.initLOG(log_file, 2, log_async=0, log_format="text")
+    _caller()
+    rhnLog.LOG.flush()
+    assert _lines(log_file)[0].endswith(
+        "0.0.0.0: common/test_rhnLog._caller('message', 1)"
+    )
+
+
+def test_filtered_level_skips_caller_lookup(log_file):
+    rhnLog.initLOG(log_file, 1, log_async=0, log_format="text")
+    with patch.object(rhnLog.sys, "_getframe") as getframe:
+        _caller()
+    assert not getframe.called
+    rhnLog.LOG.flush()
+    assert _lines(log_file) == []
+
+
+def test_json_format(log_file):
+    rhnLog.initLOG(log_file, 2, component="tests", log_async=0, log_format="json")
+    req = Mock()
+    req.headers_in = {"HTTP_X_REQUEST_ID": "abc"}
+    req.connection.remote_ip = "192.168.1.1"
+    rhnLog.log_setreq(req)
+    rhnLog.log_setsession(1000010000)
+    _caller()
+    rhnLog.log_error("failed", {(1, 2): 3})
+    rhnLog.LOG.flush()
+
+    records = [json.loads(line) for line in _lines(log_file)]
+    assert records[0]["function"] == "_caller"
+    assert records[0]["module"] == "common/test_rhnLog"
+    assert records[0]["level"] == 2
+    assert records[0]["args"] == ["message", 1]
+    assert records[0]["component"] == "tests"
+    assert records[0]["request_id"] == "abc"
+    assert records[0]["session_id"] == 1000010000
+    assert records[0]["remote_addr"] == "192.168.1.1"
+    # not serializable arguments are logged as their repr
+    assert records[1]["args"] == "('ERROR', 'failed', {(1, 2): 3})"
+
+
+def test_async_writer(log_file):
+    rhnLog.initLOG(log_file, 2, log_async=1, log_format="text")
+    assert rhnLog.LOG.writer is not None
+    for i in range(100):
+        rhnLog.log_debug(1, i)
+    # replacing the log writes the queued lines
+    rhnLog.initLOG("stderr", 2)
+    lines = _lines(log_file)
+    assert len(lines) == 100
+    assert lines[-1].endswith("(99,)")
+
+
+def test_async_writer_forked_child(log_file):
+    rhnLog.initLOG(log_file, 2, log_async=1, log_format="text")
+    rhnLog.log_debug(1, "parent")
+    rhnLog.log_flush()
+    pid = os.fork()
+    if pid == 0:
+        # like a multiprocessing pool worker
+        rhnLog.log_debug(1, "child")
+        rhnLog.log_flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    rhnLog.initLOG("stderr", 2)
+    lines = _lines(log_file)
+    assert len(lines) == 2
+    assert lines[-1].endswith("('child',)")
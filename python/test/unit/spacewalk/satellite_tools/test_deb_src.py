@@ -0,0 +1,132 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import io
+
+from mock import Mock, patch
+
+from spacewalk.satellite_tools.repo_plugins import deb_src
+
+PACKAGES = """Package: libc6
+Architecture: amd64
+Version: 2.36-9+deb12u4
+Filename: pool/main/g/glibc/libc6_2.36-9+deb12u4_amd64.deb
+Description: GNU C Library: Shared libraries
+ Contains the standard libraries that are used by nearly all programs on
+ the system.
+MD5sum: 6b1a7b8a7c0c3e2f0a5a0e6f3b4c2d1e
+SHA256: 1a2b3c4d5e6f708192a3b4c5d6e7f8091a2b3c4d5e6f708192a3b4c5d6e7f809
+
+Package: vim
+Architecture: amd64
+Version: 2:9.0.1378-2
+Filename: pool/main/v/vim/vim_9.0.1378-2_amd64.deb
+SHA1: 0123456789abcdef0123456789abcdef01234567
+
+Package: incomplete
+Architecture: all
+Version: 1.0
+
+Package: base-files
+Architecture: amd64
+Version: 12.4+deb12u5
+Filename: pool/main/b/base-files/base-files_12.4+deb12u5_amd64.deb
+MD5sum: 00112233445566778899aabbccddeeff
+"""
+
+
+def _fingerprint(package):
+    return (
+        package.name,
+        package.epoch,
+        package.version,
+        package.release,
+        package.arch,
+        package.relativepath,
+        package.checksum_type,
+        package.checksum,
+    )
+
+
+def test_parse_packages():
+    packages = list(deb_src.parse_packages(io.StringIO(PACKAGES)))
+    assert [_fingerprint(p) for p in packages] == [
+        (
+            "libc6",
+            "",
+            "2.36",
+            "9+deb12u4",
+            "amd64-deb",
+            "pool/main/g/glibc/libc6_2.36-9+deb12u4_amd64.deb",
+            "sha256",
+            "1a2b3c4d5e6f708192a3b4c5d6e7f8091a2b3c4d5e6f708192a3b4c5d6e7f809",
+        ),
+        (
+            "vim",
+            "2",
+            "9.0.1378",
+            "2",
+            "amd64-deb",
+            "pool/main/v/vim/vim_9.0.1378-2_amd64.deb",
+            "sha1",
+            "0123456789abcdef0123456789abcdef01234567",
+        ),
+        (
+            "base-files",
+            "",
+            "12.4+deb12u5",
+            "X",
+            "amd64-deb",
+            "pool/main/b/base-files/base-files_12.4+deb12u5_amd64.deb",
+            "md5",
+            "00112233445566778899aabbccddeeff",
+        ),
+    ]
+
+
+def _deb_repo(cache_dir):
+    with patch("spacewalk.satellite_tools.repo_plugins.deb_src.log2", Mock()):
+        repo = deb_src.DebRepo(
+            "http://example.com/debian/dists/bookworm/main/binary-amd64/",
+            str(cache_dir),
+            str(cache_dir),
+        )
+    repo.index_checksum = ("sha256", "a" * 64)
+    return repo
+
+
+def test_get_package_list_reuses_unchanged_index(tmp_path):
+    repo = _deb_repo(tmp_path)
+    repo._open_package_index = Mock(return_value=io.StringIO(PACKAGES))
+    packages = repo.get_package_list()
+    assert len(packages) == 3
+
+    # the index did not change, it is neither downloaded nor parsed again
+    repo._open_package_index = Mock()
+    cached = repo.get_package_list()
+    assert not repo._open_package_index.called
+    assert [_fingerprint(p) for p in cached] == [_fingerprint(p) for p in packages]
+
+    # a new index is parsed again
+    repo.index_checksum = ("sha256", "b" * 64)
+    repo._open_package_index = Mock(return_value=io.StringIO(""))
+    assert repo.get_package_list() == []
+    assert repo._open_package_index.called
+
+
+def test_get_package_list_without_index_cache(tmp_path):
+    repo = _deb_repo(tmp_path)
+    repo.index_cache = False
+    repo._open_package_index = Mock(return_value=io.StringIO(PACKAGES))
+    repo.get_package_list()
+    repo._open_package_index = Mock(return_value=io.StringIO(PACKAGES))
+    repo.get_package_list()
+    assert repo._open_package_index.called
@@ -10,6 +10,12 @@
 # along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import hashlib
+import os
+import socketserver
+import threading
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
 from mock import Mock, patch
 from queue import Queue
 
@@ -22,6 +28,31 @@ from spacewalk.satellite_tools.download import (
 from urlgrabber.grabber import URLGrabberOptions
 
 
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Serves the files below root"""
+
+    root = None
+
+    def translate_path(self, path):
+        path = super().translate_path(path)
+        return os.path.join(self.root, os.path.relpath(path, os.getcwd()))
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def _serve(directory):
+    """Returns a started HTTP server for the files in directory"""
+    handler = type("Handler", (QuietHandler,), {"root": str(directory)})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
 class NoKeyErrorsDict(dict):
     """Like a dict that is only accessed by .get(key)"""
 
@@ -91,6 +122,51 @@ def test_reposync_threaded_downloader_sets_failed_pkgs():
         assert fail_pkg_name in td.failed_pkgs
 
 
+@patch("spacewalk.common.rhnConfig.initCFG", Mock())
+@patch("spacewalk.satellite_tools.download.log", Mock())  # no logging
+@patch("spacewalk.satellite_tools.download.log2", Mock())  # no logging
+@patch(
+    "spacewalk.satellite_tools.download.PyCurlFileObjectThread", Mock(return_value=None)
+)  # fail download
+def test_reposync_threaded_downloader_calls_done_callback():
+    pkg_names = ["first.rpm", "second.rpm", "third.rpm"]
+
+    # pylint: disable-next=invalid-name
+    CFG = Mock()
+    CFG.REPOSYNC_TIMEOUT = 1
+    CFG.REPOSYNC_MINRATE = 1
+    CFG.REPOSYNC_DOWNLOAD_THREADS = 2
+
+    done = []
+
+    with patch("spacewalk.satellite_tools.download.pycurl.Curl", Mock()), patch(
+        "spacewalk.common.rhnConfig.CFG", CFG
+    ):
+        td = ThreadedDownloader(retries=0, force=True)
+
+        def done_callback(params, success):
+            done.append((params["target_file"], success))
+            td.release_staging_slots()
+
+        td.set_done_callback(done_callback)
+        # one file at a time, the next one waits for the callback to give
+        # the slot back
+        td.set_staging_limit(1)
+        for pkg_name in pkg_names:
+            td.add(
+                NoKeyErrorsDict(
+                    {
+                        "http_headers": dict(),
+                        "urls": ["http://example.com"],
+                        "target_file": pkg_name,
+                    }
+                )
+            )
+        td.run()
+        assert sorted(done) == [(pkg_name, False) for pkg_name in sorted(pkg_names)]
+        assert td.failed_pkgs == set(pkg_names)
+
+
 @patch("spacewalk.satellite_tools.download.log", Mock())  # no logging
 @patch("urlgrabber.grabber.PyCurlFileObject._do_grab", Mock())  # no downloads
 @patch("urlgrabber.grabber.PyCurlFileObject.close", Mock())  # no need to close files
@@ -184,3 +260,119 @@ def test_reposync_download_thread_sets_failed_pkg():
         thread = DownloadThread(parent_mock, queue)
         thread.run()
         assert failed_pkg_name in thread.failed_pkgs
+
+
+@patch("spacewalk.common.rhnConfig.initCFG", Mock())
+@patch("spacewalk.satellite_tools.download.log", Mock())  # no logging
+@patch("spacewalk.satellite_tools.download.log2", Mock())  # no logging
+def test_reposync_multi_engine_downloads_and_retries_mirrors(tmp_path):
+    src = tmp_path / "repo"
+    dst = tmp_path / "cache"
+    src.mkdir()
+    dst.mkdir()
+    checksums = {}
+    for index in range(20):
+        data = os.urandom(1000 + index)
+        # pylint: disable-next=consider-using-f-string
+        name = "pkg%d.rpm" % index
+        (src / name).write_bytes(data)
+        checksums[name] = hashlib.sha256(data).hexdigest()
+
+    server = _serve(src)
+
+    # pylint: disable-next=invalid-name
+    CFG = Mock()
+    CFG.REPOSYNC_TIMEOUT = 10
+    CFG.REPOSYNC_MINRATE = 1
+    CFG.REPOSYNC_DOWNLOAD_THREADS = 1
+    CFG.get = lambda key, default=None: default
+
+    done = []
+    try:
+        with patch("spacewalk.common.rhnConfig.CFG", CFG):
+            td = ThreadedDownloader(retries=2, engine="multi")
+
+        def done_callback(params, success):
+            done.append((os.path.basename(params["target_file"]), success))
+            td.release_staging_slots()
+
+        td.set_done_callback(done_callback)
+        td.set_staging_limit(4)
+        for name in list(checksums) + ["missing.rpm"]:
+            td.add(
+                NoKeyErrorsDict(
+                    {
+                        # the first mirror refuses all connections
+                        "urls": [
+                            "http://127.0.0.1:1/",
+                            # pylint: disable-next=consider-using-f-string
+                            "http://127.0.0.1:%d/" % server.server_address[1],
+                        ],
+                        "relative_path": name,
+                        "target_file": str(dst / name),
+                        "checksum_type": "sha256",
+                        "checksum": checksums.get(name, "0"),
+                    }
+                )
+            )
+        td.run()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert sorted(done) == sorted(
+        [(name, True) for name in checksums] + [("missing.rpm", False)]
+    )
+    assert td.failed_pkgs == {"missing.rpm"}
+    for name, checksum in checksums.items():
+        assert hashlib.sha256((dst / name).read_bytes()).hexdigest() == checksum
+    assert not (dst / "missing.rpm").exists()
+
+
+@patch("spacewalk.common.rhnConfig.initCFG", Mock())
+@patch("spacewalk.satellite_tools.download.log", Mock())  # no logging
+@patch("spacewalk.satellite_tools.download.log2", Mock())  # no logging
+def test_reposync_multi_engine_unwritable_target(tmp_path):
+    """A target file which cannot be created only fails its own download"""
+    src = tmp_path / "repo"
+    src.mkdir()
+    data = b"package"
+    (src / "pkg.rpm").write_bytes(data)
+    server = _serve(src)
+
+    # pylint: disable-next=invalid-name
+    CFG = Mock()
+    CFG.REPOSYNC_TIMEOUT = 10
+    CFG.REPOSYNC_MINRATE = 1
+    CFG.REPOSYNC_DOWNLOAD_THREADS = 1
+    CFG.get = lambda key, default=None: default
+
+    done = []
+    try:
+        with patch("spacewalk.common.rhnConfig.CFG", CFG):
+            td = ThreadedDownloader(retries=2, engine="multi")
+        td.set_done_callback(
+            lambda params, success: done.append((params["target_file"], success))
+        )
+        targets = [str(tmp_path / "missing" / "pkg.rpm"), str(tmp_path / "pkg.rpm")]
+        for target in targets:
+            td.add(
+                NoKeyErrorsDict(
+                    {
+                        # pylint: disable-next=consider-using-f-string
+                        "urls": ["http://127.0.0.1:%d/" % server.server_address[1]],
+                        "relative_path": "pkg.rpm",
+                        "target_file": target,
+                        "checksum_type": "sha256",
+                        "checksum": hashlib.sha256(data).hexdigest(),
+                    }
+                )
+            )
+        td.run()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert sorted(done) == sorted([(targets[0], False), (targets[1], True)])
+    assert td.failed_pkgs == {"pkg.rpm"}
+    assert (tmp_path / "pkg.rpm").read_bytes() == data
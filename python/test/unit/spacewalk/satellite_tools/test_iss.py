@@ -0,0 +1,80 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import os
+import pickle
+
+import pytest
+from mock import Mock, patch
+
+from spacewalk.satellite_tools.disk_dumper import iss
+
+
+def _dumper(workers):
+    # the real constructor queries the database
+    dumper = iss.Dumper.__new__(iss.Dumper)
+    dumper.workers = workers
+    return dumper
+
+
+def _export_pid(item):
+    if item == "broken":
+        raise iss.ISSError("Error: Missing RPM", "traceback")
+    return os.getpid()
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+@patch("spacewalk.satellite_tools.disk_dumper.iss.rhnSQL", Mock())
+def test_export_all_items(workers):
+    items = list(range(50))
+    results = dict(_dumper(workers)._export(items, _export_pid))
+    assert sorted(results) == items
+    if workers == 1:
+        assert set(results.values()) == {os.getpid()}
+    else:
+        assert os.getpid() not in results.values()
+
+
+@patch("spacewalk.satellite_tools.disk_dumper.iss.rhnSQL", Mock())
+def test_export_raises_worker_errors():
+    with pytest.raises(iss.ISSError) as e:
+        list(_dumper(2)._export(["ok", "broken", "ok"], _export_pid))
+    assert e.value.msg == "Error: Missing RPM"
+    assert e.value.tb == "traceback"
+
+
+def test_iss_error_pickle():
+    error = pickle.loads(pickle.dumps(iss.ISSError("message", "traceback")))
+    assert (error.msg, error.tb) == ("message", "traceback")
+
+
+@patch("spacewalk.satellite_tools.disk_dumper.iss.log2stdout", Mock())
+def test_changed_skips_objects_of_the_manifest(tmp_path):
+    dumper = _dumper(1)
+    dumper.manifest = iss.ExportManifest(str(tmp_path))
+    items = [{"id": 1, "path": "a.rpm"}, {"id": 2, "path": "b.rpm"}]
+
+    def get_file(item):
+        return str(tmp_path / item["path"])
+
+    assert dumper._changed("rpms", items, "id", "path", get_file) == items
+    for item in items:
+        with open(get_file(item), "wb") as f:
+            f.write(b"rpm")
+        dumper._record("rpms", item, "id", "path", get_file)
+    dumper.manifest.save()
+
+    dumper.manifest = iss.ExportManifest(str(tmp_path))
+    items[1] = {"id": 2, "path": "b-2.rpm"}
+    assert dumper._changed("rpms", items, "id", "path", get_file) == [items[1]]
+
+    dumper.manifest = None
+    assert dumper._changed("rpms", items, "id", "path", get_file) == items
@@ -0,0 +1,92 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import gzip
+import json
+
+from spacewalk.satellite_tools.disk_dumper import iss_manifest
+from spacewalk.satellite_tools.xmlDiskSource import DeltaManifestDiskSource
+
+
+def _export(mountpoint, objects):
+    manifest = iss_manifest.ExportManifest(str(mountpoint))
+    written = []
+    for object_id, last_modified in objects.items():
+        # pylint: disable-next=consider-using-f-string
+        filename = str(mountpoint / ("rhn-package-%s.xml" % object_id))
+        if manifest.unchanged("packages", object_id, last_modified, filename):
+            continue
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(last_modified)
+        manifest.record("packages", object_id, last_modified, filename)
+        written.append(object_id)
+    manifest.save()
+    return written
+
+
+def test_export_manifest_skips_unchanged_objects(tmp_path):
+    assert _export(tmp_path, {1: "20260101", 2: "20260101"}) == [1, 2]
+    assert _export(tmp_path, {1: "20260101", 2: "20260102", 3: "20260102"}) == [
+        2,
+        3,
+    ]
+
+    manifest = iss_manifest.load_manifest(str(tmp_path / "manifest.json"))
+    assert sorted(manifest["objects"]["packages"]) == ["1", "2", "3"]
+    assert manifest["objects"]["packages"]["2"][0] == "20260102"
+
+    delta = iss_manifest.load_manifest(str(tmp_path / "manifest-delta.json"))
+    assert sorted(delta["objects"]["packages"]) == ["2", "3"]
+    assert delta["since"] is not None
+
+    # a removed file is exported again even if the object did not change
+    (tmp_path / "rhn-package-1.xml").unlink()
+    assert _export(tmp_path, {1: "20260101", 2: "20260102"}) == [1]
+
+
+def test_export_manifest_checksums_compressed_files(tmp_path):
+    manifest = iss_manifest.ExportManifest(str(tmp_path))
+    filename = str(tmp_path / "rhn-erratum-1.xml")
+    with gzip.open(filename + ".gz", "wb") as f:
+        f.write(b"<erratum/>")
+    manifest.record("errata", 1, "20260101", filename)
+    manifest.record("errata", 2, "20260101", str(tmp_path / "missing.xml"))
+    delta = manifest.save()
+    assert list(delta["errata"]) == ["1"]
+    assert delta["errata"]["1"][1] == "sha256"
+
+    assert iss_manifest.ExportManifest(str(tmp_path)).unchanged(
+        "errata", 1, "20260101", filename
+    )
+
+
+def test_delta_manifest_disk_source(tmp_path):
+    source = DeltaManifestDiskSource(str(tmp_path))
+    assert not source.is_incremental()
+    assert source.changed("packages", 1)
+    assert source.checksum("packages", 1) is None
+
+    with open(tmp_path / "manifest-delta.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "generated": "20260102000000",
+                "since": "20260101000000",
+                "objects": {"packages": {"1": ["20260101", "sha256", "abc"]}},
+            },
+            f,
+        )
+    source = DeltaManifestDiskSource(str(tmp_path))
+    assert source.is_incremental()
+    assert source.since() == "20260101000000"
+    assert source.changed("packages", 1)
+    assert not source.changed("packages", 2)
+    assert not source.changed("errata", 1)
+    assert source.checksum("packages", 1) == ("sha256", "abc")
@@ -0,0 +1,58 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import pytest
+
+from spacewalk.satellite_tools.repo_plugins import PackageFilter
+
+PACKAGES = ["kernel-default", "kernel-devel", "vim", "vim-data", "zypper"]
+
+
+def _apply(filters, exclude_only=False):
+    return PackageFilter(filters, exclude_only).apply(PACKAGES, lambda pkg: pkg)
+
+
+def test_package_filter_include():
+    assert _apply([("+", ["kernel*"])]) == ["kernel-default", "kernel-devel"]
+
+
+def test_package_filter_exclude():
+    assert _apply([("-", ["vim*"])]) == ["kernel-default", "kernel-devel", "zypper"]
+
+
+def test_package_filter_last_match_wins():
+    assert _apply([("+", ["kernel*"]), ("-", ["*-devel"])]) == ["kernel-default"]
+    assert _apply([("-", ["*-devel"]), ("+", ["kernel*"])]) == PACKAGES
+    assert _apply([("-", ["kernel*"]), ("+", ["kernel-default"])]) == [
+        "kernel-default",
+        "vim",
+        "vim-data",
+        "zypper",
+    ]
+
+
+def test_package_filter_exclude_only():
+    assert _apply([("+", ["kernel*"]), ("-", ["vim*"])], exclude_only=True) == [
+        "kernel-default",
+        "kernel-devel",
+        "zypper",
+    ]
+
+
+def test_package_filter_keeps_duplicate_names():
+    packages = ["vim", "zypper", "vim"]
+    package_filter = PackageFilter([("+", ["vim"])])
+    assert package_filter.apply(packages, lambda pkg: pkg) == ["vim", "vim"]
+
+
+def test_package_filter_malformed():
+    with pytest.raises(IOError):
+        PackageFilter([("+", ["vim"]), ("x", ["zypper"])])
@@ -312,6 +312,10 @@ class RepoSyncTest(unittest.TestCase):
     @patch("spacewalk.satellite_tools.reposync.log", Mock())
     @patch("spacewalk.satellite_tools.reposync.ThreadedDownloader")
     @patch("spacewalk.satellite_tools.reposync.multiprocessing.Pool")
+    @patch(
+        "spacewalk.satellite_tools.reposync.rhnPackage.get_info_for_packages",
+        Mock(return_value={}),
+    )
     def test_import_packages_excludes_failed_pkgs(self, pool, downloader):
         """
         When downloader fails to download a subset of packages
@@ -334,6 +338,184 @@ class RepoSyncTest(unittest.TestCase):
         apply_async_mock = pool.return_value.__enter__.return_value.apply_async
         self.assertFalse(apply_async_mock.called)
 
+    @patch("spacewalk.common.rhnConfig.initCFG", Mock())
+    @patch("spacewalk.satellite_tools.reposync.log2", Mock())
+    @patch("spacewalk.satellite_tools.reposync.os", os)
+    @patch("spacewalk.satellite_tools.reposync.log", Mock())
+    @patch("spacewalk.satellite_tools.reposync.ThreadedDownloader")
+    @patch("spacewalk.satellite_tools.reposync.multiprocessing.Pool")
+    @patch("spacewalk.satellite_tools.reposync.rhnPackage.get_info_for_packages")
+    def test_import_packages_skips_synced_pkgs(self, get_info, pool, downloader):
+        """
+        When all the repository packages are already in the channel
+        Then the RepoSync.import_packages function should look them up at once
+        and neither download nor link any of them
+        """
+        rs = _init_reposync(self.reposync)
+        rs.match_package_checksum = Mock(return_value=True)
+        _mock_rhnsql(self.reposync, [None, []])
+
+        packs = self._mock_packages_list(["pkg1.rpm", "pkg2.rpm"])
+        for i, pack in enumerate(packs):
+            pack.name = "pkg%d" % i
+            pack.version = "1.0"
+            pack.release = "1"
+            pack.epoch = "0"
+            pack.checksum = "checksum%d" % i
+        get_info.return_value = {
+            ("pkg%d" % i, "1.0", "1", "", "arch1"): [
+                {
+                    "path": "packages/pkg%d.rpm" % i,
+                    "channel_id": 1,
+                    "checksum_type": "sha256",
+                    "checksum": "checksum%d" % i,
+                    "org_id": "1",
+                    "epoch": None,
+                }
+            ]
+            for i in range(2)
+        }
+        plugin = self._mock_repo_plugin(packs)
+
+        with patch("spacewalk.common.rhnConfig.CFG", self._mock_cfg()):
+            rs.import_packages(plugin, None, "unused-url-string", None)
+
+        self.assertEqual(1, get_info.call_count)
+        self.assertFalse(downloader.return_value.add.called)
+        apply_async_mock = pool.return_value.__enter__.return_value.apply_async
+        self.assertFalse(apply_async_mock.called)
+
+    @patch("spacewalk.common.rhnConfig.initCFG", Mock())
+    @patch("spacewalk.satellite_tools.reposync.log2", Mock())
+    @patch("spacewalk.satellite_tools.reposync.os", os)
+    @patch("spacewalk.satellite_tools.reposync.log", Mock())
+    @patch("spacewalk.satellite_tools.reposync.SQLBackend", Mock())
+    @patch("spacewalk.satellite_tools.reposync.ChannelPackageSubscription", Mock())
+    @patch("spacewalk.satellite_tools.reposync.ThreadedDownloader")
+    @patch("spacewalk.satellite_tools.reposync.multiprocessing.Pool")
+    @patch(
+        "spacewalk.satellite_tools.reposync.rhnPackage.get_info_for_packages",
+        Mock(return_value={}),
+    )
+    def test_import_packages_pipeline_imports_while_downloading(self, pool, downloader):
+        """
+        When the download and import pipeline is enabled
+        Then the RepoSync.import_packages function should submit an import batch
+        as soon as enough packages are downloaded
+        """
+        rs = _init_reposync(self.reposync)
+        rs.set_pipeline(True)
+        rs.set_import_batch_size(2)
+        rs.associate_package = Mock()
+        _mock_rhnsql(self.reposync, [None, []])
+
+        packs = self._mock_packages_list(["pkg1.rpm", "pkg2.rpm", "pkg3.rpm"])
+        plugin = self._mock_repo_plugin(packs)
+        downloader.return_value.failed_pkgs = set()
+
+        apply_async_mock = pool.return_value.__enter__.return_value.apply_async
+        submitted_while_downloading = []
+
+        def apply_async(_, args, **kwargs):
+            result = Mock()
+            result.get.return_value = ([], 0, set(), args[0])
+            return result
+
+        def run():
+            callback = downloader.return_value.set_done_callback.call_args[0][0]
+            for pack in packs:
+                callback({"target_file": pack.path}, True)
+                submitted_while_downloading.append(apply_async_mock.call_count)
+
+        apply_async_mock.side_effect = apply_async
+        downloader.return_value.run.side_effect = run
+
+        with patch("spacewalk.common.rhnConfig.CFG", self._mock_cfg()):
+            rs.import_packages(plugin, None, "unused-url-string", None)
+
+        # the first batch is full after the second download, the last one is
+        # submitted after the downloads finished
+        self.assertEqual([0, 1, 1], submitted_while_downloading)
+        self.assertEqual(2, apply_async_mock.call_count)
+        batches = [c[1]["args"][0] for c in apply_async_mock.call_args_list]
+        self.assertEqual([2, 1], [len(batch) for batch in batches])
+        self.assertEqual(3, rs.associate_package.call_count)
+
+    @patch("spacewalk.common.rhnConfig.initCFG", Mock())
+    @patch("spacewalk.satellite_tools.reposync.log2", Mock())
+    @patch("spacewalk.satellite_tools.reposync.os", os)
+    @patch("spacewalk.satellite_tools.reposync.log", Mock())
+    @patch("spacewalk.satellite_tools.reposync.SQLBackend", Mock())
+    @patch("spacewalk.satellite_tools.reposync.ChannelPackageSubscription", Mock())
+    @patch("spacewalk.satellite_tools.reposync.ThreadedDownloader")
+    @patch("spacewalk.satellite_tools.reposync.multiprocessing.Pool")
+    @patch("spacewalk.satellite_tools.reposync.rhnPackage.get_info_for_packages")
+    def test_import_packages_links_pkgs_of_other_channels(
+        self, get_info, pool, downloader
+    ):
+        """
+        When another channel synced in parallel imported a package already
+        Then the RepoSync.import_packages function should only link it
+        and download the remaining packages
+        """
+        rs = _init_reposync(self.reposync)
+        rs.set_pipeline(False)
+        rs.match_package_checksum = Mock(return_value=True)
+        rs.associate_package = Mock()
+        _mock_rhnsql(self.reposync, [None, []])
+
+        packs = self._mock_packages_list(["pkg0.rpm", "pkg1.rpm"])
+        for i, pack in enumerate(packs):
+            pack.name = "pkg%d" % i
+            pack.version = "1.0"
+            pack.release = "1"
+            pack.epoch = "0"
+            pack.checksum_type = "sha256"
+            pack.checksum = "checksum%d" % i
+        plugin = self._mock_repo_plugin(packs)
+        downloader.return_value.failed_pkgs = set()
+
+        registry = self.reposync.ChecksumRegistry()
+        other_channel = -1
+        imported = [("sha256", "checksum0")]
+        registry.claim(imported, other_channel)
+        registry.release(imported, other_channel, imported)
+        rs.set_checksum_registry(registry)
+
+        # pkg0 is in the database once the other channel imported it
+        get_info.side_effect = [
+            {},
+            {
+                ("pkg0", "1.0", "1", "", "arch1"): [
+                    {
+                        "path": "packages/pkg0.rpm",
+                        "channel_id": 2,
+                        "checksum_type": "sha256",
+                        "checksum": "checksum0",
+                        "org_id": "1",
+                        "epoch": None,
+                    }
+                ]
+            },
+        ]
+
+        def apply_async(_, args, **kwargs):
+            result = Mock()
+            result.get.return_value = ([], 0, {("sha256", "checksum1")}, args[0])
+            return result
+
+        pool.return_value.__enter__.return_value.apply_async.side_effect = apply_async
+
+        with patch("spacewalk.common.rhnConfig.CFG", self._mock_cfg()):
+            rs.import_packages(plugin, None, "unused-url-string", None)
+
+        self.assertEqual(1, downloader.return_value.add.call_count)
+        self.assertEqual(2, rs.associate_package.call_count)
+        # the package downloaded by this channel can be linked by the others
+        self.assertEqual(0, registry.pending([("sha256", "checksum1")]))
+        downloaded = [("sha256", "checksum1")]
+        self.assertEqual(downloaded, registry.claim(downloaded, 1))
+
     @patch("spacewalk.common.rhnConfig.initCFG", Mock())
     def test_sync_raises_channel_timeout(self):
         rs = self._create_mocked_reposync()
@@ -1139,6 +1321,7 @@ class RunScriptTest(unittest.TestCase):
                             channel_label=[],
                             parent_label=None,
                             batch_size=None,
+                            parallel="1",
                         ),
                         [],
                     ]
@@ -1180,6 +1363,22 @@ class RunScriptTest(unittest.TestCase):
         self.repo_sync.main()
         self.assertEqual(self.repo_sync.reposync.RepoSync.call_count, 2)
 
+    def test_parallel_channels(self):
+        self.repo_sync.CFG = Mock()
+        self.repo_sync.CFG.DEBUG = 3
+        options = self.repo_sync.OptionParser.return_value.parse_args.return_value[0]
+        options.parallel = "2"
+        parallel_sync = self.repo_sync.reposync.ParallelSync
+        parallel_sync.return_value.run.return_value = 0
+        self.assertEqual(0, self.repo_sync.main())
+        parallel_sync.assert_called_once_with(2)
+        channels, create_sync = parallel_sync.return_value.run.call_args[0]
+        self.assertEqual(["chann_1", "chann_2"], sorted(ch for ch, _ in channels))
+        # the channels are created in their own processes
+        self.assertFalse(self.repo_sync.reposync.RepoSync.called)
+        create_sync("chann_1", [])
+        self.assertEqual(1, self.repo_sync.reposync.RepoSync.call_count)
+
 
 @patch("spacewalk.common.rhnConfig.initCFG", Mock())
 def test_channel_exceptions():
@@ -1392,3 +1591,46 @@ def test_ksdirhtmlparser():
     parser = spacewalk.satellite_tools.reposync.KSDirHtmlParser(plugin, "foobar")
 
     assert all([a == b for a, b in zip(parser.dir_content, EXPECTATIONS)])
+
+
+def test_checksum_registry():
+    registry = spacewalk.satellite_tools.reposync.ChecksumRegistry()
+    keys = [("sha256", "a"), ("sha256", "b")]
+    assert registry.claim(keys, 1) == []
+    assert registry.claim(keys + [("sha256", "c")], 2) == keys
+    assert registry.pending(keys) == 2
+
+    # imported packages stay taken, the failed ones can be claimed again
+    registry.release(keys, 1, [("sha256", "a")])
+    assert registry.pending(keys) == 0
+    assert registry.claim(keys, 3) == [("sha256", "a")]
+
+    # a dead channel process gives up its claims
+    registry.release_owner(3)
+    assert registry.claim([("sha256", "b")], 4) == []
+
+
+def test_parallel_sync_result_after_timeout():
+    """A result put just after the timeout is not taken for a dead process"""
+    reposync = spacewalk.satellite_tools.reposync
+    results = Mock()
+    # the process exits between the timeout and the exit code check
+    results.get.side_effect = reposync.queue.Empty
+    results.get_nowait.side_effect = [("label1", 0, None), reposync.queue.Empty]
+    process = Mock(exitcode=0, pid=100)
+    with patch.object(reposync, "multiprocessing") as mp, patch.object(
+        reposync, "RegistryManager"
+    ) as manager, patch.object(reposync.rhnSQL, "closeDB"), patch.object(
+        reposync, "log"
+    ), patch.object(
+        reposync, "log2"
+    ) as log2:
+        mp.Queue.return_value = results
+        mp.Process.return_value = process
+        ret_code = reposync.ParallelSync(1).run([("label1", [])], Mock())
+
+    assert ret_code == 0
+    process.join.assert_called_once_with()
+    registry = manager.return_value.__enter__.return_value.ChecksumRegistry
+    registry.return_value.release_owner.assert_called_once_with(100)
+    log2.assert_not_called()
@@ -60,9 +60,10 @@ class YumSrcTest(unittest.TestCase):
         yum_src.CFG.REPOSYNC_MINRATE = 1000
         yum_src.CFG.REPOSYNC_TIMEOUT = 300
         yum_src.fileutils.makedirs = Mock()
-        yum_src.os.chmod = Mock()
-        yum_src.os.makedirs = Mock()
-        yum_src.os.path.isdir = Mock()
+        # os is shared with every other module, restored by tearDown
+        patch.object(yum_src.os, "chmod").start()
+        patch.object(yum_src.os, "makedirs").start()
+        patch.object(yum_src.os.path, "isdir").start()
 
         yum_src.get_proxy = Mock(return_value=(None, None, None))
 
@@ -94,6 +95,7 @@ class YumSrcTest(unittest.TestCase):
         )
 
     def tearDown(self):
+        patch.stopall()
         shutil.rmtree(self.repo.root)
 
     def test_content_source_init(self):
@@ -107,10 +109,10 @@ class YumSrcTest(unittest.TestCase):
     def test_list_packages_empty(self):
         cs = self._make_dummy_cs()
 
-        os.path.isfile = Mock(return_value=True)
         solv.Pool = Mock()
 
-        self.assertEqual(cs.list_packages(filters=None, latest=False), [])
+        with patch("os.path.isfile", Mock(return_value=True)):
+            self.assertEqual(cs.list_packages(filters=None, latest=False), [])
 
     def test_list_packages_filters(self):
         cs = self._make_dummy_cs()
@@ -249,10 +251,10 @@ class YumSrcTest(unittest.TestCase):
             ),
         ]
 
-        os.path.isfile = Mock(return_value=True)
         solv.Pool = Mock()
 
-        listed_packages = cs.list_packages(filters=None, latest=False)
+        with patch("os.path.isfile", Mock(return_value=True)):
+            listed_packages = cs.list_packages(filters=None, latest=False)
 
         self.assertEqual(len(listed_packages), 2)
         for pack, mocked_pack in zip(listed_packages, mocked_packs):
@@ -0,0 +1,121 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2026 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from spacewalk.server import rhnLookupCache, rhnSQL
+
+ARCHES = {"x86_64": 120, "noarch": 100}
+# Other tests replace rhnSQL.commit() and friends with mocks for good; these
+# are the real ones, running the transaction hooks
+COMMIT = rhnSQL.commit
+CLOSE_DB = rhnSQL.closeDB
+
+
+@pytest.fixture
+def db():
+    """rhnSQL.prepare() of a database knowing ARCHES, records the queries"""
+    cursor = MagicMock()
+    cursor.queried = []
+
+    def execute_values(_sql, values, **_kwargs):
+        cursor.queried.append([value[1] for value in values])
+        return [(value[0], ARCHES[value[1]]) for value in values if value[1] in ARCHES]
+
+    cursor.execute_values.side_effect = execute_values
+    rhnLookupCache.invalidate()
+    with patch(
+        "spacewalk.server.rhnLookupCache.rhnSQL.prepare",
+        MagicMock(return_value=cursor),
+    ):
+        yield cursor
+    rhnLookupCache.invalidate()
+
+
+def test_lookup_labels(db):
+    ids = rhnLookupCache.lookup_labels("rhnPackageArch", ["x86_64", "noarch", "bogus"])
+    assert ids == {"x86_64": 120, "noarch": 100}
+    assert db.queried == [["bogus", "noarch", "x86_64"]]
+
+    # pending until the transaction is committed
+    rhnLookupCache.lookup_labels("rhnPackageArch", ["x86_64", "noarch"])
+    assert len(db.queried) == 1
+    rhnLookupCache.get_cache("rhnPackageArch").transaction_done(True)
+    assert len(rhnLookupCache.get_cache("rhnPackageArch")) == 2
+
+    # known ids are not queried again, unknown keys are
+    ids = rhnLookupCache.lookup_labels("rhnPackageArch", ["x86_64", "bogus"])
+    assert ids == {"x86_64": 120}
+    assert db.queried[1:] == [["bogus"]]
+
+
+def test_rollback_forgets_pending(db):
+    cache = rhnLookupCache.get_cache("rhnPackageArch")
+    rhnLookupCache.lookup_labels("rhnPackageArch", ["x86_64"])
+    cache.transaction_done(False)
+    assert len(cache) == 0
+
+    rhnLookupCache.lookup_labels("rhnPackageArch", ["x86_64"])
+    assert db.queried == [["x86_64"], ["x86_64"]]
+
+    # connected to another database
+    cache.transaction_done(True)
+    cache.transaction_done(None)
+    assert len(cache) == 0
+
+
+@pytest.mark.usefixtures("db")
+def test_cache_size():
+    cache = rhnLookupCache.get_cache("rhnPackageArch")
+    with patch.object(rhnLookupCache, "_max_size", return_value=1):
+        rhnLookupCache.lookup_labels("rhnPackageArch", ["x86_64"])
+        cache.transaction_done(True)
+        rhnLookupCache.lookup_labels("rhnPackageArch", ["noarch"])
+        cache.transaction_done(True)
+    assert cache.get_many([("x86_64",), ("noarch",)]) == {("noarch",): 100}
+
+
+@pytest.mark.parametrize("failed", [False, True])
+def test_commit(db, failed):
+    """Committing a failed transaction rolls it back"""
+    connection = MagicMock()
+    connection.transaction_failed.return_value = failed
+    with patch.object(rhnSQL, "__DB", connection, create=True):
+        rhnLookupCache.lookup_labels("rhnPackageArch", ["x86_64"])
+        COMMIT()
+    connection.commit.assert_called_once_with()
+    assert len(rhnLookupCache.get_cache("rhnPackageArch")) == (0 if failed else 1)
+    rhnLookupCache.lookup_labels("rhnPackageArch", ["x86_64"])
+    assert len(db.queried) == (2 if failed else 1)
+
+
+@pytest.mark.parametrize(
+    "committing, closing, failed, cached",
+    [
+        (True, True, False, 1),
+        (True, True, True, 0),
+        (False, True, False, 0),
+        # the connection of a forked child is dropped this way
+        (False, False, False, 0),
+    ],
+)
+@pytest.mark.usefixtures("db")
+def test_close(committing, closing, failed, cached):
+    connection = MagicMock()
+    connection.transaction_failed.return_value = failed
+    setattr(rhnSQL, "__DB", connection)
+    rhnLookupCache.lookup_labels("rhnPackageArch", ["x86_64"])
+    CLOSE_DB(committing=committing, closing=closing)
+    assert not hasattr(rhnSQL, "__DB")
+    assert connection.commit.called == committing
+    assert len(rhnLookupCache.get_cache("rhnPackageArch")) == cached
@@ -3,10 +3,12 @@ CLI app
 """
 # pylint: disable-next=unused-import
 from mgrlibmod import mllib, mltypes, mlerrcode
-from typing import List
+from typing import IO, List
 import argparse
 import os
+import socketserver
 import sys
+import traceback
 
 
 def get_opts() -> argparse.Namespace:
@@ -26,6 +28,24 @@ def get_opts() -> argparse.Namespace:
     ap.add_argument(
         "-p", "--pretty", action="store_true", help="Pretty-print JSON responses"
     )
+    ap.add_argument(
+        "-s",
+        "--serve",
+        action="store_true",
+        help="Keep running and answer requests from STDIN, one JSON object per line",
+    )
+    ap.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="Keep running and answer requests on a UNIX socket,"
+        + " one JSON object per line",
+    )
+    ap.add_argument(
+        "--cache-size",
+        type=int,
+        default=16,
+        help="Number of parsed module indexes kept in serve mode (default: 16)",
+    )
 
     return ap.parse_args()
 
@@ -44,6 +64,74 @@ def get_stdin_data() -> str:
     return os.linesep.join(out)
 
 
+def process_request(
+    opts: argparse.Namespace, data: str, index_cache: mllib.MLIndexCache = None
+) -> str:
+    """
+    process_request runs a request and returns the JSON response on one line.
+
+    :return: response
+    :rtype: str
+    """
+    try:
+        return mllib.MLLibmodAPI(opts, index_cache).set_repodata(data).run().to_json()
+    # pylint: disable-next=broad-exception-caught
+    except Exception as exc:
+        if opts.verbose:  # Local debugging
+            traceback.print_exc(file=sys.stderr)
+        return mltypes.MLErrorType(exc).to_json()
+
+
+def serve_stream(
+    opts: argparse.Namespace,
+    instream: IO,
+    outstream: IO,
+    index_cache: mllib.MLIndexCache,
+) -> None:
+    """
+    serve_stream answers the requests read from a stream, one per line,
+    until the end of the stream. The module indexes stay cached in between.
+    """
+    for line in instream:
+        line = line.strip()
+        if not line:
+            continue
+        outstream.write(process_request(opts, line, index_cache) + "\n")
+        outstream.flush()
+
+
+def serve_socket(opts: argparse.Namespace, index_cache: mllib.MLIndexCache) -> None:
+    """
+    serve_socket answers the requests of the clients of a UNIX socket, one
+    connection after the other.
+    """
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            serve_stream(
+                opts,
+                (line.decode("utf-8") for line in self.rfile),
+                self,
+                index_cache,
+            )
+
+        def write(self, data: str) -> None:
+            self.wfile.write(data.encode("utf-8"))
+
+        def flush(self) -> None:
+            self.wfile.flush()
+
+    if os.path.exists(opts.socket):
+        os.unlink(opts.socket)
+    with socketserver.UnixStreamServer(opts.socket, RequestHandler) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(opts.socket)
+
+
 def main():
     """
     main function for the CLI app.
@@ -84,11 +172,22 @@ Usage example:
 
         mgr-libmod < input.json > output.json
 
+3. To answer many requests without parsing the same metadata again, keep
+   it running and send one request per line, either on STDIN or on a
+   UNIX socket. Every response is written as one line:
+
+        mgr-libmod --serve
+        mgr-libmod --socket /run/mgr-libmod.sock
+
 To get the full list of supported functions, call "-l" option:
 
         mgr-libmod -l
 """
         print(example.strip() + "\n")
+    elif opts.socket:
+        serve_socket(opts, mllib.MLIndexCache(opts.cache_size))
+    elif opts.serve:
+        serve_stream(opts, sys.stdin, sys.stdout, mllib.MLIndexCache(opts.cache_size))
     else:
         try:
             print(
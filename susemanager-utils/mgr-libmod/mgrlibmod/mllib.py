@@ -9,9 +9,11 @@ import gzip
 import json
 import argparse
 import binascii
+import hashlib
+from collections import OrderedDict
 
 # pylint: disable-next=unused-import
-from typing import Any, Dict, List, Set, Optional
+from typing import Any, Callable, Dict, List, Set, Optional, Tuple
 from mgrlibmod import mltypes, mlerrcode, mlresolver
 
 import gi  # type: ignore
@@ -21,20 +23,85 @@ gi.require_version("Modulemd", "2.0")
 from gi.repository import Modulemd  # type: ignore
 
 
+class MLIndexCache:
+    """
+    LRU cache of module indexes, keyed by the metadata paths and their checksums.
+    """
+
+    def __init__(self, size: int = 16):
+        """
+        __init__
+
+        :param size: maximum number of module indexes to keep.
+        :type size: int
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._indexes: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def checksum(path: str) -> str:
+        """
+        checksum -- SHA-256 checksum of a metadata file.
+
+        :param path: path to the meta file.
+        :type path: str
+        :return: hex digest of the file.
+        :rtype: str
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as metafile:
+            for chunk in iter(lambda: metafile.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(
+        self, paths: List[str], loader: Callable[[], Modulemd.ModuleIndex]
+    ) -> Modulemd.ModuleIndex:
+        """
+        get -- return the cached module index of the metadata, load it if missing.
+
+        :param paths: paths of the metadata.
+        :type paths: List[str]
+        :param loader: function loading the module index of the metadata.
+        :return: module index
+        """
+        key: Tuple = tuple((path, self.checksum(path)) for path in paths)
+        index = self._indexes.get(key)
+        if index is not None:
+            self.hits += 1
+            self._indexes.move_to_end(key)
+            return index
+
+        self.misses += 1
+        index = loader()
+        self._indexes[key] = index
+        while len(self._indexes) > self.size:
+            self._indexes.popitem(last=False)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+
 class MLLibmodProc:
     """
     Libmod process.
     """
 
-    def __init__(self, metadata: List[str]):
+    def __init__(self, metadata: List[str], index_cache: MLIndexCache = None):
         """
         __init__
 
         :param metadata: paths of the metadata.
         :type metadata: List[str]
+        :param index_cache: cache to get the module index from, if any.
+        :type index_cache: MLIndexCache
         """
         self.metadata = metadata
         self._mod_index: Modulemd.ModuleIndex = None
+        self._index_cache = index_cache
 
         if gi is None or Modulemd is None:
             raise mlerrcode.MlGeneralException("No python libmodulemd was found")
@@ -80,16 +147,25 @@ class MLLibmodProc:
         index_modules -- loads given metadata and indexes modules from there.
         """
         if self._mod_index is None:
-            mgr: Modulemd.ModuleIndex = Modulemd.ModuleIndexMerger.new()
-            for path in self.metadata:
-                idx = Modulemd.ModuleIndex.new()
-                if self._is_meta_compressed(path):
-                    with gzip.open(path) as gzmeta:
-                        idx.update_from_string(gzmeta.read().decode("utf-8"), False)
-                else:
-                    idx.update_from_file(path, False)
-                mgr.associate_index(idx, 0)
-            self._mod_index = mgr.resolve()
+            if self._index_cache is not None:
+                self._mod_index = self._index_cache.get(self.metadata, self._load_index)
+            else:
+                self._mod_index = self._load_index()
+
+    def _load_index(self) -> Modulemd.ModuleIndex:
+        """
+        _load_index -- parse the metadata and merge it into one module index.
+        """
+        mgr: Modulemd.ModuleIndex = Modulemd.ModuleIndexMerger.new()
+        for path in self.metadata:
+            idx = Modulemd.ModuleIndex.new()
+            if self._is_meta_compressed(path):
+                with gzip.open(path) as gzmeta:
+                    idx.update_from_string(gzmeta.read().decode("utf-8"), False)
+            else:
+                idx.update_from_file(path, False)
+            mgr.associate_index(idx, 0)
+        return mgr.resolve()
 
     def get_default_stream(self, name: str):
         if self._mod_index is None:
@@ -190,14 +266,17 @@ class MLLibmodAPI:
     Libmod API operations.
     """
 
-    def __init__(self, opts: argparse.Namespace):
+    def __init__(self, opts: argparse.Namespace, index_cache: MLIndexCache = None):
         """
         __init__
 
         :param opts: Parsed opts namespace.
         :type opts: argparse.Namespace
+        :param index_cache: cache of module indexes, shared between requests.
+        :type index_cache: MLIndexCache
         """
         self._opts = opts
+        self._index_cache = index_cache
         self.repodata: mltypes.MLInputType
         self._result: Dict[str, Dict[str, Dict]] = {}
         self._proc: MLLibmodProc
@@ -217,7 +296,7 @@ class MLLibmodAPI:
                     "File {} not found".format(modulepath)
                 )
 
-        self._proc = MLLibmodProc(self.repodata.get_paths())
+        self._proc = MLLibmodProc(self.repodata.get_paths(), self._index_cache)
 
         return self
 
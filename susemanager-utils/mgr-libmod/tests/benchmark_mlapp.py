@@ -0,0 +1,74 @@
+"""
+Compare one mgr-libmod process per request with a single process in serve mode.
+
+Usage: python3 tests/benchmark_mlapp.py [request file] [requests]
+
+Runs the request (default: tests/data/module_packages-1.json) the given
+number of times (default: 20), first starting mgr-libmod for every request
+as content lifecycle management does, then sending all of them to one
+"mgr-libmod --serve" process, which parses the metadata only once.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMAND = [sys.executable, os.path.join(ROOT, "scripts", "mgr-libmod")]
+ENV = dict(os.environ, PYTHONPATH=ROOT)
+
+
+def per_call(request: str, count: int) -> float:
+    start = time.time()
+    for _ in range(count):
+        subprocess.run(
+            COMMAND,
+            input=request,
+            env=ENV,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+            universal_newlines=True,
+        )
+    return time.time() - start
+
+
+def serve(request: str, count: int) -> float:
+    start = time.time()
+    with subprocess.Popen(
+        COMMAND + ["--serve"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        env=ENV,
+        universal_newlines=True,
+    ) as proc:
+        for _ in range(count):
+            proc.stdin.write(request + "\n")
+            proc.stdin.flush()
+            proc.stdout.readline()
+        proc.stdin.close()
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    path = (
+        sys.argv[1]
+        if len(sys.argv) > 1
+        else os.path.join(ROOT, "tests", "data", "module_packages-1.json")
+    )
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    # pylint: disable-next=unspecified-encoding
+    with open(path, "r") as f:
+        line = json.dumps(json.load(f))
+
+    os.chdir(ROOT)
+    for name, run in (("per call", per_call), ("serve", serve)):
+        seconds = run(line, requests)
+        print(
+            # pylint: disable-next=consider-using-f-string
+            "{:10} {:5d} requests {:8.2f} seconds {:8.1f} ms/request".format(
+                name, requests, seconds, seconds * 1000 / requests
+            )
+        )
@@ -1,9 +1,12 @@
 """
 Unit test for LibmodProc class.
 """
-from mgrlibmod.mllib import MLLibmodProc, MLLibmodAPI
+from mgrlibmod.mllib import MLIndexCache, MLLibmodProc, MLLibmodAPI
+from mgrlibmod import mlapp
 from mgrlibmod.mlerrcode import MlConflictingStreams, MlModuleNotFound
+import io
 import json
+import shutil
 import pytest
 from unittest import mock
 from unittest.mock import mock_open
@@ -435,3 +438,49 @@ class TestLibmodProc:
         for selection in result["selected"]:
             assert "nodejs" == selection["name"]
             assert "18" == selection["stream"]
+
+    def test_index_cache(self, tmp_path):
+        """
+        test_index_cache -- module indexes are reused until the metadata changes
+        """
+        path = str(tmp_path / "modules.yaml.gz")
+        shutil.copyfile("tests/data/sample-modules.yaml.gz", path)
+        request = json.dumps({"function": "list_modules", "paths": [path]})
+        cache = MLIndexCache(size=1)
+
+        first = MLLibmodAPI(None, cache).set_repodata(request).run().to_json()
+        second = MLLibmodAPI(None, cache).set_repodata(request).run().to_json()
+        assert first == second
+        assert (cache.misses, cache.hits) == (1, 1)
+
+        # changed metadata is parsed again
+        shutil.copyfile("tests/data/sample-modules-2.yaml.gz", path)
+        MLLibmodAPI(None, cache).set_repodata(request).run()
+        assert (cache.misses, cache.hits) == (2, 1)
+        assert len(cache) == 1
+
+    def test_serve_stream(self):
+        """
+        test_serve_stream -- every request line gets one response line
+        """
+        requests = [
+            # pylint: disable-next=unspecified-encoding
+            json.dumps(json.load(open("tests/data/list_modules.json", "r"))),
+            "",
+            # pylint: disable-next=unspecified-encoding
+            json.dumps(json.load(open("tests/data/not_found.json", "r"))),
+            # pylint: disable-next=unspecified-encoding
+            json.dumps(json.load(open("tests/data/list_modules.json", "r"))),
+        ]
+        out = io.StringIO()
+        cache = MLIndexCache()
+        mlapp.serve_stream(
+            mock.Mock(verbose=False), io.StringIO("\n".join(requests)), out, cache
+        )
+
+        responses = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert len(responses) == 3
+        assert "list_modules" in responses[0]
+        assert responses[1]["error_code"]
+        assert responses[2] == responses[0]
+        assert cache.hits >= 1
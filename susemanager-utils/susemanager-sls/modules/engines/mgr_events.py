@@ -10,18 +10,24 @@ Manager's PostgreSQL database. Additionally, it sends notifications via the
 LISTEN/NOTIFY mechanism to alert SUSE Multi-Linux Manager of newly available events.
 
 mgr_events.py tries to keep the I/O low in high load scenarios. Therefore
-events are INSERTed once they come in, but not necessarily COMMITted
-immediately.
+events are not INSERTed by the event loop: it only matches the tag and puts
+the event into a buffer. A writer thread INSERTs the buffered events with
+one multi-row INSERT of up to batch_size events and COMMITs them together.
 
-The algorithm is an implementation of token bucket:
+COMMITs are limited with a token bucket:
  - a COMMIT costs one token
  - initially, commit_burst tokens are available
  - every commit_interval seconds, one new token is generated
    (up to commit_burst)
- - when an event arrives and there are tokens available it is COMMITted
-   immediately
- - when an event arrives but no tokens are available, the event is INSERTed but
-   not COMMITted yet. COMMIT will happen as soon as a token is available
+ - when events are buffered and there are tokens available they are
+   COMMITted immediately
+ - when events are buffered but no tokens are available, they stay in the
+   buffer until a token is available
+
+At most max_buffered_events events are buffered. When the buffer is full the
+event loop waits for the writer, so that the Salt event bus is slowed down
+instead of the memory usage growing. How often and how long this happened is
+logged with the other statistics of the engine.
 
 .. versionadded:: 2018.3.0
 
@@ -48,6 +54,8 @@ Full configuration example
       - mgr_events:
           commit_interval: 1
           commit_burst: 100
+          batch_size: 1000
+          max_buffered_events: 20000
           postgres_db:
               dbname: susemanger
               user: spacewalk
@@ -64,6 +72,8 @@ default for host is 'localhost'.
 # Import python libs
 from __future__ import absolute_import, print_function, unicode_literals
 import logging
+import re
+import threading
 import time
 import fnmatch
 import hashlib
@@ -85,6 +95,25 @@ log = logging.getLogger(__name__)
 
 DEFAULT_COMMIT_INTERVAL = 1
 DEFAULT_COMMIT_BURST = 100
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_BUFFERED_EVENTS = 20000
+
+EVENT_TAGS = [
+    "salt/minion/*/start",
+    "salt/job/*/ret/*",
+    "salt/beacon/*",
+    "salt/batch/*/start",
+    "suse/manager/image_deployed",
+    "suse/manager/image_synced",
+    "suse/manager/pxe_update",
+    "suse/systemid/generate",
+]
+
+# all tags are matched with a single regular expression
+match_event_tag = re.compile(
+    "|".join(fnmatch.translate(pattern) for pattern in EVENT_TAGS)
+).match
+match_job_return_tag = re.compile(fnmatch.translate("salt/job/*/ret/*")).match
 
 
 # pylint: disable-next=invalid-name
@@ -98,14 +127,32 @@ class Responder:
         self.config = config
         self.config.setdefault("commit_interval", DEFAULT_COMMIT_INTERVAL)
         self.config.setdefault("commit_burst", DEFAULT_COMMIT_BURST)
+        self.config.setdefault("batch_size", DEFAULT_BATCH_SIZE)
+        self.config.setdefault("max_buffered_events", DEFAULT_MAX_BUFFERED_EVENTS)
         self.config.setdefault("postgres_db", {})
         self.config["postgres_db"].setdefault("host", "localhost")
         self.config["postgres_db"].setdefault("notify_channel", "suseSaltEvent")
-        self.counters = [0 for i in range(config["events"]["thread_pool_size"] + 1)]
+        # (minion_id, data, queue) of the events not INSERTed yet
+        self.buffer = []
+        # protects buffer, tokens and stats, shared by event loop and writer
+        self.condition = threading.Condition()
         self.tokens = config["commit_burst"]
+        self.token_time = time.monotonic()
+        self.stats = {
+            "received": 0,
+            "discarded": 0,
+            "written": 0,
+            "failed": 0,
+            "commits": 0,
+            "max_buffered": 0,
+            "backpressure_waits": 0,
+            "backpressure_seconds": 0.0,
+        }
+        self.reported_backpressure_waits = 0
+        self.writer = None
         self.event_bus = event_bus
         self._connect_to_database()
-        self.event_bus.io_loop.call_later(config["commit_interval"], self.add_token)
+        self.event_bus.io_loop.call_later(config["commit_interval"], self.trace_log)
 
     def _connect_to_database(self):
         db_config = self.config.get("postgres_db")
@@ -131,20 +178,8 @@ class Responder:
         self.cursor = self.connection.cursor()
 
     def _insert(self, tag, data):
-        self.db_keepalive()
         if (
-            any(
-                [
-                    fnmatch.fnmatch(tag, "salt/minion/*/start"),
-                    fnmatch.fnmatch(tag, "salt/job/*/ret/*"),
-                    fnmatch.fnmatch(tag, "salt/beacon/*"),
-                    fnmatch.fnmatch(tag, "salt/batch/*/start"),
-                    fnmatch.fnmatch(tag, "suse/manager/image_deployed"),
-                    fnmatch.fnmatch(tag, "suse/manager/image_synced"),
-                    fnmatch.fnmatch(tag, "suse/manager/pxe_update"),
-                    fnmatch.fnmatch(tag, "suse/systemid/generate"),
-                ]
-            )
+            match_event_tag(tag)
             and not self._is_salt_mine_event(tag, data)
             and not self._is_presence_ping(tag, data)
         ):
@@ -157,42 +192,194 @@ class Responder:
                     int(hash_sum, 16) % self.config["events"]["thread_pool_size"] + 1
                 )
             log.debug("%s: Adding event to queue %d -> %s", __name__, queue, tag)
-            try:
-                self.cursor.execute(
-                    "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES (%s, %s, %s);",
-                    (data.get("id"), json.dumps({"tag": tag, "data": data}), queue),
+            self._buffer_event(
+                (data.get("id"), json.dumps({"tag": tag, "data": data}), queue)
+            )
+        else:
+            log.debug("%s: Discarding event -> %s", __name__, tag)
+            self.stats["discarded"] += 1
+
+    def _buffer_event(self, row):
+        with self.condition:
+            if len(self.buffer) >= self.config["max_buffered_events"]:
+                # back-pressure: block the event loop until the writer caught up
+                log.debug(
+                    "%s: %d events buffered, waiting for the database",
+                    __name__,
+                    len(self.buffer),
                 )
-                self.counters[queue] += 1
-                self.attempt_commit()
+                self.stats["backpressure_waits"] += 1
+                start = time.monotonic()
+                while len(self.buffer) >= self.config["max_buffered_events"]:
+                    self.condition.wait()
+                self.stats["backpressure_seconds"] += time.monotonic() - start
+            self.buffer.append(row)
+            self.stats["received"] += 1
+            self.stats["max_buffered"] = max(
+                self.stats["max_buffered"], len(self.buffer)
+            )
+            self.condition.notify_all()
+
+    def _refill_tokens(self):
+        """
+        Adds the tokens generated since the last refill, returns the seconds
+        until the next token if none is available.
+        """
+        interval = self.config["commit_interval"]
+        now = time.monotonic()
+        new_tokens = int((now - self.token_time) / interval)
+        if new_tokens:
+            self.tokens = min(self.tokens + new_tokens, self.config["commit_burst"])
+            self.token_time += new_tokens * interval
+        if self.tokens >= self.config["commit_burst"]:
+            self.token_time = now
+        if self.tokens > 0:
+            return 0
+        return self.token_time + interval - now
+
+    def flush(self):
+        """
+        INSERTs and COMMITs up to batch_size buffered events if a token is
+        available. Returns the number of events written.
+        """
+        with self.condition:
+            if not self.buffer or self._refill_tokens():
+                return 0
+            rows = self.buffer[: self.config["batch_size"]]
+            del self.buffer[: self.config["batch_size"]]
+            self.tokens -= 1
+            self.condition.notify_all()
+        if self._write(rows):
+            return len(rows)
+        return 0
+
+    def _write(self, rows):
+        self.db_keepalive()
+        counters = [0 for i in range(self.config["events"]["thread_pool_size"] + 1)]
+        for row in rows:
+            counters[row[2]] += 1
+        try:
+            self.cursor.execute(
+                "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES "
+                + ", ".join(["(%s, %s, %s)"] * len(rows))
+                + ";",
+                [value for row in rows for value in row],
+            )
+            self.commit(counters)
+            self.stats["written"] += len(rows)
+            return True
+        # pylint: disable-next=broad-exception-caught
+        except Exception as err:
+            log.error("%s: %s", __name__, err)
+            if self.connection.closed:
+                # write them again once the connection is back
+                with self.condition:
+                    self.buffer[:0] = rows
+                return False
+            try:
+                self.connection.rollback()
+            # pylint: disable-next=broad-exception-caught
+            except Exception as err2:
+                log.error("%s: Error rolling back: %s", __name__, err2)
+                self.connection.close()
+                with self.condition:
+                    self.buffer[:0] = rows
+                return False
+        # an event the database does not accept, write them one by one
+        for row in rows:
+            self._write_event(row)
+        return True
+
+    def _write_event(self, row):
+        counters = [0 for i in range(self.config["events"]["thread_pool_size"] + 1)]
+        counters[row[2]] += 1
+        try:
+            self.cursor.execute(
+                "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES (%s, %s, %s);",
+                row,
+            )
+            self.commit(counters)
+            self.stats["written"] += 1
+        # pylint: disable-next=broad-exception-caught
+        except Exception as err:
+            log.error("%s: Discarding event of %s: %s", __name__, row[0], err)
+            self.stats["failed"] += 1
+            try:
+                self.connection.rollback()
+            # pylint: disable-next=broad-exception-caught
+            except Exception as err2:
+                log.error("%s: Error rolling back: %s", __name__, err2)
+                self.connection.close()
+
+    def commit(self, counters):
+        """
+        Committing to the database and notifying about the new events.
+        """
+        log.debug("%s: commit", __name__)
+        self.cursor.execute(
+            # pylint: disable-next=consider-using-f-string
+            "NOTIFY {}, '{}';".format(
+                self.config["postgres_db"]["notify_channel"],
+                ",".join([str(counter) for counter in counters]),
+            )
+        )
+        self.connection.commit()
+        self.stats["commits"] += 1
+
+    def write_events(self):
+        """
+        Writer thread: flushes the buffer whenever events and tokens are
+        available.
+        """
+        while True:
+            with self.condition:
+                while not self.buffer:
+                    self.condition.wait()
+                wait = self._refill_tokens()
+                if wait:
+                    self.condition.wait(wait)
+                    continue
+            try:
+                self.flush()
             # pylint: disable-next=broad-exception-caught
             except Exception as err:
-                log.error("%s: %s", __name__, err)
-                try:
-                    self.connection.commit()
-                # pylint: disable-next=broad-exception-caught
-                except Exception as err2:
-                    log.error("%s: Error commiting: %s", __name__, err2)
-                    self.connection.close()
-            finally:
-                log.debug("%s: %s", __name__, self.cursor.query)
-        else:
-            log.debug("%s: Discarding event -> %s", __name__, tag)
+                log.error("%s: Error writing events: %s", __name__, err)
+                time.sleep(self.config["commit_interval"])
+
+    def start_writer(self):
+        self.writer = threading.Thread(
+            target=self.write_events, name="mgr_events writer", daemon=True
+        )
+        self.writer.start()
 
     def trace_log(self):
-        log.trace("%s: queues sizes -> %s", __name__, self.counters)
-        log.trace("%s: tokens -> %s", __name__, self.tokens)
+        with self.condition:
+            log.trace("%s: buffered events -> %d", __name__, len(self.buffer))
+            log.trace("%s: tokens -> %s", __name__, self.tokens)
+            log.trace("%s: statistics -> %s", __name__, self.stats)
+            waits = self.stats["backpressure_waits"]
+            if waits > self.reported_backpressure_waits:
+                log.warning(
+                    "%s: the event loop waited %d times for the database, "
+                    "%.1f seconds in total",
+                    __name__,
+                    waits,
+                    self.stats["backpressure_seconds"],
+                )
+                self.reported_backpressure_waits = waits
+        self.event_bus.io_loop.call_later(
+            self.config["commit_interval"], self.trace_log
+        )
 
     def _is_salt_mine_event(self, tag, data):
-        return fnmatch.fnmatch(tag, "salt/job/*/ret/*") and self._is_salt_mine_update(
-            data
-        )
+        return match_job_return_tag(tag) and self._is_salt_mine_update(data)
 
     def _is_salt_mine_update(self, data):
         return data.get("fun") == "mine.update"
 
     def _is_presence_ping(self, tag, data):
         return (
-            fnmatch.fnmatch(tag, "salt/job/*/ret/*")
+            match_job_return_tag(tag)
             and self._is_test_ping(data)
             and self._is_batch_mode(data)
         )
@@ -217,35 +404,6 @@ class Responder:
             log.error("%s: Diconnected from database. Trying to reconnect...", __name__)
             self._connect_to_database()
 
-    @salt.ext.tornado.gen.coroutine
-    def add_token(self):
-        self.tokens = min(self.tokens + 1, self.config["commit_burst"])
-        self.attempt_commit()
-        self.trace_log()
-        self.event_bus.io_loop.call_later(
-            self.config["commit_interval"], self.add_token
-        )
-
-    def attempt_commit(self):
-        """
-        Committing to the database.
-        """
-        self.db_keepalive()
-        if self.tokens > 0 and sum(self.counters) > 0:
-            log.debug("%s: commit", __name__)
-            self.cursor.execute(
-                # pylint: disable-next=consider-using-f-string
-                "NOTIFY {}, '{}';".format(
-                    self.config["postgres_db"]["notify_channel"],
-                    ",".join([str(counter) for counter in self.counters]),
-                )
-            )
-            self.connection.commit()
-            self.counters = [
-                0 for i in range(0, self.config["events"]["thread_pool_size"] + 1)
-            ]
-            self.tokens -= 1
-
 
 def start(**config):
     """
@@ -262,5 +420,6 @@ def start(**config):
         io_loop=io_loop,
     )
     responder = Responder(event_bus, config)
+    responder.start_writer()
     event_bus.set_event_handler(responder.add_event_to_queue)
     io_loop.start()
@@ -14,14 +14,23 @@ Retrieve SUSE Multi-Linux Manager pillar data for a minion_id.
     ext_pillar:
       - suma_minion: True
 
+The pillar of every minion is kept in the master cache together with a
+fingerprint of the database rows and formula files it was computed from.
+A pillar render only runs the fingerprint query as long as nothing changed.
+When a global, organization or group pillar changed, the pillars of all the
+minions whose fingerprint changed are loaded with a few bulk queries.
+Set ``suma_minion_pillar_cache: False`` in the master configuration to
+disable the cache.
 """
 
 # Import python libs
 from __future__ import absolute_import
 from enum import Enum
+import hashlib
 import os
 import logging
 import yaml
+import salt.cache
 import salt.utils.dictupdate
 import salt.utils.stringutils
 
@@ -38,6 +47,37 @@ MANAGER_FORMULAS_METADATA_STANDALONE_PATH = "/usr/share/salt-formulas/metadata"
 CUSTOM_FORMULAS_METADATA_PATH = "/srv/formula_metadata"
 FORMULA_PREFIX = "formula-"
 
+PILLAR_CACHE_BANK = "suma_minion/pillar"
+
+# md5 sums of the global, org, group and system pillars of the minions
+FINGERPRINT_QUERY = """
+    SELECT m.minion_id,
+           MD5(COALESCE((
+               SELECT STRING_AGG(p.id || ':' || MD5(p.pillar::text), ',' ORDER BY p.id)
+               FROM susesaltpillar AS p
+               WHERE p.server_id IS NULL AND p.group_id IS NULL AND p.org_id IS NULL
+           ), '')) AS global_fp,
+           MD5(COALESCE((
+               SELECT STRING_AGG(p.id || ':' || MD5(p.pillar::text), ',' ORDER BY p.id)
+               FROM susesaltpillar AS p
+               WHERE p.org_id = s.org_id
+           ), '')) AS org_fp,
+           MD5(COALESCE((
+               SELECT STRING_AGG(p.id || ':' || MD5(p.pillar::text), ',' ORDER BY p.id)
+               FROM susesaltpillar AS p,
+                    rhnServerGroupMembers AS g
+               WHERE g.server_id = m.server_id
+                 AND p.group_id = g.server_group_id
+           ), '')) AS group_fp,
+           MD5(COALESCE((
+               SELECT STRING_AGG(p.id || ':' || MD5(p.pillar::text), ',' ORDER BY p.id)
+               FROM susesaltpillar AS p
+               WHERE p.server_id = m.server_id
+           ), '')) AS system_fp
+    FROM suseminioninfo AS m,
+         rhnServer AS s
+    WHERE s.id = m.server_id"""
+
 
 def find_path(path_list):
     """
@@ -164,6 +204,179 @@ def _get_cursor(func):
                 cnx.close()
 
 
+def _get_pillar_cache():
+    # pylint: disable-next=undefined-variable
+    opts = __opts__.get("__master_opts__", __opts__)
+    if not opts.get("suma_minion_pillar_cache", True):
+        return None
+    # pylint: disable-next=undefined-variable
+    if "suma_minion_cache" not in __context__:
+        # pylint: disable-next=undefined-variable
+        __context__["suma_minion_cache"] = salt.cache.Cache(opts)
+    # pylint: disable-next=undefined-variable
+    return __context__["suma_minion_cache"]
+
+
+def _fetch_cached_pillar(cache, minion_id):
+    try:
+        return cache.fetch(PILLAR_CACHE_BANK, minion_id) or {}
+    # pylint: disable-next=broad-exception-caught
+    except Exception as error:
+        log.warning("Error reading the cached pillar of %s: %s", minion_id, error)
+        return {}
+
+
+def load_fingerprints(cursor, minion_ids=None):
+    """
+    Return the fingerprints of the pillar data of the given minions, or of all
+    the minions, from the database.
+    """
+    if minion_ids is None:
+        cursor.execute(FINGERPRINT_QUERY)
+    else:
+        cursor.execute(
+            FINGERPRINT_QUERY + " AND m.minion_id = ANY(%s)", (list(minion_ids),)
+        )
+    return {row[0]: list(row[1:]) for row in cursor.fetchall()}
+
+
+def formulas_fingerprint():
+    """
+    Return a fingerprint of the formula files the formula pillars are computed from.
+    """
+    stats = []
+    for path in (
+        MANAGER_FORMULAS_METADATA_STANDALONE_PATH,
+        MANAGER_FORMULAS_METADATA_MANAGER_PATH,
+        CUSTOM_FORMULAS_METADATA_PATH,
+    ):
+        if not os.path.isdir(path):
+            continue
+        for formula_name in sorted(os.listdir(path)):
+            for filename in ("form.yml", "metadata.yml"):
+                try:
+                    stat = os.stat(os.path.join(path, formula_name, filename))
+                except OSError:
+                    continue
+                # pylint: disable-next=consider-using-f-string
+                stats.append("%s/%s:%s" % (formula_name, filename, stat.st_mtime_ns))
+    return hashlib.md5(",".join(stats).encode()).hexdigest()
+
+
+def load_pillar_rows(cursor, minion_ids):
+    """
+    Load the pillar rows of several minions with a few bulk queries.
+    Return a dictionary mapping the minion ids to the global, org, group
+    and system rows, each as a list of (category, pillar) tuples.
+    """
+    cursor.execute(
+        """
+            SELECT p.org_id, p.group_id, p.category, p.pillar
+            FROM susesaltpillar AS p
+            WHERE p.server_id IS NULL
+            ORDER BY p.id;"""
+    )
+    global_rows = []
+    org_rows = {}
+    group_rows = {}
+    for org_id, group_id, category, data in cursor.fetchall():
+        if org_id is not None:
+            org_rows.setdefault(org_id, []).append((category, data))
+        elif group_id is not None:
+            group_rows.setdefault(group_id, []).append((category, data))
+        else:
+            global_rows.append((category, data))
+
+    cursor.execute(
+        """
+            SELECT m.minion_id, p.category, p.pillar
+            FROM susesaltpillar AS p,
+                 suseminioninfo AS m
+            WHERE m.minion_id = ANY(%s)
+              AND m.server_id = p.server_id
+            ORDER BY p.id;""",
+        (list(minion_ids),),
+    )
+    system_rows = {}
+    for minion_id, category, data in cursor.fetchall():
+        system_rows.setdefault(minion_id, []).append((category, data))
+
+    cursor.execute(
+        """
+            SELECT m.minion_id, s.org_id,
+                   ARRAY(SELECT g.server_group_id
+                         FROM rhnServerGroupMembers AS g
+                         WHERE g.server_id = m.server_id
+                         ORDER BY g.server_group_id)
+            FROM suseminioninfo AS m,
+                 rhnServer AS s
+            WHERE m.minion_id = ANY(%s)
+              AND s.id = m.server_id;""",
+        (list(minion_ids),),
+    )
+    ret = {}
+    for minion_id, org_id, group_ids in cursor.fetchall():
+        ret[minion_id] = (
+            global_rows,
+            org_rows.get(org_id, []),
+            [row for group_id in group_ids for row in group_rows.get(group_id, [])],
+            system_rows.get(minion_id, []),
+        )
+    return ret
+
+
+def _prefetch_pillar_rows(cursor, cache):
+    """
+    Load the rows of all the minions whose cached pillar is outdated.
+    """
+    fingerprints = load_fingerprints(cursor)
+    outdated = [
+        minion_id
+        for minion_id, fingerprint in fingerprints.items()
+        if _fetch_cached_pillar(cache, minion_id).get("fp") != fingerprint
+    ]
+    log.debug("Prefetching the pillar data of %d minions", len(outdated))
+    prefetch = {
+        "fingerprints": fingerprints,
+        "rows": load_pillar_rows(cursor, outdated) if outdated else {},
+    }
+    # pylint: disable-next=undefined-variable
+    __context__["suma_minion_prefetch"] = prefetch
+    return prefetch
+
+
+def _get_pillar_rows(cursor, cache, minion_id, fingerprint, cached_fingerprint):
+    """
+    Return the prefetched rows of the minion, None if they have to be loaded
+    with the single minion queries.
+    """
+    # pylint: disable-next=undefined-variable
+    prefetch = __context__.get("suma_minion_prefetch")
+    if prefetch and prefetch["fingerprints"].get(minion_id) == fingerprint:
+        return prefetch["rows"].pop(minion_id, None)
+    if cached_fingerprint is None or cached_fingerprint[:3] == fingerprint[:3]:
+        # a new minion or only its own pillars changed
+        return None
+    # a global, org or group pillar changed, usually affecting many minions
+    prefetch = _prefetch_pillar_rows(cursor, cache)
+    if prefetch["fingerprints"].get(minion_id) != fingerprint:
+        return None
+    return prefetch["rows"].pop(minion_id, None)
+
+
+def merge_pillar_rows(rows):
+    """
+    Merge the prefetched global, org, group and system rows of a minion.
+    """
+    global_rows, org_rows, group_rows, system_rows = rows
+    pillar = {}
+    for row in global_rows + org_rows:
+        pillar = salt.utils.dictupdate.merge(pillar, row[1], strategy="recurse")
+    group_formulas, pillar = _merge_category_rows(group_rows, pillar)
+    system_formulas, pillar = _merge_category_rows(system_rows, pillar)
+    return (group_formulas, system_formulas, pillar)
+
+
 # pylint: disable-next=unused-argument
 def ext_pillar(minion_id, pillar, *args):
     """
@@ -175,19 +388,59 @@ def ext_pillar(minion_id, pillar, *args):
     ret = {}
     group_formulas = {}
     system_formulas = {}
+    cache = _get_pillar_cache()
+    cached = _fetch_cached_pillar(cache, minion_id) if cache is not None else {}
+    fingerprint = None
+    formulas_fp = None
+    loaded = False
+    cache_hit = False
 
     # Load the global pillar from DB
     def _load_db_pillar(cursor):
         nonlocal ret
         nonlocal group_formulas
         nonlocal system_formulas
-        ret = load_global_pillars(cursor, ret)
-        ret = load_org_pillars(minion_id, cursor, ret)
-        group_formulas, ret = load_group_pillars(minion_id, cursor, ret)
-        system_formulas, ret = load_system_pillars(minion_id, cursor, ret)
+        nonlocal fingerprint
+        nonlocal formulas_fp
+        nonlocal loaded
+        nonlocal cache_hit
+        ret = {}
+        rows = None
+        if cache is not None:
+            fingerprint = load_fingerprints(cursor, [minion_id]).get(minion_id)
+            if fingerprint is not None:
+                formulas_fp = formulas_fingerprint()
+                if (
+                    "pillar" in cached
+                    and cached.get("fp") == fingerprint
+                    and cached.get("formulas") == formulas_fp
+                ):
+                    cache_hit = True
+                    loaded = True
+                    return
+                rows = _get_pillar_rows(
+                    cursor, cache, minion_id, fingerprint, cached.get("fp")
+                )
+        if rows is not None:
+            group_formulas, system_formulas, ret = merge_pillar_rows(rows)
+        else:
+            ret = load_global_pillars(cursor, ret)
+            ret = load_org_pillars(minion_id, cursor, ret)
+            group_formulas, ret = load_group_pillars(minion_id, cursor, ret)
+            system_formulas, ret = load_system_pillars(minion_id, cursor, ret)
+        loaded = True
 
     _get_cursor(_load_db_pillar)
 
+    if cache_hit:
+        log.debug("Returning the cached pillar data")
+        return cached["pillar"]
+    if not loaded and "pillar" in cached:
+        log.warning(
+            "Unable to get the pillar data from the DB, returning the cached data"
+        )
+        return cached["pillar"]
+
     # Including formulas into pillar data
     try:
         ret = salt.utils.dictupdate.merge(
@@ -198,6 +451,18 @@ def ext_pillar(minion_id, pillar, *args):
     # pylint: disable-next=broad-exception-caught
     except Exception as error:
         log.error("Error accessing formula pillar data: %s", error)
+        fingerprint = None
+
+    if fingerprint is not None:
+        try:
+            cache.store(
+                PILLAR_CACHE_BANK,
+                minion_id,
+                {"fp": fingerprint, "formulas": formulas_fp, "pillar": ret},
+            )
+        # pylint: disable-next=broad-exception-caught
+        except Exception as error:
+            log.warning("Error caching the pillar of %s: %s", minion_id, error)
 
     return ret
 
@@ -262,15 +527,7 @@ def load_group_pillars(minion_id, cursor, pillar):
           );
     """
     cursor.execute(groups_query, (minion_id,))
-    group_formulas = {}
-    for row in cursor.fetchall():
-        if row[0].startswith(FORMULA_PREFIX):
-            # Handle formulas separately
-            group_formulas[row[0][len(FORMULA_PREFIX) :]] = row[1]
-        else:
-            pillar = salt.utils.dictupdate.merge(pillar, row[1], strategy="recurse")
-
-    return (group_formulas, pillar)
+    return _merge_category_rows(cursor.fetchall(), pillar)
 
 
 def load_system_pillars(minion_id, cursor, pillar):
@@ -284,15 +541,22 @@ def load_system_pillars(minion_id, cursor, pillar):
         WHERE m.minion_id = %s
           AND m.server_id = p.server_id;"""
     cursor.execute(minion_query, (minion_id,))
-    server_formulas = {}
-    for row in cursor.fetchall():
+    return _merge_category_rows(cursor.fetchall(), pillar)
+
+
+def _merge_category_rows(rows, pillar):
+    """
+    Merge (category, pillar) rows into the pillar and extract the formulas from them
+    """
+    formulas = {}
+    for row in rows:
         if row[0].startswith(FORMULA_PREFIX):
             # Handle formulas separately
-            server_formulas[row[0][len(FORMULA_PREFIX) :]] = row[1]
+            formulas[row[0][len(FORMULA_PREFIX) :]] = row[1]
         else:
             pillar = salt.utils.dictupdate.merge(pillar, row[1], strategy="recurse")
 
-    return (server_formulas, pillar)
+    return (formulas, pillar)
 
 
 def formula_pillars(system_formulas, group_formulas, all_pillar):
@@ -0,0 +1,117 @@
+#  pylint: disable=missing-module-docstring
+#
+# SPDX-FileCopyrightText: 2026 SUSE LLC
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+# Replay a recorded Salt event stream through the mgr_events engine.
+#
+# Usage: python benchmark_mgr_events.py <events file> <dbname> [batch sizes]
+#
+# The events file has one event per line, either as printed by
+# "salt-run state.event" (tag, tab, JSON data) or as JSON objects with
+# "tag" and "data". The events are written to the suseSaltEvent table of a
+# local PostgreSQL database, which is created if missing and emptied before
+# every run, so use a scratch database. Every batch size (default: 1 and
+# 1000) is replayed once, batch size 1 writes every event on its own. The
+# commit token bucket is disabled, so that the database is the limit.
+#
+
+import json
+import os
+import sys
+import time
+from unittest.mock import MagicMock
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules", "engines"))
+# pylint: disable-next=wrong-import-position
+from mgr_events import Responder
+
+
+def read_events(path):
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                event = json.loads(line)
+                events.append((event["tag"], event["data"]))
+            else:
+                tag, data = line.split("\t", 1)
+                events.append((tag, json.loads(data)))
+    return events
+
+
+def prepare_table(dbname):
+    with psycopg2.connect(dbname=dbname, host="localhost") as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS suseSaltEvent (
+                id SERIAL PRIMARY KEY,
+                minion_id CHARACTER VARYING(256),
+                data TEXT NOT NULL,
+                queue NUMERIC NOT NULL
+            );"""
+        )
+        cursor.execute("DELETE FROM suseSaltEvent;")
+
+
+def run(events, dbname, batch_size):
+    prepare_table(dbname)
+    responder = Responder(
+        MagicMock(),
+        {
+            "batch_size": batch_size,
+            "commit_burst": len(events) + 1,
+            "postgres_db": {
+                "dbname": dbname,
+                "user": "postgres",
+                "password": "",
+                "host": "localhost",
+            },
+            "events": {"thread_pool_size": 8},
+        },
+    )
+    responder.start_writer()
+    start = time.time()
+    for tag, data in events:
+        # pylint: disable-next=protected-access
+        responder._insert(tag, data)
+    while True:
+        with responder.condition:
+            if responder.stats["written"] + responder.stats["failed"] >= (
+                responder.stats["received"]
+            ):
+                break
+        time.sleep(0.01)
+    return time.time() - start, responder.stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.stderr.write(
+            # pylint: disable-next=consider-using-f-string
+            "Usage: %s <events file> <dbname> [batch sizes]\n"
+            % sys.argv[0]
+        )
+        sys.exit(1)
+
+    recorded = read_events(sys.argv[1])
+    sizes = [int(size) for size in sys.argv[3:]] or [1, 1000]
+    for size in sizes:
+        seconds, stats = run(recorded, sys.argv[2], size)
+        print(
+            # pylint: disable-next=consider-using-f-string
+            "batch size %5d %7d events %9.2f seconds %9.0f events/s %s"
+            % (
+                size,
+                len(recorded),
+                seconds,
+                len(recorded) / seconds if seconds else 0,
+                stats,
+            )
+        )
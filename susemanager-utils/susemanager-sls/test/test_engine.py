@@ -4,6 +4,8 @@ import pytest
 import psycopg2
 import shlex
 import subprocess
+import threading
+import time
 from mgr_events import Responder, DEFAULT_COMMIT_BURST
 from unittest.mock import MagicMock, patch, call
 from sqlalchemy import create_engine
@@ -101,12 +103,13 @@ def test_connection_recovery_on_insert(db_connection, responder):
     responder.connection = disposable_connection
     # pylint: disable-next=protected-access
     responder._insert("salt/minion/1/start", {"value": 1})
+    responder.flush()
     responder.connection.close()
     with patch("mgr_events.psycopg2") as mock_psycopg2:
         mock_psycopg2.connect.return_value = db_connection
         # pylint: disable-next=protected-access
         responder._insert("salt/minion/2/start", {"value": 2})
-    responder.connection.commit()
+        responder.flush()
     responder.cursor.execute("SELECT * FROM suseSaltEvent")
     resp = responder.cursor.fetchall()
     assert len(resp) == 2
@@ -120,8 +123,7 @@ def test_connection_recovery_on_commit(db_connection, responder):
     responder.connection.close()
     with patch("mgr_events.psycopg2") as mock_psycopg2:
         mock_psycopg2.connect.return_value = db_connection
-        responder.attempt_commit()
-    responder.connection.commit()
+        assert responder.flush() == 1
     responder.cursor.execute("SELECT * FROM suseSaltEvent")
     resp = responder.cursor.fetchall()
     assert len(resp) == 1
@@ -131,6 +133,7 @@ def test_connection_recovery_on_commit(db_connection, responder):
 def test_insert_start_event(responder, db_connection):
     responder.event_bus.unpack.return_value = ("salt/minion/12345/start", {"value": 1})
     responder.add_event_to_queue("")
+    responder.flush()
     responder.cursor.execute("SELECT * FROM suseSaltEvent;")
     resp = responder.cursor.fetchall()
     assert resp
@@ -141,6 +144,7 @@ def test_insert_start_event(responder, db_connection):
 def test_insert_job_return_event(responder):
     responder.event_bus.unpack.return_value = ("salt/job/12345/ret/6789", {"value": 1})
     responder.add_event_to_queue("")
+    responder.flush()
     responder.cursor.execute("SELECT * FROM suseSaltEvent;")
     resp = responder.cursor.fetchall()
     assert resp
@@ -151,6 +155,7 @@ def test_insert_job_return_event(responder):
 def test_insert_batch_start_event(responder):
     responder.event_bus.unpack.return_value = ("salt/batch/12345/start", {"value": 1})
     responder.add_event_to_queue("")
+    responder.flush()
     responder.cursor.execute("SELECT * FROM suseSaltEvent;")
     resp = responder.cursor.fetchall()
     assert resp
@@ -164,6 +169,7 @@ def test_discard_batch_presence_ping_event(responder):
         {"value": 1, "fun": "test.ping", "metadata": {"batch-mode": True}},
     )
     responder.add_event_to_queue("")
+    responder.flush()
     responder.cursor.execute("SELECT * FROM suseSaltEvent;")
     resp = responder.cursor.fetchall()
     assert len(resp) == 0
@@ -176,6 +182,7 @@ def test_keep_presence_ping_event_without_batch(responder):
         {"value": 1, "fun": "test.ping", "id": "testminion"},
     )
     responder.add_event_to_queue("")
+    responder.flush()
     responder.cursor.execute("SELECT * FROM suseSaltEvent;")
     resp = responder.cursor.fetchall()
     assert len(resp) == 1
@@ -188,13 +195,11 @@ def test_commit_scheduled_on_init(responder):
 
 # pylint: disable-next=redefined-outer-name
 def test_commit_empty_queue(responder):
-    responder.counters = [0, 0, 0, 0]
-    with patch.object(responder, "event_bus", MagicMock()):
-        with patch.object(responder, "connection") as mock_connection:
-            mock_connection.closed = False
-            responder.attempt_commit()
-            assert responder.connection.commit.call_count == 0
-        assert responder.tokens == DEFAULT_COMMIT_BURST
+    with patch.object(responder, "connection") as mock_connection:
+        mock_connection.closed = False
+        assert responder.flush() == 0
+        assert responder.connection.commit.call_count == 0
+    assert responder.tokens == DEFAULT_COMMIT_BURST
 
 
 # pylint: disable-next=redefined-outer-name
@@ -202,7 +207,8 @@ def test_postgres_notification(responder):
     with patch.object(responder, "cursor"):
         # pylint: disable-next=protected-access
         responder._insert("salt/minion/1/start", {"value": 1, "id": "testminion"})
-        assert responder.counters == [0, 0, 0, 0]
+        assert responder.flush() == 1
+        assert responder.buffer == []
         assert responder.tokens == DEFAULT_COMMIT_BURST - 1
         assert responder.cursor.execute.mock_calls[-1:] == [
             call("NOTIFY suseSaltEvent, '0,0,1,0';")
@@ -212,13 +218,17 @@ def test_postgres_notification(responder):
 # pylint: disable-next=redefined-outer-name
 def test_add_token(responder):
     responder.tokens = 0
-    responder.add_token()
+    responder.token_time = time.monotonic() - responder.config["commit_interval"]
+    # pylint: disable-next=protected-access
+    assert responder._refill_tokens() == 0
     assert responder.tokens == 1
 
 
 # pylint: disable-next=redefined-outer-name
 def test_add_token_max(responder):
-    responder.add_token()
+    responder.token_time = time.monotonic() - 10 * responder.config["commit_interval"]
+    # pylint: disable-next=protected-access
+    responder._refill_tokens()
     assert responder.tokens == DEFAULT_COMMIT_BURST
 
 
@@ -229,21 +239,80 @@ def test_commit_avoidance_without_tokens(responder):
             mock_connection.closed = False
             mock_connection.encoding = "utf-8"
             responder.tokens = 0
+            responder.token_time = time.monotonic()
             # pylint: disable-next=protected-access
             responder._insert("salt/minion/1/start", {"id": "testminion", "value": 1})
-            assert responder.counters == [0, 0, 1, 0]
-            assert responder.tokens == 0
-            assert responder.connection.commit.call_count == 0
-            assert responder.cursor.execute.mock_calls == [
-                call(
-                    "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES (%s, %s, %s);",
-                    (
-                        "testminion",
-                        '{"tag": "salt/minion/1/start", "data": {"id": "testminion", "value": 1}}',
-                        2,
-                    ),
+            assert responder.flush() == 0
+            assert responder.buffer == [
+                (
+                    "testminion",
+                    '{"tag": "salt/minion/1/start", "data": {"id": "testminion", "value": 1}}',
+                    2,
                 )
             ]
+            assert responder.tokens == 0
+            assert responder.connection.commit.call_count == 0
+            assert responder.cursor.execute.call_count == 0
+
+
+# pylint: disable-next=redefined-outer-name
+def test_multi_row_insert(responder):
+    responder.config["batch_size"] = 2
+    for minion in range(3):
+        # pylint: disable-next=protected-access,consider-using-f-string
+        responder._insert("salt/minion/%d/start" % minion, {"value": minion})
+    with patch.object(responder, "cursor") as mock_cursor:
+        assert responder.flush() == 2
+        assert mock_cursor.execute.mock_calls[0] == call(
+            "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES "
+            "(%s, %s, %s), (%s, %s, %s);",
+            [
+                None,
+                '{"tag": "salt/minion/0/start", "data": {"value": 0}}',
+                0,
+                None,
+                '{"tag": "salt/minion/1/start", "data": {"value": 1}}',
+                0,
+            ],
+        )
+        assert mock_cursor.execute.mock_calls[1] == call(
+            "NOTIFY suseSaltEvent, '2,0,0,0';"
+        )
+        assert responder.flush() == 1
+    assert responder.stats["written"] == 3
+    assert responder.stats["commits"] == 2
+
+
+# pylint: disable-next=redefined-outer-name
+def test_backpressure(responder):
+    responder.config["max_buffered_events"] = 1
+    # pylint: disable-next=protected-access
+    responder._insert("salt/minion/1/start", {"value": 1})
+    blocked = threading.Thread(
+        # pylint: disable-next=protected-access
+        target=responder._insert,
+        args=("salt/minion/2/start", {"value": 2}),
+    )
+    blocked.start()
+    blocked.join(0.5)
+    assert blocked.is_alive()
+    assert len(responder.buffer) == 1
+
+    responder.flush()
+    blocked.join(5)
+    assert not blocked.is_alive()
+    assert len(responder.buffer) == 1
+    assert responder.stats["backpressure_waits"] == 1
+    assert responder.stats["max_buffered"] == 1
+
+
+# pylint: disable-next=redefined-outer-name
+def test_discard_other_events(responder):
+    for tag in ("salt/auth", "salt/job/1/new", "salt/minion/1/start/extra"):
+        # pylint: disable-next=protected-access
+        responder._insert(tag, {"value": 1})
+    assert responder.buffer == []
+    assert responder.stats["discarded"] == 3
 
 
 # pylint: disable-next=redefined-outer-name
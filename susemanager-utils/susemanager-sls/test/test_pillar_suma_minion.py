@@ -229,3 +229,147 @@ def test_using_context_in__get_cursor():
             "dbname": "test_db",
             "port": 1234,
         }
+
+
+class FakeCache:
+    def __init__(self):
+        self.data = {}
+
+    def fetch(self, bank, key):
+        return self.data.get((bank, key), {})
+
+    def store(self, bank, key, data):
+        self.data[(bank, key)] = data
+
+
+class FakeCursor:
+    """
+    Cursor returning the rows of the first query fragment found in the query
+    """
+
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+        self.rows = []
+
+    def execute(self, query, args=None):
+        self.queries.append(query)
+        for fragment, rows in self.results.items():
+            if fragment in query:
+                self.rows = rows(args) if callable(rows) else rows
+                return
+        self.rows = []
+
+    def fetchall(self):
+        return self.rows
+
+
+def _fingerprints(fingerprints):
+    def _rows(args):
+        minion_ids = args[0] if args else fingerprints
+        return [
+            (minion_id, *fingerprints[minion_id])
+            for minion_id in minion_ids
+            if minion_id in fingerprints
+        ]
+
+    return _rows
+
+
+def _ext_pillar(cursor, minion_id, context):
+    def _get_cursor(func):
+        func(cursor)
+
+    with patch("suma_minion._get_cursor", _get_cursor), patch.object(
+        suma_minion, "__context__", context
+    ):
+        return suma_minion.ext_pillar(minion_id, {})
+
+
+def test_ext_pillar_cache():
+    """
+    Test the pillar is cached as long as the fingerprint does not change
+    """
+    fingerprints = {"minion1": ["g1", "o1", "gr1", "s1"]}
+    cursor = FakeCursor(
+        {
+            "AS global_fp": _fingerprints(fingerprints),
+            "p.server_id is NULL": [({"global": 1},)],
+            "m.server_id = p.server_id": [("custom_info", {"system": 1})],
+        }
+    )
+    context = {"suma_minion_cache": FakeCache()}
+    pillar = {"global": 1, "system": 1, "formulas": []}
+
+    assert _ext_pillar(cursor, "minion1", context) == pillar
+    assert len(cursor.queries) == 5
+
+    cursor.queries = []
+    assert _ext_pillar(cursor, "minion1", context) == pillar
+    assert len(cursor.queries) == 1
+
+    fingerprints["minion1"][3] = "s2"
+    cursor.results["m.server_id = p.server_id"] = [("custom_info", {"system": 2})]
+    cursor.queries = []
+    assert _ext_pillar(cursor, "minion1", context)["system"] == 2
+    assert len(cursor.queries) == 5
+
+
+def test_ext_pillar_prefetch():
+    """
+    Test a changed global pillar loads the pillars of all minions at once
+    """
+    fingerprints = {
+        "minion1": ["g1", "o1", "gr1", "s1"],
+        "minion2": ["g1", "o1", "gr1", "s2"],
+    }
+    cache = FakeCache()
+    for minion_id, fingerprint in fingerprints.items():
+        cache.store(
+            suma_minion.PILLAR_CACHE_BANK,
+            minion_id,
+            {
+                "fp": list(fingerprint),
+                "formulas": suma_minion.formulas_fingerprint(),
+                "pillar": {"cached": True},
+            },
+        )
+    fingerprints["minion1"][0] = fingerprints["minion2"][0] = "g2"
+    cursor = FakeCursor(
+        {
+            "AS global_fp": _fingerprints(fingerprints),
+            "WHERE p.server_id IS NULL": [
+                (None, None, "general", {"global": 2}),
+                (None, 9, "formula-locale", {}),
+            ],
+            "ORDER BY g.server_group_id": [("minion1", 1, [9]), ("minion2", 1, [])],
+            "m.server_id = p.server_id": [("minion2", "custom_info", {"system": 2})],
+        }
+    )
+
+    context = {"suma_minion_cache": cache}
+    pillar = _ext_pillar(cursor, "minion1", context)
+    assert pillar["global"] == 2
+    assert pillar["formulas"] == ["locale"]
+    # single fingerprint, all fingerprints and three bulk queries
+    assert len(cursor.queries) == 5
+
+    cursor.queries = []
+    assert _ext_pillar(cursor, "minion2", context) == {
+        "global": 2,
+        "system": 2,
+        "formulas": [],
+    }
+    assert len(cursor.queries) == 1
+
+
+def test_ext_pillar_cache_without_db():
+    """
+    Test the cached pillar is returned if the database is not available
+    """
+    cache = FakeCache()
+    cache.store(suma_minion.PILLAR_CACHE_BANK, "minion1", {"pillar": {"cached": 1}})
+    with patch("suma_minion._get_cursor", MagicMock()), patch.dict(
+        suma_minion.__context__, {"suma_minion_cache": cache}
+    ):
+        assert suma_minion.ext_pillar("minion1", {}) == {"cached": 1}